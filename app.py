@@ -6,7 +6,7 @@ import streamlit as st
 from config.settings import settings
 from ui.layout import inject_rtl_css, render_header, render_sidebar, render_footer
 from ui.chat_interface import render_chat_interface, clear_chat_history, display_conversation_stats
-from services.ai_service import initialize_agent
+from services.ai_service import get_agent_executor
 
 
 def main():
@@ -36,13 +36,8 @@ def main():
     # Render sidebar
     render_sidebar()
     
-    # Initialize agent (with caching)
-    @st.cache_resource
-    def get_agent():
-        """Get or create agent executor with caching."""
-        return initialize_agent()
-    
-    agent_executor = get_agent()
+    # Get the process-wide agent (shared HTTP connection pool)
+    agent_executor = get_agent_executor()
     
     if agent_executor is None:
         st.error("❌ فشل في تهيئة المساعد الذكي. الرجاء التحقق من الإعدادات.")
@@ -14,36 +14,59 @@ from routes.chat import chat_bp
 from routes.ocr import ocr_bp
 from routes.speech import speech_bp
 from routes.health import health_bp
+from routes.customers import customers_bp
 from config.settings import settings
+from data.snapshot import load_snapshot
+from services.ai_service import history_manager
 
 
-def create_app():
+# CORS policy for /api/* (also applied by asgi.py): frontends allowed to call the API
+CORS_ORIGINS = ["http://localhost:3000", "http://localhost:8501"]
+CORS_METHODS = ["GET", "POST", "OPTIONS"]
+CORS_HEADERS = ["Content-Type", "Authorization"]
+
+
+def create_app(cors: bool = True):
     """
     Create and configure Flask application.
     
+    Args:
+        cors: Apply the CORS policy with Flask-CORS (asgi.py applies it
+            itself, to the Flask routes and its own)
+    
     Returns:
         Flask: Configured Flask app instance
     """
     app = Flask(__name__)
     
     # CORS configuration - allow frontend to communicate
-    CORS(app, resources={
-        r"/api/*": {
-            "origins": ["http://localhost:3000", "http://localhost:8501"],
-            "methods": ["GET", "POST", "OPTIONS"],
-            "allow_headers": ["Content-Type", "Authorization"]
-        }
-    })
+    if cors:
+        CORS(app, resources={
+            r"/api/*": {
+                "origins": CORS_ORIGINS,
+                "methods": CORS_METHODS,
+                "allow_headers": CORS_HEADERS
+            }
+        })
     
     # Configuration
     app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
     app.config['JSON_AS_ASCII'] = False  # Support Arabic characters
     
+    # Restore the database from a snapshot instead of rebuilding it
+    if settings.DB_SNAPSHOT_DIR and Path(settings.DB_SNAPSHOT_DIR).exists():
+        manifest = load_snapshot(settings.DB_SNAPSHOT_DIR)
+        print(f"✅ Restored snapshot: {manifest['users']} users, {manifest['conversations']} conversations")
+    
+    # Load the tokenizer now rather than on the first chat request (it may be downloaded)
+    history_manager.tokens.load()
+    
     # Register blueprints
     app.register_blueprint(health_bp, url_prefix='/api')
     app.register_blueprint(chat_bp, url_prefix='/api')
     app.register_blueprint(speech_bp, url_prefix='/api')
     app.register_blueprint(ocr_bp, url_prefix='/api')
+    app.register_blueprint(customers_bp, url_prefix='/api')
     
     return app
 
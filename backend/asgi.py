@@ -0,0 +1,310 @@
+"""
+ASGI entry point for the SRM API.
+Serves /api/chat and /api/chat/stream natively on the event loop with the
+async agent, so a worker holds no thread while the model is answering.
+Every other route is served by the Flask app through a2wsgi on a small
+thread pool. CORS is applied to both by one middleware.
+
+Run with:
+    cd backend && uvicorn asgi:app --host 0.0.0.0 --port 5000 --workers 4
+"""
+import asyncio
+import json
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+
+from a2wsgi import WSGIMiddleware
+
+# Import the Flask app first: it puts the project root (which has its own
+# Streamlit app.py) on the path for config and services
+from app import create_app, CORS_ORIGINS, CORS_METHODS, CORS_HEADERS
+from routes.chat import prepare_turn, store_turn, sse_event, stream_event, stream_error
+from config.settings import settings
+from services.ai_service import arun_agent, astream_agent
+from data.mock_db import get_conversation_history, aconversation_turn
+
+
+logger = logging.getLogger(__name__)
+
+# CORS is applied by CORSMiddleware below, for the Flask routes as well
+flask_app = create_app(cors=False)
+flask_asgi = WSGIMiddleware(flask_app, workers=settings.ASGI_FLASK_THREADS)
+
+# Same request size limit as the Flask app
+MAX_BODY_BYTES = flask_app.config['MAX_CONTENT_LENGTH']
+
+ERROR_AR = 'حدث خطأ في المعالجة'
+
+
+async def api(scope: Dict[str, Any], receive, send) -> None:
+    """
+    Route a request to a native handler, or to the Flask app.
+
+    Args:
+        scope: Connection scope
+        receive: Awaitable returning the next client message
+        send: Awaitable sending a message to the client
+    """
+    handler = NATIVE_ROUTES.get((scope['method'], scope['path'])) if scope['type'] == 'http' else None
+    if handler is None:
+        # Flask routes and lifespan events
+        await flask_asgi(scope, receive, send)
+        return
+
+    body, size = await _read_body(receive)
+    if body is None:
+        # Client went away before sending the whole request
+        return
+    if size > MAX_BODY_BYTES:
+        await _send_json(send, {
+            'error': 'Request body too large',
+            'error_ar': 'حجم الطلب كبير جداً'
+        }, 413)
+        return
+    await handler(body, receive, send)
+
+
+class CORSMiddleware:
+    """
+    The CORS policy of app.py (CORS_ORIGINS, CORS_METHODS, CORS_HEADERS) for
+    /api/*, applied the way Flask-CORS does: preflight requests are answered
+    here, and responses to an allowed origin get Access-Control-Allow-Origin.
+    """
+
+    def __init__(self, app, origins: List[str], methods: List[str], headers: List[str], prefix: str = '/api/'):
+        self.app = app
+        self.origins = set(origins)
+        self.methods = ', '.join(methods).encode('latin-1')
+        self.headers = {header.lower() for header in headers}
+        self.prefix = prefix
+
+    async def __call__(self, scope: Dict[str, Any], receive, send) -> None:
+        if scope['type'] != 'http' or not scope['path'].startswith(self.prefix):
+            await self.app(scope, receive, send)
+            return
+
+        request_headers = dict(scope['headers'])
+        origin = request_headers.get(b'origin')
+        allowed = origin is not None and origin.decode('latin-1') in self.origins
+
+        if scope['method'] == 'OPTIONS' and b'access-control-request-method' in request_headers:
+            await self._preflight(request_headers, origin if allowed else None, send)
+            return
+        if not allowed:
+            await self.app(scope, receive, send)
+            return
+
+        async def send_with_cors(message: Dict[str, Any]) -> None:
+            if message['type'] == 'http.response.start':
+                message = dict(message, headers=list(message.get('headers', [])) + [
+                    (b'access-control-allow-origin', origin),
+                    (b'vary', b'Origin')
+                ])
+            await send(message)
+
+        await self.app(scope, receive, send_with_cors)
+
+    async def _preflight(self, request_headers: Dict[bytes, bytes], origin: Optional[bytes], send) -> None:
+        """Answer a preflight request (without CORS headers for other origins)."""
+        headers = [(b'content-length', b'0')]
+        if origin is not None:
+            requested = request_headers.get(b'access-control-request-headers', b'').decode('latin-1')
+            allowed = [name.strip() for name in requested.split(',') if name.strip().lower() in self.headers]
+            headers += [
+                (b'access-control-allow-origin', origin),
+                (b'access-control-allow-methods', self.methods),
+                (b'vary', b'Origin')
+            ]
+            if allowed:
+                headers.append((b'access-control-allow-headers', ', '.join(allowed).encode('latin-1')))
+        await send({'type': 'http.response.start', 'status': 200, 'headers': headers})
+        await send({'type': 'http.response.body', 'body': b'', 'more_body': False})
+
+
+async def chat(body: bytes, receive, send) -> None:
+    """Async POST /api/chat (same contract as routes.chat.chat)."""
+    try:
+        turn, error = await asyncio.to_thread(prepare_turn, _parse_json(body))
+        if error:
+            await _send_json(send, error[0], error[1])
+            return
+
+        user_message = turn['message']
+        conversation_id = turn['conversation_id']
+
+        # One turn at a time per conversation so messages never interleave
+        async with aconversation_turn(conversation_id):
+            chat_history = await asyncio.to_thread(get_conversation_history, conversation_id)
+            turn_messages = []
+            response = await arun_agent(
+                turn['agent'], user_message, chat_history, turn_messages, conversation_id=conversation_id
+            )
+            await asyncio.to_thread(store_turn, conversation_id, user_message, turn_messages, response)
+
+    except Exception as e:
+        logger.exception("Error running chat turn")
+        await _send_json(send, {'error': str(e), 'error_ar': ERROR_AR}, 500)
+        return
+
+    await _send_json(send, {
+        'response': response,
+        'conversation_id': conversation_id,
+        'is_new_conversation': turn['is_new_conversation'],
+        'status': 'success'
+    }, 200)
+
+
+async def chat_stream(body: bytes, receive, send) -> None:
+    """
+    Async POST /api/chat/stream (same events as routes.chat.chat_stream).
+
+    A client disconnect cancels the turn: the model stream is closed and
+    nothing is stored.
+    """
+    try:
+        turn, error = await asyncio.to_thread(prepare_turn, _parse_json(body))
+    except Exception as e:
+        logger.exception("Error preparing chat turn")
+        turn, error = None, ({'error': str(e), 'error_ar': ERROR_AR}, 500)
+    if error:
+        await _send_json(send, error[0], error[1])
+        return
+
+    await send({
+        'type': 'http.response.start',
+        'status': 200,
+        'headers': [
+            (b'content-type', b'text/event-stream; charset=utf-8'),
+            (b'cache-control', b'no-cache'),
+            # Stop reverse proxies (nginx) from buffering the stream
+            (b'x-accel-buffering', b'no')
+        ]
+    })
+
+    pump = asyncio.ensure_future(_stream_turn(turn, send))
+    disconnect = asyncio.ensure_future(_wait_disconnect(receive))
+    try:
+        await asyncio.wait({pump, disconnect}, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        for task in (pump, disconnect):
+            task.cancel()
+        # Let the turn unwind (close the model stream, release the turn lock)
+        results = await asyncio.gather(pump, disconnect, return_exceptions=True)
+
+    if isinstance(results[0], Exception):
+        logger.error("Error streaming chat turn", exc_info=results[0])
+    if disconnect.cancelled():
+        # Still connected: end the response
+        await send({'type': 'http.response.body', 'body': b'', 'more_body': False})
+
+
+async def _stream_turn(turn: Dict[str, Any], send) -> None:
+    """Run a streamed turn, sending each event as it is produced."""
+    user_message = turn['message']
+    conversation_id = turn['conversation_id']
+
+    # Flush a first event before any model work
+    await _send_event(send, 'start', {
+        'conversation_id': conversation_id,
+        'is_new_conversation': turn['is_new_conversation']
+    })
+
+    try:
+        # One turn at a time per conversation so messages never interleave
+        async with aconversation_turn(conversation_id):
+            chat_history = await asyncio.to_thread(get_conversation_history, conversation_id)
+            turn_messages = []
+            response = ''
+            events = astream_agent(
+                turn['agent'], user_message, chat_history, turn_messages, conversation_id=conversation_id
+            )
+
+            # Closing events on cancellation closes the model stream as well
+            try:
+                async for event, payload in events:
+                    if event == 'answer':
+                        response = payload
+                    else:
+                        await _send(send, stream_event(event, payload))
+            finally:
+                await events.aclose()
+
+            # Store the whole turn once the answer is complete
+            await asyncio.to_thread(store_turn, conversation_id, user_message, turn_messages, response)
+
+    except Exception as e:
+        # Headers are sent already: report the failure as the last event
+        logger.exception("Error streaming chat turn")
+        await _send(send, stream_error(conversation_id, e))
+        return
+
+    await _send_event(send, 'done', {
+        'response': response,
+        'conversation_id': conversation_id,
+        'status': 'success'
+    })
+
+
+async def _send_event(send, event: str, data: dict) -> None:
+    await _send(send, sse_event(event, data))
+
+
+async def _send(send, text: str) -> None:
+    await send({'type': 'http.response.body', 'body': text.encode('utf-8'), 'more_body': True})
+
+
+async def _wait_disconnect(receive) -> None:
+    """Return once the client has disconnected."""
+    while (await receive())['type'] != 'http.disconnect':
+        pass
+
+
+async def _read_body(receive) -> Tuple[Optional[bytes], int]:
+    """
+    Read the request body, keeping at most MAX_BODY_BYTES of it.
+
+    Returns:
+        tuple: (body, or None if the client disconnected first; full size in bytes)
+    """
+    chunks = []
+    size = 0
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            return None, size
+        chunk = message.get('body', b'')
+        size += len(chunk)
+        if size <= MAX_BODY_BYTES:
+            chunks.append(chunk)
+        if not message.get('more_body', False):
+            return b''.join(chunks), size
+
+
+def _parse_json(body: bytes) -> Optional[dict]:
+    try:
+        data = json.loads(body or b'null')
+    except ValueError:
+        return None
+    return data if isinstance(data, dict) else None
+
+
+async def _send_json(send, data: dict, status: int) -> None:
+    body = json.dumps(data, ensure_ascii=False).encode('utf-8')
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [
+            (b'content-type', b'application/json; charset=utf-8'),
+            (b'content-length', str(len(body)).encode('latin-1'))
+        ]
+    })
+    await send({'type': 'http.response.body', 'body': body, 'more_body': False})
+
+
+# Routes served natively; (method, path) -> handler
+NATIVE_ROUTES = {
+    ('POST', '/api/chat'): chat,
+    ('POST', '/api/chat/stream'): chat_stream,
+}
+
+app = CORSMiddleware(api, CORS_ORIGINS, CORS_METHODS, CORS_HEADERS)
@@ -1,27 +1,85 @@
 """
 Chat API endpoints for agent interactions.
 """
-from flask import Blueprint, request, jsonify
-from services.ai_service import initialize_agent, run_agent
+import json
+from typing import Optional, Tuple
+from flask import Blueprint, Response, request, jsonify, make_response, stream_with_context
+from services.ai_service import get_agent_executor, run_agent, stream_agent
 from data.mock_db import (
     create_conversation, 
     get_conversation, 
     add_message_to_conversation,
-    get_conversation_history
+    get_conversation_history,
+    get_message_count,
+    conversation_turn
 )
 
 chat_bp = Blueprint('chat', __name__)
 
-# Initialize agent once (singleton)
-agent = None
-
+# Maximum number of messages returned by one history page
+MAX_HISTORY_PAGE = 500
 
 def get_agent():
-    """Get or create the AI agent."""
-    global agent
-    if agent is None:
-        agent = initialize_agent()
-    return agent
+    """Get the process-wide AI agent."""
+    return get_agent_executor()
+
+
+def prepare_turn(data: Optional[dict]) -> Tuple[Optional[dict], Optional[Tuple[dict, int]]]:
+    """
+    Validate a chat request body and resolve its conversation and agent.
+    
+    Shared by the Flask routes and the ASGI app (backend/asgi.py).
+    
+    Args:
+        data: Parsed JSON body
+    
+    Returns:
+        tuple: ({'message', 'conversation_id', 'is_new_conversation', 'agent'}, None)
+            or (None, (error body, HTTP status))
+    """
+    if not data or 'message' not in data:
+        return None, ({
+            'error': 'Missing required field: message',
+            'error_ar': 'الرجاء تقديم رسالة'
+        }, 400)
+    
+    conversation_id = data.get('conversation_id')
+    
+    # Create new conversation if no ID provided
+    if not conversation_id:
+        conversation_id = create_conversation()
+        is_new_conversation = True
+    else:
+        # Verify conversation exists
+        if not get_conversation(conversation_id):
+            return None, ({
+                'error': 'Invalid conversation_id',
+                'error_ar': 'معرف المحادثة غير صالح'
+            }, 404)
+        is_new_conversation = False
+    
+    # Get agent
+    agent_instance = get_agent()
+    if not agent_instance:
+        return None, ({
+            'error': 'Agent initialization failed',
+            'error_ar': 'فشل تهيئة النظام'
+        }, 500)
+    
+    return {
+        'message': data['message'],
+        'conversation_id': conversation_id,
+        'is_new_conversation': is_new_conversation,
+        'agent': agent_instance
+    }, None
+
+
+def store_turn(conversation_id: str, user_message: str, turn_messages: list, response: str) -> None:
+    """Store a completed turn: user message, tool calls and results, then the answer."""
+    add_message_to_conversation(conversation_id, 'user', user_message)
+    for message in turn_messages:
+        add_message_to_conversation(conversation_id, **message)
+    add_message_to_conversation(conversation_id, 'assistant', response)
 
 
 @chat_bp.route('/chat', methods=['POST'])
@@ -43,50 +101,35 @@ def chat():
         }
     """
     try:
-        data = request.get_json()
-        
-        if not data or 'message' not in data:
-            return jsonify({
-                'error': 'Missing required field: message',
-                'error_ar': 'الرجاء تقديم رسالة'
-            }), 400
+        turn, error = prepare_turn(request.get_json())
+        if error:
+            return jsonify(error[0]), error[1]
         
-        user_message = data['message']
-        conversation_id = data.get('conversation_id')
-        
-        # Create new conversation if no ID provided
-        if not conversation_id:
-            conversation_id = create_conversation()
-            is_new_conversation = True
-        else:
-            # Verify conversation exists
-            conversation = get_conversation(conversation_id)
-            if not conversation:
-                return jsonify({
-                    'error': 'Invalid conversation_id',
-                    'error_ar': 'معرف المحادثة غير صالح'
-                }), 404
-            is_new_conversation = False
-        
-        # Get conversation history
-        chat_history = get_conversation_history(conversation_id)
-        
-        # Store user message
-        add_message_to_conversation(conversation_id, 'user', user_message)
-        
-        # Get agent
-        agent_instance = get_agent()
-        if not agent_instance:
-            return jsonify({
-                'error': 'Agent initialization failed',
-                'error_ar': 'فشل تهيئة النظام'
-            }), 500
+        user_message = turn['message']
+        conversation_id = turn['conversation_id']
+        is_new_conversation = turn['is_new_conversation']
+        agent_instance = turn['agent']
         
-        # Run agent with conversation history
-        response = run_agent(agent_instance, user_message, chat_history)
-        
-        # Store assistant response
-        add_message_to_conversation(conversation_id, 'assistant', response)
+        # One turn at a time per conversation so messages never interleave
+        with conversation_turn(conversation_id):
+            # Get conversation history
+            chat_history = get_conversation_history(conversation_id)
+            
+            # Store user message
+            add_message_to_conversation(conversation_id, 'user', user_message)
+            
+            # Run agent with conversation history
+            turn_messages = []
+            response = run_agent(
+                agent_instance, user_message, chat_history, turn_messages, conversation_id=conversation_id
+            )
+            
+            # Store tool calls and results so later turns can reuse them
+            for message in turn_messages:
+                add_message_to_conversation(conversation_id, **message)
+            
+            # Store assistant response
+            add_message_to_conversation(conversation_id, 'assistant', response)
         
         return jsonify({
             'response': response,
@@ -102,6 +145,123 @@ def chat():
         }), 500
 
 
+@chat_bp.route('/chat/stream', methods=['POST'])
+def chat_stream():
+    """
+    Chat endpoint streaming the answer as Server-Sent Events.
+    
+    Request Body: same as /chat
+    
+    Events:
+        start: {"conversation_id", "is_new_conversation"} sent right away
+        tool:  {"tools": [{"name", "args"}, ...]} before each round of tool calls
+        token: {"text": "..."} next piece of the answer
+        reset: {} drop the tokens received so far; the model failed mid-answer
+               and a replacement answer follows as new tokens
+        done:  {"response", "conversation_id", "status"} once the answer is stored
+        error: {"error", "error_ar", "conversation_id", "status"} instead of
+               done when the turn failed; nothing is stored
+    
+    The turn is stored only when the stream completes. If the client
+    disconnects, the model's stream is closed (cancelling generation) and
+    nothing is stored.
+    
+    Returns:
+        text/event-stream response
+    """
+    try:
+        turn, error = prepare_turn(request.get_json())
+        if error:
+            return jsonify(error[0]), error[1]
+        
+        user_message = turn['message']
+        conversation_id = turn['conversation_id']
+        is_new_conversation = turn['is_new_conversation']
+        agent_instance = turn['agent']
+        
+    except Exception as e:
+        return jsonify({
+            'error': str(e),
+            'error_ar': 'حدث خطأ في المعالجة'
+        }), 500
+    
+    def generate():
+        # Flush headers and a first event before any model work
+        yield sse_event('start', {
+            'conversation_id': conversation_id,
+            'is_new_conversation': is_new_conversation
+        })
+        
+        try:
+            # One turn at a time per conversation so messages never interleave
+            with conversation_turn(conversation_id):
+                chat_history = get_conversation_history(conversation_id)
+                turn_messages = []
+                response = ''
+                events = stream_agent(
+                    agent_instance, user_message, chat_history, turn_messages, conversation_id=conversation_id
+                )
+                
+                # Closing events on disconnect closes the model stream as well
+                try:
+                    for event, payload in events:
+                        if event == 'answer':
+                            response = payload
+                        else:
+                            yield stream_event(event, payload)
+                finally:
+                    events.close()
+                
+                # Store the whole turn once the answer is complete
+                store_turn(conversation_id, user_message, turn_messages, response)
+        
+        except Exception as e:
+            # Headers are sent already: report the failure as the last event
+            print(f"Error streaming chat turn: {str(e)}")
+            yield stream_error(conversation_id, e)
+            return
+        
+        yield sse_event('done', {
+            'response': response,
+            'conversation_id': conversation_id,
+            'status': 'success'
+        })
+    
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={
+            'Cache-Control': 'no-cache',
+            # Stop reverse proxies (nginx) from buffering the stream
+            'X-Accel-Buffering': 'no'
+        }
+    )
+
+
+def sse_event(event: str, data: dict) -> str:
+    """Format one Server-Sent Event."""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+def stream_event(event: str, payload) -> str:
+    """Server-Sent Event for a stream_agent event other than the final answer."""
+    if event == 'tools':
+        return sse_event('tool', {'tools': payload})
+    if event == 'token':
+        return sse_event('token', {'text': payload})
+    return sse_event(event, {})
+
+
+def stream_error(conversation_id: str, error: Exception) -> str:
+    """Server-Sent Event ending a streamed turn that failed."""
+    return sse_event('error', {
+        'error': str(error),
+        'error_ar': 'حدث خطأ في المعالجة',
+        'conversation_id': conversation_id,
+        'status': 'error'
+    })
+
+
 @chat_bp.route('/chat/reset', methods=['POST'])
 def reset_chat():
     """
@@ -120,30 +280,78 @@ def reset_chat():
 @chat_bp.route('/chat/history/<conversation_id>', methods=['GET'])
 def get_history(conversation_id: str):
     """
-    Get conversation history by conversation_id.
+    Get conversation history by conversation_id, one page at a time.
+    
+    Query Parameters:
+        after: Cursor, the number of stored messages already read (default 0)
+        limit: Maximum stored messages to read (default and maximum 500)
+        include_tools: 1 to also return the agent's tool calls and tool
+            results (default 0: user and assistant answers only)
+    
+    The cursor counts every stored message, tool messages included, so
+    next_after stays valid with or without include_tools.
+    
+    The ETag identifies the page: message count, after, limit and
+    include_tools. A matching If-None-Match gets 304 Not Modified without
+    serializing any message.
     
     Args:
         conversation_id: Unique conversation identifier
     
     Returns:
-        JSON: Conversation history with all messages
+        JSON: Page of messages with the cursor for the next request
     """
     try:
-        conversation = get_conversation(conversation_id)
+        after = request.args.get('after', 0, type=int)
+        limit = request.args.get('limit', MAX_HISTORY_PAGE, type=int)
+        include_tools = request.args.get('include_tools', '0').lower() in ('1', 'true', 'yes')
+        
+        if after < 0 or not 1 <= limit <= MAX_HISTORY_PAGE:
+            return jsonify({
+                'error': f'after must be >= 0 and limit between 1 and {MAX_HISTORY_PAGE}',
+                'error_ar': 'معايير الصفحة غير صالحة'
+            }), 400
         
-        if not conversation:
+        message_count = get_message_count(conversation_id)
+        
+        if message_count is None:
             return jsonify({
                 'error': 'Conversation not found',
                 'error_ar': 'المحادثة غير موجودة'
             }), 404
         
-        return jsonify({
+        # A page only stays unchanged for the same cursor, size and message count
+        etag = f"{message_count}:{after}:{limit}:{int(include_tools)}"
+        if request.if_none_match.contains(etag):
+            response = make_response('', 304)
+            response.set_etag(etag)
+            return response
+        
+        # Slice up to the counted messages so the page always matches the ETag
+        conversation = get_conversation(conversation_id)
+        page_size = max(0, min(limit, message_count - after))
+        page = get_conversation_history(conversation_id, after, page_size)
+        # Tool calls and raw tool results (customer records) are for the agent's replay only
+        messages = [
+            message.to_dict()
+            for message in page
+            if include_tools or (message["role"] != "tool" and not message.get("tool_calls"))
+        ]
+        next_after = after + len(page)
+        
+        response = make_response(jsonify({
             'conversation_id': conversation_id,
             'created_at': conversation['created_at'],
-            'messages': conversation['messages'],
-            'message_count': len(conversation['messages']),
+            'messages': messages,
+            'message_count': message_count,
+            'after': after,
+            'next_after': next_after,
+            'has_more': next_after < message_count,
             'status': 'success'
-        }), 200
+        }), 200)
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'no-cache'
+        return response
         
     except Exception as e:
         return jsonify({
@@ -0,0 +1,70 @@
+"""
+Customer lookup endpoints for bulk operations.
+"""
+from flask import Blueprint, request, jsonify
+from data.mock_db import get_users_by_cils
+
+customers_bp = Blueprint('customers', __name__)
+
+# Upper bound on CILs per batch request
+MAX_BATCH_SIZE = 1000
+
+
+@customers_bp.route('/customers/lookup', methods=['POST'])
+def lookup_customers():
+    """
+    Resolve many CILs in a single request.
+    
+    Request Body:
+        {
+            "cils": ["1071324-101", "5029012-505"],
+            "include_zone": true
+        }
+    
+    Returns:
+        JSON: {
+            "customers": [...],
+            "not_found": ["..."],
+            "count": 2,
+            "status": "success"
+        }
+    """
+    try:
+        data = request.get_json(silent=True)
+        
+        if not data or not isinstance(data.get('cils'), list):
+            return jsonify({
+                'error': 'Missing required field: cils (list)',
+                'error_ar': 'الرجاء تقديم قائمة أرقام CIL'
+            }), 400
+        
+        if not all(isinstance(cil, str) for cil in data['cils']):
+            return jsonify({
+                'error': 'Every CIL must be a string',
+                'error_ar': 'يجب أن يكون كل رقم CIL نصاً'
+            }), 400
+        
+        cils = [cil.strip() for cil in data['cils']]
+        
+        if len(cils) > MAX_BATCH_SIZE:
+            return jsonify({
+                'error': f'Too many CILs: maximum is {MAX_BATCH_SIZE}',
+                'error_ar': 'عدد أرقام CIL يتجاوز الحد المسموح به'
+            }), 400
+        
+        customers = get_users_by_cils(cils, include_zone=bool(data.get('include_zone', True)))
+        found = {customer['cil'] for customer in customers}
+        not_found = [cil for cil in dict.fromkeys(cils) if cil not in found]
+        
+        return jsonify({
+            'customers': customers,
+            'not_found': not_found,
+            'count': len(customers),
+            'status': 'success'
+        }), 200
+        
+    except Exception as e:
+        return jsonify({
+            'error': str(e),
+            'error_ar': 'حدث خطأ في البحث عن العملاء'
+        }), 500
@@ -1,7 +1,13 @@
 """
-Health check endpoint.
+Health check and metrics endpoints.
 """
 from flask import Blueprint, jsonify
+from data.mock_db import conversations_store
+from services.ai_service import (
+    agent_metrics, tool_cache, tool_flights, llm_flights, broadcast_cache, history_manager, llm_guard,
+    prompt_assembler, tool_dispatcher
+)
+from services.ocr_service import ocr_flights
 
 health_bp = Blueprint('health', __name__)
 
@@ -19,3 +25,34 @@ def health_check():
         'service': 'SRM AI Customer Service',
         'version': '1.0.0'
     }), 200
+
+
+@health_bp.route('/metrics', methods=['GET'])
+def metrics():
+    """
+    Operational metrics for the in-memory stores and the agent.
+    
+    Returns:
+        JSON: Conversation store size, hit rate and evictions; agent LLM calls
+              per turn; tool pool load and timeouts; tool result cache hits
+              and misses; coalesced requests; turns served from zone
+              broadcast answers; history summaries;
+              prompt messages reused between turns; Azure OpenAI retries,
+              hedges and circuit breaker
+    """
+    return jsonify({
+        'conversations': conversations_store.stats(),
+        'agent': agent_metrics.snapshot(),
+        'tool_cache': tool_cache.stats(),
+        'tools': tool_dispatcher.stats(),
+        'broadcast': broadcast_cache.stats(),
+        'history': history_manager.stats(),
+        'prompt': prompt_assembler.stats(),
+        'llm': llm_guard.stats(),
+        'coalescing': {
+            'llm': llm_flights.stats(),
+            'tools': tool_flights.stats(),
+            'ocr': ocr_flights.stats()
+        },
+        'status': 'success'
+    }), 200
@@ -14,7 +14,8 @@ from data.mock_db import (
     create_conversation,
     get_conversation,
     add_message_to_conversation,
-    get_conversation_history
+    get_conversation_history,
+    conversation_turn
 )
 
 speech_bp = Blueprint('speech', __name__)
@@ -198,12 +199,6 @@ def speech_to_chat():
                     }), 404
                 is_new_conversation = False
             
-            # Get conversation history
-            chat_history = get_conversation_history(conversation_id)
-            
-            # Store user message
-            add_message_to_conversation(conversation_id, 'user', transcribed_text)
-            
             # Get agent
             from routes.chat import get_agent
             agent_instance = get_agent()
@@ -214,11 +209,26 @@ def speech_to_chat():
                     'error_ar': 'فشل تهيئة النظام'
                 }), 500
             
-            # Run agent with conversation history
-            response = run_agent(agent_instance, transcribed_text, chat_history)
-            
-            # Store assistant response
-            add_message_to_conversation(conversation_id, 'assistant', response)
+            # One turn at a time per conversation so messages never interleave
+            with conversation_turn(conversation_id):
+                # Get conversation history
+                chat_history = get_conversation_history(conversation_id)
+                
+                # Store user message
+                add_message_to_conversation(conversation_id, 'user', transcribed_text)
+                
+                # Run agent with conversation history
+                turn_messages = []
+                response = run_agent(
+                    agent_instance, transcribed_text, chat_history, turn_messages, conversation_id=conversation_id
+                )
+                
+                # Store tool calls and results so later turns can reuse them
+                for message in turn_messages:
+                    add_message_to_conversation(conversation_id, **message)
+                
+                # Store assistant response
+                add_message_to_conversation(conversation_id, 'assistant', response)
             
             return jsonify({
                 'transcribed_text': transcribed_text,
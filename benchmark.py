@@ -0,0 +1,365 @@
+"""
+Performance benchmarks for the SRM data layer and services.
+Run with: python benchmark.py [number_of_customers]
+"""
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+import numpy as np
+import pandas as pd
+
+
+def make_synthetic_users(n: int, seed: int = 0) -> pd.DataFrame:
+    """
+    Generate a users table shaped like the real customer export (plain object/int64 dtypes).
+
+    Args:
+        n: Number of customers
+        seed: Random seed
+
+    Returns:
+        DataFrame: Raw users table as it would come out of a CSV parse
+    """
+    rng = np.random.default_rng(seed)
+    ids = np.arange(n)
+    paid = rng.random(n) < 0.9
+
+    return pd.DataFrame({
+        'cil': [f"{1000000 + i:07d}-{i % 900 + 100:03d}" for i in ids],
+        'name': [f"عميل رقم {i}" for i in ids],
+        'address': [f"شارع {i % 500}، حي {i % 37}" for i in ids],
+        'phone': [f"06{i % 100000000:08d}" for i in ids],
+        'service_type': rng.choice(['ماء وكهرباء', 'ماء', 'كهرباء'], n),
+        'zone_id': rng.integers(1, 5, n),
+        'payment_status': np.where(paid, 'مدفوع', 'غير مدفوع'),
+        'last_payment_date': rng.choice(['2024-11-15', '2024-11-08', '2024-10-01', '2024-08-15'], n),
+        'outstanding_balance': np.where(paid, 0.0, rng.integers(50, 2000, n).astype(float)),
+        'service_status': np.where(paid, 'نشط', 'مقطوع')
+    })
+
+
+def bench_users_memory(n: int) -> None:
+    """Compare bytes per customer for the raw and the compact users table."""
+    from data.mock_db import build_users_table, memory_footprint
+
+    raw = make_synthetic_users(n)
+    before = memory_footprint(raw)
+    after = memory_footprint(build_users_table(raw.copy()))
+
+    print(f"   customers:         {n:,}")
+    print(f"   before (object):   {before['bytes_per_row']:.1f} bytes/customer ({before['total_bytes'] / 1e6:.1f} MB)")
+    print(f"   after (compact):   {after['bytes_per_row']:.1f} bytes/customer ({after['total_bytes'] / 1e6:.1f} MB)")
+    print(f"   saving:            {1 - after['total_bytes'] / before['total_bytes']:.1%}")
+
+
+def bench_snapshot_restore(n: int) -> None:
+    """Compare a full CSV import with restoring a binary snapshot."""
+    from data.importer import import_users
+    from data.snapshot import save_snapshot, load_snapshot
+
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_path = Path(tmp) / 'users.csv'
+        make_synthetic_users(n).to_csv(csv_path, index=False)
+
+        start = time.perf_counter()
+        import_users(str(csv_path))
+        parse_seconds = time.perf_counter() - start
+
+        save_snapshot(str(Path(tmp) / 'snapshot'))
+
+        start = time.perf_counter()
+        load_snapshot(str(Path(tmp) / 'snapshot'))
+        restore_seconds = time.perf_counter() - start
+
+    print(f"   full CSV parse:    {parse_seconds * 1000:.0f} ms")
+    print(f"   snapshot restore:  {restore_seconds * 1000:.0f} ms ({parse_seconds / restore_seconds:.1f}x faster)")
+
+
+def bench_conversation_concurrency(turns_per_thread: int = 200, simulated_llm_seconds: float = 0.002) -> None:
+    """
+    Stress the conversation store from many threads.
+
+    Each thread runs chat turns (read history, wait like an LLM call, store
+    user + assistant messages) on conversations shared with other threads.
+    Checks that no message is lost or interleaved, and reports throughput.
+    """
+    from data import mock_db
+
+    for threads in (1, 2, 4, 8, 16):
+        conversation_ids = [mock_db.create_conversation() for _ in range(threads * 2)]
+
+        def worker(worker_id: int) -> None:
+            for turn in range(turns_per_thread):
+                conversation_id = conversation_ids[(worker_id + turn) % len(conversation_ids)]
+                with mock_db.conversation_turn(conversation_id):
+                    mock_db.get_conversation_history(conversation_id)
+                    mock_db.add_message_to_conversation(conversation_id, 'user', f"{worker_id}:{turn}")
+                    time.sleep(simulated_llm_seconds)
+                    mock_db.add_message_to_conversation(conversation_id, 'assistant', f"{worker_id}:{turn}")
+
+        pool = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+        start = time.perf_counter()
+        for thread in pool:
+            thread.start()
+        for thread in pool:
+            thread.join()
+        elapsed = time.perf_counter() - start
+
+        stored = 0
+        interleaved = 0
+        for conversation_id in conversation_ids:
+            messages = mock_db.get_conversation_history(conversation_id)
+            stored += len(messages)
+            pairs = zip(messages[::2], messages[1::2])
+            interleaved += sum(1 for user, reply in pairs if user['content'] != reply['content'])
+
+        expected = threads * turns_per_thread * 2
+        print(f"   {threads:>2} threads: {threads * turns_per_thread / elapsed:>7.0f} turns/s, "
+              f"{expected - stored} lost, {interleaved} interleaved")
+
+
+def bench_conversation_memory(conversations: int = 100_000, turns: int = 3) -> None:
+    """
+    Compare the memory held by conversation histories as dicts and as compact records.
+
+    Each conversation gets `turns` user/assistant pairs of typical length; the
+    compact variant is measured warm and after cold compression.
+    """
+    import tracemalloc
+    from datetime import datetime
+    from data.messages import Message
+
+    greeting = "السلام عليكم، رقم CIL الخاص بي هو 1071324-101"
+    reply = ("مرحباً! حالة الدفع: مدفوع. آخر دفعة بتاريخ 2024-11-15 والرصيد المستحق 0 درهم. "
+             "لا توجد أعمال صيانة جارية في منطقتك حالياً، والخدمة تعمل بشكل طبيعي. ") * 2
+
+    def build(make_message, cold=False):
+        tracemalloc.start()
+        histories = [
+            [make_message(role, f"{text} #{i}" if role == 'assistant' else text)
+             for _ in range(turns) for role, text in (('user', greeting), ('assistant', reply))]
+            for i in range(conversations)
+        ]
+        if cold:
+            for history in histories:
+                for message in history:
+                    message.compress()
+        current, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        del histories
+        return current
+
+    def as_dict(role, content):
+        return {'role': role, 'content': content, 'timestamp': datetime.now().isoformat()}
+
+    dict_bytes = build(as_dict)
+    compact_bytes = build(Message)
+    cold_bytes = build(Message, cold=True)
+
+    messages = conversations * turns * 2
+    print(f"   conversations:     {conversations:,} ({messages:,} messages)")
+    print(f"   dict messages:     {dict_bytes / messages:.0f} bytes/message ({dict_bytes / 1e6:.0f} MB)")
+    print(f"   compact (warm):    {compact_bytes / messages:.0f} bytes/message ({compact_bytes / 1e6:.0f} MB)")
+    print(f"   compact (cold):    {cold_bytes / messages:.0f} bytes/message ({cold_bytes / 1e6:.0f} MB)")
+
+
+def bench_llm_connection_reuse(requests: int = 200) -> None:
+    """
+    Compare building an HTTP client per request with the shared pooled client.
+
+    Runs against a local keep-alive HTTP server, so the numbers isolate the
+    client-side setup (TLS context, connection pool, TCP connect) that the
+    shared client avoids; over TLS to Azure the handshake adds more per request.
+    """
+    import httpx
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+    from services.llm_client import get_http_client
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+        disable_nagle_algorithm = True
+
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get('Content-Length', 0)))
+            body = b'{"ok": true}'
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}/chat/completions"
+
+    start = time.perf_counter()
+    for _ in range(requests):
+        with httpx.Client() as client:
+            client.post(url, json={'messages': []})
+    per_request = (time.perf_counter() - start) / requests
+
+    client = get_http_client()
+    client.post(url, json={'messages': []})
+    start = time.perf_counter()
+    for _ in range(requests):
+        client.post(url, json={'messages': []})
+    pooled = (time.perf_counter() - start) / requests
+
+    server.shutdown()
+    print(f"   new client per request: {per_request * 1000:.2f} ms/request")
+    print(f"   shared pooled client:   {pooled * 1000:.2f} ms/request")
+    print(f"   setup saved:            {(per_request - pooled) * 1000:.2f} ms/request")
+
+
+def bench_async_concurrency(conversations: int = 200, threads: int = 8, model_seconds: float = 0.5) -> None:
+    """
+    Compare chat turns per worker: sync run_agent on a gthread-sized pool vs arun_agent on one event loop.
+
+    The model is simulated with a fixed latency (no network), so the numbers
+    show how many turns one worker keeps in flight while waiting on Azure
+    OpenAI: the sync worker is capped at one turn per thread, the async
+    worker only by the model.
+    """
+    import asyncio
+    from concurrent.futures import ThreadPoolExecutor
+    from langchain_core.messages import AIMessage
+    from services import ai_service
+
+    class SimulatedModel:
+        usage = {'input_tokens': 400, 'output_tokens': 60, 'total_tokens': 460}
+
+        def invoke(self, messages):
+            time.sleep(model_seconds)
+            return AIMessage(content="تم", usage_metadata=self.usage)
+
+        async def ainvoke(self, messages):
+            await asyncio.sleep(model_seconds)
+            return AIMessage(content="تم", usage_metadata=self.usage)
+
+    model = SimulatedModel()
+    routing, ai_service.settings.MODEL_ROUTING = ai_service.settings.MODEL_ROUTING, False
+    try:
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            list(pool.map(lambda i: ai_service.run_agent(model, f"سؤال رقم {i}"), range(conversations)))
+        sync_rate = conversations / (time.perf_counter() - start)
+
+        async def run_all():
+            await asyncio.gather(*(ai_service.arun_agent(model, f"سؤال رقم {i}") for i in range(conversations)))
+
+        start = time.perf_counter()
+        asyncio.run(run_all())
+        async_rate = conversations / (time.perf_counter() - start)
+    finally:
+        ai_service.settings.MODEL_ROUTING = routing
+
+    print(f"   conversations:     {conversations} (model latency {model_seconds * 1000:.0f} ms)")
+    print(f"   sync, {threads} threads:   {sync_rate:>7.1f} conversations/s per worker")
+    print(f"   async, 1 loop:     {async_rate:>7.1f} conversations/s per worker ({async_rate / sync_rate:.0f}x)")
+
+
+def bench_tool_output_tokens() -> None:
+    """
+    Compare the prompt tokens of a turn's tool results: verbose Arabic text vs compact JSON.
+
+    A CIL turn sends the payment and maintenance results to the model; they
+    are billed again on every later turn that replays them.
+    """
+    from data import mock_db
+    from services import ai_service
+
+    counter = ai_service.history_manager.tokens
+    cils = list(mock_db.get_all_users()['cil'])
+    totals = {}
+    for compact in (False, True):
+        totals[compact] = sum(
+            counter.count(ai_service._check_payment_impl(cil, compact=compact)) +
+            counter.count(ai_service._check_maintenance_impl(cil, compact=compact))
+            for cil in cils
+        ) / len(cils)
+
+    print(f"   customers:         {len(cils)}")
+    print(f"   verbose text:      {totals[False]:.0f} tool result tokens/turn")
+    print(f"   compact JSON:      {totals[True]:.0f} tool result tokens/turn")
+    print(f"   saved:             {totals[False] - totals[True]:.0f} tokens/turn "
+          f"({1 - totals[True] / totals[False]:.0%})")
+
+
+def bench_prompt_assembly(turns: int = 60) -> None:
+    """
+    Compare per-turn prompt assembly: converting the whole history every turn vs the kept per-conversation prefix.
+
+    Each turn adds a CIL turn's messages (user, tool calls, two tool
+    results, answer) and assembles the prompt of the next turn; the history
+    is never summarized, which is the worst case for the full rebuild.
+    """
+    from langchain_core.messages import HumanMessage, SystemMessage
+    from services import ai_service
+    from services.prompt_assembler import PromptAssembler
+
+    def turn_messages(turn: int) -> list:
+        call_ids = [f'call_{turn}_payment', f'call_{turn}_maintenance']
+        return [
+            {'role': 'user', 'content': f"رقم CIL الخاص بي هو 1071324-101، السؤال رقم {turn}"},
+            {'role': 'assistant', 'content': '', 'tool_calls': [
+                {'id': call_ids[0], 'name': 'check_payment', 'args': {'cil': '1071324-101'}},
+                {'id': call_ids[1], 'name': 'check_maintenance', 'args': {'cil': '1071324-101'}}
+            ]},
+            {'role': 'tool', 'content': ai_service._check_payment_impl('1071324-101'), 'tool_call_id': call_ids[0]},
+            {'role': 'tool', 'content': ai_service._check_maintenance_impl('1071324-101'), 'tool_call_id': call_ids[1]},
+            {'role': 'assistant', 'content': "حالة الدفع محدثة، والانقطاع بسبب صيانة في منطقتك."}
+        ]
+
+    assembler = PromptAssembler(ai_service.SYSTEM_PROMPT, ai_service._history_to_messages)
+    history = []
+    full = incremental = 0.0
+    for turn in range(turns):
+        start = time.perf_counter()
+        [SystemMessage(content=ai_service.SYSTEM_PROMPT)] + ai_service._history_to_messages(history) + \
+            [HumanMessage(content="سؤال")]
+        full += time.perf_counter() - start
+
+        start = time.perf_counter()
+        assembler.build('benchmark', None, 0, history, len(history), "سؤال")
+        incremental += time.perf_counter() - start
+
+        history = history + turn_messages(turn)
+
+    print(f"   turns:             {turns} ({len(history)} stored messages at the end)")
+    print(f"   full rebuild:      {full / turns * 1e6:>7.0f} µs/turn")
+    print(f"   kept prefix:       {incremental / turns * 1e6:>7.0f} µs/turn ({full / incremental:.1f}x faster)")
+
+
+if __name__ == '__main__':
+    customers = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+
+    print("📊 SRM Benchmarks\n")
+
+    print("1️⃣ Users table memory footprint...")
+    bench_users_memory(customers)
+
+    print("\n2️⃣ Snapshot restore vs full parse...")
+    bench_snapshot_restore(customers)
+
+    print("\n3️⃣ Conversation store under concurrent turns...")
+    bench_conversation_concurrency()
+
+    print("\n4️⃣ Conversation history memory (100k conversations)...")
+    bench_conversation_memory()
+
+    print("\n5️⃣ Azure OpenAI connection setup (per-request client vs shared pool)...")
+    bench_llm_connection_reuse()
+
+    print("\n6️⃣ Chat turns per worker (sync threads vs async event loop)...")
+    bench_async_concurrency()
+
+    print("\n7️⃣ Tool result tokens per CIL turn (verbose vs compact)...")
+    bench_tool_output_tokens()
+
+    print("\n8️⃣ Prompt assembly per turn (full rebuild vs kept prefix)...")
+    bench_prompt_assembly()
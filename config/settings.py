@@ -19,6 +19,33 @@ class Settings:
     AZURE_OPENAI_DEPLOYMENT_NAME: Optional[str] = os.getenv("AZURE_OPENAI_DEPLOYMENT_NAME", "gpt-4o")
     AZURE_OPENAI_API_VERSION: str = os.getenv("AZURE_OPENAI_API_VERSION", "2024-08-01-preview")
     
+    # Turn routing: simple turns get canned answers or the small deployment,
+    # tool-using turns the main one. Unset deployments fall back to the main model. Opt-in.
+    MODEL_ROUTING: bool = os.getenv("MODEL_ROUTING", "false").lower() in ("1", "true", "yes")
+    AZURE_OPENAI_SMALL_DEPLOYMENT_NAME: Optional[str] = os.getenv("AZURE_OPENAI_SMALL_DEPLOYMENT_NAME")
+    AZURE_OPENAI_ROUTER_DEPLOYMENT_NAME: Optional[str] = os.getenv("AZURE_OPENAI_ROUTER_DEPLOYMENT_NAME")
+    
+    # Azure OpenAI HTTP connection pool (shared per process)
+    LLM_POOL_MAX_CONNECTIONS: int = int(os.getenv("LLM_POOL_MAX_CONNECTIONS", "100"))
+    LLM_POOL_MAX_KEEPALIVE: int = int(os.getenv("LLM_POOL_MAX_KEEPALIVE", "20"))
+    LLM_POOL_KEEPALIVE_SECONDS: float = float(os.getenv("LLM_POOL_KEEPALIVE_SECONDS", "60"))
+    LLM_CONNECT_TIMEOUT: float = float(os.getenv("LLM_CONNECT_TIMEOUT", "5"))
+    LLM_READ_TIMEOUT: float = float(os.getenv("LLM_READ_TIMEOUT", "60"))
+    
+    # Azure OpenAI call resilience: deadline per call (including retries),
+    # jittered retries, optional hedging past the p95 latency, circuit breaker
+    LLM_DEADLINE_SECONDS: float = float(os.getenv("LLM_DEADLINE_SECONDS", "25"))
+    LLM_MAX_RETRIES: int = int(os.getenv("LLM_MAX_RETRIES", "2"))
+    LLM_RETRY_BASE_DELAY: float = float(os.getenv("LLM_RETRY_BASE_DELAY", "0.5"))
+    LLM_RETRY_MAX_DELAY: float = float(os.getenv("LLM_RETRY_MAX_DELAY", "8"))
+    LLM_HEDGE: bool = os.getenv("LLM_HEDGE", "false").lower() in ("1", "true", "yes")
+    LLM_HEDGE_MIN_SAMPLES: int = int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "20"))
+    LLM_BREAKER_FAILURES: int = int(os.getenv("LLM_BREAKER_FAILURES", "5"))
+    LLM_BREAKER_RESET_SECONDS: float = float(os.getenv("LLM_BREAKER_RESET_SECONDS", "30"))
+    
+    # ASGI entry point (backend/asgi.py): threads serving the Flask routes
+    ASGI_FLASK_THREADS: int = int(os.getenv("ASGI_FLASK_THREADS", "10"))
+    
     # Azure Document Intelligence Configuration
     AZURE_DOCUMENT_INTELLIGENCE_ENDPOINT: Optional[str] = os.getenv("AZURE_DOCUMENT_INTELLIGENCE_ENDPOINT")
     AZURE_DOCUMENT_INTELLIGENCE_KEY: Optional[str] = os.getenv("AZURE_DOCUMENT_INTELLIGENCE_KEY")
@@ -27,6 +54,60 @@ class Settings:
     AZURE_SPEECH_KEY: Optional[str] = os.getenv("AZURE_SPEECH_KEY")
     AZURE_SPEECH_REGION: Optional[str] = os.getenv("AZURE_SPEECH_REGION", "francecentral")
     
+    # Conversation store limits (LRU eviction by count, bytes and idle time; idle ones compressed)
+    CONVERSATION_MAX_ENTRIES: int = int(os.getenv("CONVERSATION_MAX_ENTRIES", "10000"))
+    CONVERSATION_MAX_BYTES: int = int(os.getenv("CONVERSATION_MAX_BYTES", str(256 * 1024 * 1024)))
+    CONVERSATION_TTL_SECONDS: float = float(os.getenv("CONVERSATION_TTL_SECONDS", str(24 * 3600)))
+    CONVERSATION_SHARDS: int = int(os.getenv("CONVERSATION_SHARDS", "16"))
+    CONVERSATION_COLD_SECONDS: float = float(os.getenv("CONVERSATION_COLD_SECONDS", "600"))
+    
+    # Durable conversation log (disabled when no directory is set)
+    CONVERSATION_LOG_DIR: Optional[str] = os.getenv("CONVERSATION_LOG_DIR")
+    CONVERSATION_LOG_SEGMENT_BYTES: int = int(os.getenv("CONVERSATION_LOG_SEGMENT_BYTES", str(64 * 1024 * 1024)))
+    CONVERSATION_LOG_FSYNC_INTERVAL: float = float(os.getenv("CONVERSATION_LOG_FSYNC_INTERVAL", "1.0"))
+    # Compact in the background once this many segments are sealed (0: never),
+    # dropping conversations idle for longer than the retention
+    CONVERSATION_LOG_COMPACT_SEGMENTS: int = int(os.getenv("CONVERSATION_LOG_COMPACT_SEGMENTS", "8"))
+    CONVERSATION_LOG_RETENTION_SECONDS: float = float(
+        os.getenv("CONVERSATION_LOG_RETENTION_SECONDS", str(30 * 24 * 3600))
+    )
+    
+    # Agent: run the CIL tools before the first model call when a CIL is in the message
+    CIL_FAST_PATH: bool = os.getenv("CIL_FAST_PATH", "true").lower() in ("1", "true", "yes")
+    
+    # Agent: answer paid-up customers asking why their service is cut in a zone under maintenance
+    # with one shared answer per zone status (opt-in)
+    BROADCAST_ANSWERS: bool = os.getenv("BROADCAST_ANSWERS", "false").lower() in ("1", "true", "yes")
+    
+    # Agent: tool results go to the model as compact JSON facts (false: verbose Arabic text)
+    TOOL_OUTPUT_COMPACT: bool = os.getenv("TOOL_OUTPUT_COMPACT", "true").lower() in ("1", "true", "yes")
+    
+    # Agent tool calls run concurrently on a bounded pool, each with a timeout;
+    # calls past TOOL_MAX_PENDING queued or running fail fast (0: 2 x TOOL_MAX_WORKERS)
+    TOOL_MAX_WORKERS: int = int(os.getenv("TOOL_MAX_WORKERS", "8"))
+    TOOL_TIMEOUT_SECONDS: float = float(os.getenv("TOOL_TIMEOUT_SECONDS", "10"))
+    TOOL_MAX_PENDING: int = int(os.getenv("TOOL_MAX_PENDING", "0"))
+    
+    # Tool result cache (also invalidated on user/zone updates)
+    TOOL_CACHE_MAX_ENTRIES: int = int(os.getenv("TOOL_CACHE_MAX_ENTRIES", "50000"))
+    TOOL_CACHE_TTL_SECONDS: float = float(os.getenv("TOOL_CACHE_TTL_SECONDS", "300"))
+    
+    # Agent loop budget per turn (LLM calls include the final answer)
+    AGENT_MAX_LLM_CALLS: int = int(os.getenv("AGENT_MAX_LLM_CALLS", "4"))
+    AGENT_MAX_TOKENS: int = int(os.getenv("AGENT_MAX_TOKENS", "12000"))
+    AGENT_MAX_SECONDS: float = float(os.getenv("AGENT_MAX_SECONDS", "30"))
+    
+    # Prompt history: recent turns verbatim, older turns in a rolling summary
+    HISTORY_KEEP_TURNS: int = int(os.getenv("HISTORY_KEEP_TURNS", "4"))
+    HISTORY_SUMMARY_TRIGGER_TOKENS: int = int(os.getenv("HISTORY_SUMMARY_TRIGGER_TOKENS", "1500"))
+    HISTORY_MAX_SUMMARIES: int = int(os.getenv("HISTORY_MAX_SUMMARIES", "10000"))
+    
+    # Agent prompt: converted messages kept per conversation so a turn only converts new messages
+    PROMPT_MAX_CONVERSATIONS: int = int(os.getenv("PROMPT_MAX_CONVERSATIONS", "2000"))
+    
+    # Database snapshot restored at startup (see data/snapshot.py)
+    DB_SNAPSHOT_DIR: Optional[str] = os.getenv("DB_SNAPSHOT_DIR")
+    
     # Application Constants
     APP_TITLE: str = "نظام خدمة العملاء - SRM"
     APP_ICON: str = "💧"
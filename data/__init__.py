@@ -1,4 +1,10 @@
 """Data package for SRM application."""
-from .mock_db import users_table, zones_table, get_user_by_cil, get_zone_by_id
+from .mock_db import (
+    users_table, zones_table, get_user_by_cil, get_zone_by_id, update_user, update_zone,
+    get_users_by_cils, get_zones_by_ids
+)
 
-__all__ = ['users_table', 'zones_table', 'get_user_by_cil', 'get_zone_by_id']
+__all__ = [
+    'users_table', 'zones_table', 'get_user_by_cil', 'get_zone_by_id', 'update_user', 'update_zone',
+    'get_users_by_cils', 'get_zones_by_ids'
+]
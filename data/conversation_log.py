@@ -0,0 +1,434 @@
+"""
+Durable append-only log for chat conversations.
+Persists conversation records in segmented files on local disk so history
+survives restarts; conversations are read back lazily on first access.
+"""
+import json
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Optional, Dict, Any, List, Tuple, Callable
+
+
+SEGMENT_PREFIX = 'segment-'
+SEGMENT_SUFFIX = '.log'
+INDEX_SUFFIX = '.idx'
+COMPACT_SUFFIX = '.compact'
+
+logger = logging.getLogger(__name__)
+
+
+class ConversationLog:
+    """
+    Segmented append-only log with an in-memory offset index.
+
+    Every record is one JSON line: a 'create' record per conversation and a
+    'message' record (with its position 'seq') per message. Records go to
+    the active segment, which is sealed once it reaches segment_max_bytes;
+    sealed segments get an index file so startup only scans the active one.
+
+    fsync is batched: appends are written to the OS immediately but flushed
+    to disk every fsync_interval seconds (by a background thread, so an idle
+    log is flushed too) or every fsync_batch records, trading a small loss
+    window on power failure for throughput.
+
+    is_live tells compaction which conversations are still in use (e.g.
+    resident in the in-memory store); those are never dropped, since later
+    appends to them would have no 'create' record to attach to.
+
+    With compact_segments set, sealing a segment starts a background
+    compaction (dropping conversations idle past retention_seconds) once
+    there are that many segments, or twice as many as the last compaction
+    left, so the log stays bounded without compacting over and over.
+    """
+
+    def __init__(self, directory: str, segment_max_bytes: int = 64 * 1024 * 1024,
+                 fsync_interval: float = 1.0, fsync_batch: int = 256,
+                 is_live: Optional[Callable[[str], bool]] = None,
+                 compact_segments: int = 0, retention_seconds: Optional[float] = None):
+        self.directory = Path(directory)
+        self.segment_max_bytes = segment_max_bytes
+        self.fsync_interval = fsync_interval
+        self.fsync_batch = fsync_batch
+        self.is_live = is_live
+        self.compact_segments = compact_segments
+        self.retention_seconds = retention_seconds
+        self._lock = threading.Lock()
+        # Segment count that starts the next automatic compaction
+        self._compact_at = compact_segments
+        self._compacting = False
+        self._closed = threading.Event()
+        # Process that runs the flusher thread (threads do not survive fork)
+        self._flusher_pid: Optional[int] = None
+        # conversation_id -> [(segment number, offset, length), ...]
+        self._index: Dict[str, List[Tuple[int, int, int]]] = {}
+        self._pending = 0
+        self._last_sync = time.monotonic()
+
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._recover()
+
+    def record_create(self, conversation: Dict[str, Any]) -> None:
+        """
+        Persist a newly created conversation.
+
+        Args:
+            conversation: Dict with conversation_id and created_at
+        """
+        self._append({
+            'op': 'create',
+            'id': conversation['conversation_id'],
+            'created_at': conversation['created_at']
+        })
+
+    def record_message(self, conversation_id: str, seq: int, message: Dict[str, Any]) -> None:
+        """
+        Persist a message appended to a conversation.
+
+        Args:
+            conversation_id: Unique conversation identifier
+            seq: Position of the message in the conversation
+            message: Message dict
+        """
+        self._append({'op': 'message', 'id': conversation_id, 'seq': seq, 'message': message})
+
+    def load(self, conversation_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Read a conversation back from disk via the offset index.
+
+        Args:
+            conversation_id: Unique conversation identifier
+
+        Returns:
+            dict: Conversation with its messages or None if not logged
+        """
+        with self._lock:
+            locations = self._index.get(conversation_id)
+            if not locations:
+                return None
+            self._active.flush()
+            return _assemble(conversation_id, self._read_records(locations))
+
+    def __contains__(self, conversation_id: str) -> bool:
+        return conversation_id in self._index
+
+    def sync(self) -> None:
+        """Flush and fsync pending records now."""
+        with self._lock:
+            self._sync()
+
+    def close(self) -> None:
+        """Stop the flusher, sync and close the active segment."""
+        self._closed.set()
+        with self._lock:
+            self._sync()
+            self._active.close()
+
+    def compact(self, retention_seconds: Optional[float] = None,
+                keep: Optional[Callable[[Dict[str, Any]], bool]] = None) -> Dict[str, int]:
+        """
+        Rewrite the log so each conversation's records are contiguous, dropping old ones.
+
+        Appends are blocked while compaction runs. New segments are written
+        under a temporary suffix and only then replace the old ones; a crash
+        before that point leaves the old segments untouched.
+
+        Conversations for which is_live returns True are always kept.
+
+        Args:
+            retention_seconds: Drop conversations whose last activity is older than this
+            keep: Optional predicate on the loaded conversation; False drops it
+
+        Returns:
+            dict: Number of conversations kept and dropped, and segments before/after
+        """
+        cutoff = None
+        if retention_seconds is not None:
+            cutoff = (datetime.now() - timedelta(seconds=retention_seconds)).isoformat()
+
+        with self._lock:
+            self._seal_active()
+            old_segments = self._segment_numbers()
+            next_number = (old_segments[-1] + 1) if old_segments else 1
+
+            kept = dropped = 0
+            writer = _SegmentWriter(self.directory, next_number, self.segment_max_bytes)
+            new_index: Dict[str, List[Tuple[int, int, int]]] = {}
+
+            for conversation_id, locations in self._index.items():
+                conversation = _assemble(conversation_id, self._read_records(locations))
+                if conversation is None:
+                    continue
+
+                messages = conversation['messages']
+                last_activity = messages[-1]['timestamp'] if messages else conversation['created_at']
+                expired = (cutoff and last_activity < cutoff) or (keep and not keep(conversation))
+                if expired and not (self.is_live and self.is_live(conversation_id)):
+                    dropped += 1
+                    continue
+
+                records = [{'op': 'create', 'id': conversation_id, 'created_at': conversation['created_at']}]
+                records += [
+                    {'op': 'message', 'id': conversation_id, 'seq': seq, 'message': message}
+                    for seq, message in enumerate(messages)
+                ]
+                new_index[conversation_id] = [writer.write(_encode(record)) for record in records]
+                kept += 1
+
+            new_segments = writer.finish()
+
+            for number in new_segments:
+                os.replace(self._path(number, COMPACT_SUFFIX), self._path(number))
+            for number in old_segments:
+                self._path(number).unlink(missing_ok=True)
+                self._path(number, INDEX_SUFFIX).unlink(missing_ok=True)
+
+            self._index = new_index
+            for number in new_segments:
+                self._write_segment_index(number)
+
+            active_number = (new_segments[-1] + 1) if new_segments else next_number
+            self._open_active(active_number)
+            self._compact_at = max(self.compact_segments, 2 * len(new_segments))
+
+            return {
+                'kept': kept,
+                'dropped': dropped,
+                'segments_before': len(old_segments),
+                'segments_after': len(new_segments)
+            }
+
+    def _append(self, record: Dict[str, Any]) -> None:
+        """Write one record to the active segment and index it."""
+        data = _encode(record)
+        if self._flusher_pid != os.getpid():
+            self._start_flusher()
+        compact = False
+        with self._lock:
+            if self._active_size + len(data) > self.segment_max_bytes and self._active_size > 0:
+                self._seal_active()
+                self._open_active(self._active_number + 1)
+                compact = self._compaction_due()
+
+            offset = self._active_size
+            self._active.write(data)
+            self._active_size += len(data)
+            self._index.setdefault(record['id'], []).append((self._active_number, offset, len(data)))
+
+            self._pending += 1
+            if self._pending >= self.fsync_batch or time.monotonic() - self._last_sync >= self.fsync_interval:
+                self._sync()
+
+        if compact:
+            threading.Thread(target=self._auto_compact, name='conversation-log-compact', daemon=True).start()
+
+    def _compaction_due(self) -> bool:
+        """Whether the sealed segments warrant an automatic compaction (claims it if so)."""
+        if not self.compact_segments or self._compacting:
+            return False
+        if len(self._segment_numbers()) - 1 < self._compact_at:
+            return False
+        self._compacting = True
+        return True
+
+    def _auto_compact(self) -> None:
+        try:
+            self.compact(self.retention_seconds)
+        except Exception:
+            logger.exception("Conversation log compaction failed")
+        finally:
+            with self._lock:
+                self._compacting = False
+
+    def _start_flusher(self) -> None:
+        """Start the thread that fsyncs pending records every fsync_interval."""
+        with self._lock:
+            if self._flusher_pid == os.getpid():
+                return
+            self._flusher_pid = os.getpid()
+        threading.Thread(target=self._flush_loop, name='conversation-log-flush', daemon=True).start()
+
+    def _flush_loop(self) -> None:
+        while not self._closed.wait(self.fsync_interval):
+            with self._lock:
+                if self._pending:
+                    self._sync()
+
+    def _sync(self) -> None:
+        """fsync the active segment (batched group commit)."""
+        if self._active.closed:
+            return
+        self._active.flush()
+        os.fsync(self._active.fileno())
+        self._pending = 0
+        self._last_sync = time.monotonic()
+
+    def _seal_active(self) -> None:
+        """Close the active segment and persist its offset index."""
+        self._sync()
+        self._active.close()
+        if self._active_size == 0:
+            self._path(self._active_number).unlink(missing_ok=True)
+        else:
+            self._write_segment_index(self._active_number)
+
+    def _open_active(self, number: int) -> None:
+        """Start appending to a segment."""
+        self._active_number = number
+        self._active = open(self._path(number), 'ab')
+        self._active_size = self._active.tell()
+
+    def _recover(self) -> None:
+        """Load sealed segment indexes and scan the last segment, truncating a torn tail."""
+        for leftover in self.directory.glob(f'{SEGMENT_PREFIX}*{COMPACT_SUFFIX}'):
+            leftover.unlink()
+
+        numbers = self._segment_numbers()
+        for number in numbers[:-1]:
+            index_path = self._path(number, INDEX_SUFFIX)
+            if index_path.exists():
+                with open(index_path, encoding='utf-8') as f:
+                    for conversation_id, locations in json.load(f).items():
+                        self._index.setdefault(conversation_id, []).extend(
+                            (number, offset, length) for offset, length in locations
+                        )
+            else:
+                self._scan_segment(number)
+                self._write_segment_index(number)
+
+        if numbers:
+            self._scan_segment(numbers[-1])
+            self._open_active(numbers[-1])
+        else:
+            self._open_active(1)
+
+    def _scan_segment(self, number: int) -> None:
+        """Index a segment by reading it; a partial last record is cut off."""
+        path = self._path(number)
+        valid_size = 0
+
+        with open(path, 'rb') as f:
+            for line in f:
+                if not line.endswith(b'\n'):
+                    break
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    break
+                self._index.setdefault(record['id'], []).append((number, valid_size, len(line)))
+                valid_size += len(line)
+
+        if valid_size < path.stat().st_size:
+            with open(path, 'r+b') as f:
+                f.truncate(valid_size)
+
+    def _write_segment_index(self, number: int) -> None:
+        """Persist the offsets of one sealed segment."""
+        entries: Dict[str, List[Tuple[int, int]]] = {}
+        for conversation_id, locations in self._index.items():
+            for segment, offset, length in locations:
+                if segment == number:
+                    entries.setdefault(conversation_id, []).append((offset, length))
+
+        temporary = self._path(number, INDEX_SUFFIX + '.tmp')
+        with open(temporary, 'w', encoding='utf-8') as f:
+            json.dump(entries, f)
+        os.replace(temporary, self._path(number, INDEX_SUFFIX))
+
+    def _read_records(self, locations: List[Tuple[int, int, int]]):
+        """Read records at the given locations, one open file per segment."""
+        handles = {}
+        try:
+            for segment, offset, length in locations:
+                if segment not in handles:
+                    handles[segment] = open(self._path(segment), 'rb')
+                handle = handles[segment]
+                handle.seek(offset)
+                yield json.loads(handle.read(length))
+        finally:
+            for handle in handles.values():
+                handle.close()
+
+    def _segment_numbers(self) -> List[int]:
+        """Numbers of the segment files on disk, in order."""
+        numbers = []
+        for path in self.directory.glob(f'{SEGMENT_PREFIX}*{SEGMENT_SUFFIX}'):
+            try:
+                numbers.append(int(path.name[len(SEGMENT_PREFIX):-len(SEGMENT_SUFFIX)]))
+            except ValueError:
+                continue
+        return sorted(numbers)
+
+    def _path(self, number: int, suffix: str = SEGMENT_SUFFIX) -> Path:
+        """Path of a segment file (or one of its companion files)."""
+        if suffix == COMPACT_SUFFIX:
+            return self.directory / f'{SEGMENT_PREFIX}{number:06d}{SEGMENT_SUFFIX}{COMPACT_SUFFIX}'
+        return self.directory / f'{SEGMENT_PREFIX}{number:06d}{suffix}'
+
+
+class _SegmentWriter:
+    """Writes compacted records into size-bounded temporary segments."""
+
+    def __init__(self, directory: Path, first_number: int, segment_max_bytes: int):
+        self.directory = directory
+        self.number = first_number
+        self.segment_max_bytes = segment_max_bytes
+        self.numbers: List[int] = []
+        self._file = None
+        self._size = 0
+
+    def write(self, data: bytes) -> Tuple[int, int, int]:
+        """Append one encoded record and return its (segment, offset, length)."""
+        if self._file is None or (self._size + len(data) > self.segment_max_bytes and self._size > 0):
+            self._rotate()
+        offset = self._size
+        self._file.write(data)
+        self._size += len(data)
+        return self.number, offset, len(data)
+
+    def finish(self) -> List[int]:
+        """Sync and close the last segment; returns the segment numbers written."""
+        self._close()
+        return self.numbers
+
+    def _rotate(self) -> None:
+        if self._file is not None:
+            self._close()
+            self.number += 1
+        path = self.directory / f'{SEGMENT_PREFIX}{self.number:06d}{SEGMENT_SUFFIX}{COMPACT_SUFFIX}'
+        self._file = open(path, 'wb')
+        self._size = 0
+        self.numbers.append(self.number)
+
+    def _close(self) -> None:
+        if self._file is not None and not self._file.closed:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._file.close()
+
+
+def _assemble(conversation_id: str, records) -> Optional[Dict[str, Any]]:
+    """Rebuild a conversation from its create and message records."""
+    conversation = None
+    messages: Dict[int, Dict[str, Any]] = {}
+
+    for record in records:
+        if record['op'] == 'create':
+            conversation = {'conversation_id': conversation_id, 'created_at': record['created_at']}
+        else:
+            # Keyed by seq so a record duplicated by an interrupted compaction counts once
+            messages[record['seq']] = record['message']
+
+    if conversation is None:
+        return None
+
+    conversation['messages'] = [messages[seq] for seq in sorted(messages)]
+    return conversation
+
+
+def _encode(record: Dict[str, Any]) -> bytes:
+    """Serialize a record as one UTF-8 JSON line."""
+    return (json.dumps(record, ensure_ascii=False, separators=(',', ':')) + '\n').encode('utf-8')
@@ -0,0 +1,434 @@
+"""
+Bounded in-memory store for chat conversations.
+Evicts least recently used conversations by count, byte budget and idle TTL,
+compresses the messages of cold conversations, and shards entries across
+independently locked stores for threaded serving.
+"""
+import asyncio
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Dict, Any, List, Tuple
+from data.messages import Message
+
+
+class _Entry:
+    """Stored conversation plus its bookkeeping."""
+    __slots__ = ('conversation', 'last_access', 'size', 'turn_lock', 'aturn_lock', 'cold')
+
+    def __init__(self, conversation: Dict[str, Any], last_access: float, size: int):
+        self.conversation = conversation
+        self.last_access = last_access
+        self.size = size
+        self.turn_lock = threading.Lock()
+        # Queues async turns so only one of them waits on turn_lock
+        self.aturn_lock = asyncio.Lock()
+        self.cold = False
+
+
+def estimate_size(value: Any) -> int:
+    """
+    Estimate the memory held by a conversation or message dict.
+
+    Counts the dict itself and its string/number values; message lists are
+    summed recursively. Cheap enough to run on every append.
+
+    Args:
+        value: Conversation dict, Message, message dict or scalar
+
+    Returns:
+        int: Approximate size in bytes
+    """
+    if isinstance(value, Message):
+        return value.nbytes()
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(estimate_size(item) for item in value.values())
+    if isinstance(value, list):
+        return sys.getsizeof(value) + sum(estimate_size(item) for item in value)
+    return sys.getsizeof(value)
+
+
+class ConversationStore:
+    """
+    LRU conversation store with an entry limit, a byte budget and an idle TTL.
+
+    Entries live in an OrderedDict kept in access order, so the least
+    recently used (and therefore the longest idle) conversation is always at
+    the front: every eviction is an O(1) popitem.
+
+    Conversations idle for cold_seconds have their message contents
+    compressed (swept at most every cold_seconds / 4) and are decompressed
+    again on their next access.
+    """
+
+    def __init__(self, max_entries: int = 10_000, max_bytes: int = 256 * 1024 * 1024,
+                 ttl_seconds: float = 24 * 3600, cold_seconds: Optional[float] = 600):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.cold_seconds = cold_seconds
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._bytes = 0
+        self._hits = 0
+        self._misses = 0
+        self._evictions = {'capacity': 0, 'bytes': 0, 'ttl': 0}
+        self._compressed = 0
+        self._last_cold_sweep = time.monotonic()
+
+    def put(self, conversation: Dict[str, Any]) -> None:
+        """
+        Insert or replace a conversation.
+
+        Args:
+            conversation: Dict with conversation_id, created_at and messages
+        """
+        conversation_id = conversation['conversation_id']
+        with self._lock:
+            self._expire(time.monotonic())
+            old = self._entries.pop(conversation_id, None)
+            if old:
+                self._bytes -= old.size
+                if old.cold:
+                    self._compressed -= 1
+
+            entry = _Entry(conversation, time.monotonic(), estimate_size(conversation))
+            self._entries[conversation_id] = entry
+            self._bytes += entry.size
+            self._enforce_limits()
+
+    def put_if_absent(self, conversation: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Insert a conversation unless one with the same ID is already stored.
+
+        Args:
+            conversation: Dict with conversation_id, created_at and messages
+
+        Returns:
+            dict: The stored conversation (existing one wins)
+        """
+        conversation_id = conversation['conversation_id']
+        with self._lock:
+            entry = self._entries.get(conversation_id)
+            if entry:
+                return entry.conversation
+
+            entry = _Entry(conversation, time.monotonic(), estimate_size(conversation))
+            self._entries[conversation_id] = entry
+            self._bytes += entry.size
+            self._enforce_limits()
+            return conversation
+
+    def get(self, conversation_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Get a conversation and mark it as recently used.
+
+        Args:
+            conversation_id: Unique conversation identifier
+
+        Returns:
+            dict: Conversation or None if unknown, evicted or expired
+        """
+        with self._lock:
+            entry = self._touch(conversation_id)
+            return entry.conversation if entry else None
+
+    def get_messages(self, conversation_id: str, start: int = 0,
+                     stop: Optional[int] = None) -> Optional[List[Message]]:
+        """
+        Get a consistent copy of a conversation's messages.
+
+        Args:
+            conversation_id: Unique conversation identifier
+            start: Index of the first message to return
+            stop: Index after the last message to return (None for all)
+
+        Returns:
+            list: Copy of the messages or None if conversation not found
+        """
+        with self._lock:
+            entry = self._touch(conversation_id)
+            return entry.conversation['messages'][start:stop] if entry else None
+
+    def message_count(self, conversation_id: str) -> Optional[int]:
+        """
+        Get the number of messages in a conversation without copying them.
+
+        Args:
+            conversation_id: Unique conversation identifier
+
+        Returns:
+            int: Message count or None if conversation not found
+        """
+        with self._lock:
+            entry = self._touch(conversation_id)
+            return len(entry.conversation['messages']) if entry else None
+
+    def turn_lock(self, conversation_id: str) -> Optional[threading.Lock]:
+        """
+        Get the lock that orders turns within one conversation.
+
+        Args:
+            conversation_id: Unique conversation identifier
+
+        Returns:
+            Lock: Per-conversation lock or None if conversation not found
+        """
+        with self._lock:
+            entry = self._entries.get(conversation_id)
+            return entry.turn_lock if entry else None
+
+    def aturn_lock(self, conversation_id: str) -> Optional[asyncio.Lock]:
+        """
+        Get the lock that orders async turns within one conversation.
+
+        Async turns take this before turn_lock, so at most one of them per
+        conversation waits for threaded turns.
+
+        Args:
+            conversation_id: Unique conversation identifier
+
+        Returns:
+            asyncio.Lock: Per-conversation lock or None if conversation not found
+        """
+        with self._lock:
+            entry = self._entries.get(conversation_id)
+            return entry.aturn_lock if entry else None
+
+    def append_message(self, conversation_id: str, message: Message) -> int:
+        """
+        Append a message to a conversation and account for its size.
+
+        Args:
+            conversation_id: Unique conversation identifier
+            message: Message record
+
+        Returns:
+            int: Message count after the append, 0 if conversation not found
+        """
+        with self._lock:
+            entry = self._touch(conversation_id)
+            if not entry:
+                return 0
+
+            messages = entry.conversation['messages']
+            messages.append(message)
+            size = estimate_size(message)
+            entry.size += size
+            self._bytes += size
+            self._enforce_limits()
+            return len(messages)
+
+    def items(self) -> List[Tuple[str, Dict[str, Any]]]:
+        """List (conversation_id, conversation) pairs without touching them."""
+        with self._lock:
+            return [(key, entry.conversation) for key, entry in self._entries.items()]
+
+    def clear(self) -> None:
+        """Remove every conversation (metrics are kept)."""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+            self._compressed = 0
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Get store metrics for operators.
+
+        Returns:
+            dict: Entry count, bytes, limits, hits, misses, hit rate, compressed
+                  (cold) entries and evictions by reason
+        """
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'max_entries': self.max_entries,
+                'max_bytes': self.max_bytes,
+                'ttl_seconds': self.ttl_seconds,
+                'hits': self._hits,
+                'misses': self._misses,
+                'hit_rate': self._hits / lookups if lookups else 0.0,
+                'compressed': self._compressed,
+                'evictions': dict(self._evictions)
+            }
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, conversation_id: str) -> bool:
+        return conversation_id in self._entries
+
+    def _touch(self, conversation_id: str) -> Optional[_Entry]:
+        """Look up an entry, count hit/miss and move it to the MRU end."""
+        now = time.monotonic()
+        self._expire(now)
+        entry = self._entries.get(conversation_id)
+
+        if entry is None:
+            self._misses += 1
+            return None
+
+        self._hits += 1
+        entry.last_access = now
+        self._entries.move_to_end(conversation_id)
+        if entry.cold:
+            self._set_cold(entry, False)
+        return entry
+
+    def _expire(self, now: float) -> None:
+        """Drop idle entries and compress cold ones; they are all at the LRU front."""
+        deadline = now - self.ttl_seconds
+        while self._entries:
+            entry = next(iter(self._entries.values()))
+            if entry.last_access > deadline:
+                break
+            self._evict('ttl')
+
+        if self.cold_seconds is None or now - self._last_cold_sweep < self.cold_seconds / 4:
+            return
+        self._last_cold_sweep = now
+        cold_deadline = now - self.cold_seconds
+        for entry in self._entries.values():
+            if entry.last_access > cold_deadline:
+                break
+            if not entry.cold:
+                self._set_cold(entry, True)
+
+    def _set_cold(self, entry: _Entry, cold: bool) -> None:
+        """Compress or decompress an entry's messages and re-account its size."""
+        for message in entry.conversation['messages']:
+            if not isinstance(message, Message):
+                continue
+            if cold:
+                message.compress()
+            else:
+                message.decompress()
+
+        size = estimate_size(entry.conversation)
+        self._bytes += size - entry.size
+        entry.size = size
+        entry.cold = cold
+        self._compressed += 1 if cold else -1
+
+    def _enforce_limits(self) -> None:
+        """Evict LRU entries until count and bytes fit (the MRU entry is always kept)."""
+        while len(self._entries) > self.max_entries:
+            self._evict('capacity')
+        while self._bytes > self.max_bytes and len(self._entries) > 1:
+            self._evict('bytes')
+
+    def _evict(self, reason: str) -> None:
+        """Pop the least recently used entry."""
+        _, entry = self._entries.popitem(last=False)
+        self._bytes -= entry.size
+        self._evictions[reason] += 1
+        if entry.cold:
+            self._compressed -= 1
+
+
+class ShardedConversationStore:
+    """
+    Conversation store split into independently locked shards.
+
+    Each conversation is routed to one ConversationStore by hash of its ID,
+    so requests on different conversations rarely contend on the same lock.
+    Limits are divided evenly between shards, which makes eviction an LRU
+    approximation per shard rather than a global one.
+    """
+
+    def __init__(self, shards: int = 16, max_entries: int = 10_000,
+                 max_bytes: int = 256 * 1024 * 1024, ttl_seconds: float = 24 * 3600,
+                 cold_seconds: Optional[float] = 600):
+        shards = max(1, shards)
+        self._shards = [
+            ConversationStore(
+                max_entries=max(1, max_entries // shards),
+                max_bytes=max(1, max_bytes // shards),
+                ttl_seconds=ttl_seconds,
+                cold_seconds=cold_seconds
+            )
+            for _ in range(shards)
+        ]
+
+    def _shard(self, conversation_id: str) -> ConversationStore:
+        """Pick the shard owning a conversation."""
+        return self._shards[hash(conversation_id) % len(self._shards)]
+
+    def put(self, conversation: Dict[str, Any]) -> None:
+        """Insert or replace a conversation (see ConversationStore.put)."""
+        self._shard(conversation['conversation_id']).put(conversation)
+
+    def put_if_absent(self, conversation: Dict[str, Any]) -> Dict[str, Any]:
+        """Insert unless already stored (see ConversationStore.put_if_absent)."""
+        return self._shard(conversation['conversation_id']).put_if_absent(conversation)
+
+    def get(self, conversation_id: str) -> Optional[Dict[str, Any]]:
+        """Get a conversation (see ConversationStore.get)."""
+        return self._shard(conversation_id).get(conversation_id)
+
+    def get_messages(self, conversation_id: str, start: int = 0,
+                     stop: Optional[int] = None) -> Optional[List[Message]]:
+        """Get a copy of a conversation's messages (see ConversationStore.get_messages)."""
+        return self._shard(conversation_id).get_messages(conversation_id, start, stop)
+
+    def message_count(self, conversation_id: str) -> Optional[int]:
+        """Get a conversation's message count (see ConversationStore.message_count)."""
+        return self._shard(conversation_id).message_count(conversation_id)
+
+    def turn_lock(self, conversation_id: str) -> Optional[threading.Lock]:
+        """Get the per-conversation turn lock (see ConversationStore.turn_lock)."""
+        return self._shard(conversation_id).turn_lock(conversation_id)
+
+    def aturn_lock(self, conversation_id: str) -> Optional[asyncio.Lock]:
+        """Get the per-conversation async turn lock (see ConversationStore.aturn_lock)."""
+        return self._shard(conversation_id).aturn_lock(conversation_id)
+
+    def append_message(self, conversation_id: str, message: Message) -> int:
+        """Append a message (see ConversationStore.append_message)."""
+        return self._shard(conversation_id).append_message(conversation_id, message)
+
+    def items(self) -> List[Tuple[str, Dict[str, Any]]]:
+        """List (conversation_id, conversation) pairs across all shards."""
+        return [item for shard in self._shards for item in shard.items()]
+
+    def clear(self) -> None:
+        """Remove every conversation from every shard."""
+        for shard in self._shards:
+            shard.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Get store metrics summed across shards.
+
+        Returns:
+            dict: Same keys as ConversationStore.stats, plus the shard count
+        """
+        per_shard = [shard.stats() for shard in self._shards]
+        hits = sum(stats['hits'] for stats in per_shard)
+        misses = sum(stats['misses'] for stats in per_shard)
+
+        return {
+            'entries': sum(stats['entries'] for stats in per_shard),
+            'bytes': sum(stats['bytes'] for stats in per_shard),
+            'max_entries': sum(stats['max_entries'] for stats in per_shard),
+            'max_bytes': sum(stats['max_bytes'] for stats in per_shard),
+            'ttl_seconds': per_shard[0]['ttl_seconds'],
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': hits / (hits + misses) if hits + misses else 0.0,
+            'compressed': sum(stats['compressed'] for stats in per_shard),
+            'evictions': {
+                reason: sum(stats['evictions'][reason] for stats in per_shard)
+                for reason in per_shard[0]['evictions']
+            },
+            'shards': len(self._shards)
+        }
+
+    def __len__(self) -> int:
+        return sum(len(shard) for shard in self._shards)
+
+    def __contains__(self, conversation_id: str) -> bool:
+        return conversation_id in self._shard(conversation_id)
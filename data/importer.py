@@ -0,0 +1,291 @@
+"""
+Bulk import of customer and zone data from CSV or Parquet files.
+Streams files in chunks so memory stays bounded by the chunk size.
+"""
+from pathlib import Path
+from typing import Dict, Any, Iterator, List, Optional
+import pandas as pd
+from data import mock_db
+from data.mock_db import USER_SCHEMA, ZONE_SCHEMA
+from services.turn_router import CIL_PATTERN
+
+
+# Rows per chunk read from the source file
+DEFAULT_CHUNK_SIZE = 50_000
+
+# Maximum number of rejected rows kept in the import report
+MAX_REJECTED_SAMPLES = 100
+
+USER_COLUMNS = [
+    'cil', 'name', 'address', 'phone', 'service_type', 'zone_id',
+    'payment_status', 'last_payment_date', 'outstanding_balance', 'service_status'
+]
+USER_REQUIRED = ['cil', 'name', 'service_type', 'zone_id', 'payment_status', 'service_status']
+
+ZONE_COLUMNS = [
+    'zone_id', 'zone_name', 'maintenance_status', 'outage_reason',
+    'estimated_restoration', 'affected_services', 'status_updated'
+]
+ZONE_REQUIRED = ['zone_id', 'zone_name', 'maintenance_status']
+
+
+def import_users(path: str, mode: str = 'replace', chunksize: int = DEFAULT_CHUNK_SIZE) -> Dict[str, Any]:
+    """
+    Import customers from a CSV or Parquet file.
+
+    In 'replace' mode the whole file is loaded into a new compact table that
+    is swapped in once every chunk has been read; readers keep seeing the old
+    table until then. In 'upsert' mode each chunk is merged into the live
+    table by CIL as soon as it is validated, so the file may be a partial
+    delta (e.g. only cil, payment_status and outstanding_balance).
+
+    Args:
+        path: Path to a .csv or .parquet file
+        mode: 'replace' or 'upsert'
+        chunksize: Rows per chunk
+
+    Returns:
+        dict: Import report (rows_read, inserted, updated, rejected, rejected_samples, chunks)
+    """
+    return _import_table(
+        path, mode, chunksize,
+        key='cil',
+        columns=USER_COLUMNS,
+        required=USER_REQUIRED,
+        schema=USER_SCHEMA,
+        index=mock_db.users_index,
+        replace=mock_db.replace_users_table,
+        upsert=mock_db.upsert_users
+    )
+
+
+def import_zones(path: str, mode: str = 'replace', chunksize: int = DEFAULT_CHUNK_SIZE) -> Dict[str, Any]:
+    """
+    Import zones from a CSV or Parquet file.
+
+    Args:
+        path: Path to a .csv or .parquet file
+        mode: 'replace' or 'upsert' (see import_users)
+        chunksize: Rows per chunk
+
+    Returns:
+        dict: Import report (rows_read, inserted, updated, rejected, rejected_samples, chunks)
+    """
+    return _import_table(
+        path, mode, chunksize,
+        key='zone_id',
+        columns=ZONE_COLUMNS,
+        required=ZONE_REQUIRED,
+        schema=ZONE_SCHEMA,
+        index=mock_db.zones_index,
+        replace=mock_db.replace_zones_table,
+        upsert=mock_db.upsert_zones
+    )
+
+
+def iter_chunks(path: str, chunksize: int = DEFAULT_CHUNK_SIZE) -> Iterator[pd.DataFrame]:
+    """
+    Stream a CSV or Parquet file as DataFrame chunks.
+
+    CSV cells are read as strings so coercion and validation happen in one
+    place. Parquet requires pyarrow.
+
+    Args:
+        path: Path to a .csv or .parquet file
+        chunksize: Rows per chunk
+
+    Yields:
+        DataFrame: Next chunk of rows
+    """
+    suffix = Path(path).suffix.lower()
+
+    if suffix in ('.parquet', '.pq'):
+        try:
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ImportError("Parquet import requires pyarrow: pip install pyarrow")
+
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunksize):
+            yield batch.to_pandas()
+    elif suffix == '.csv':
+        yield from pd.read_csv(path, chunksize=chunksize, dtype=str, encoding='utf-8')
+    else:
+        raise ValueError(f"Unsupported file type: {suffix} (expected .csv or .parquet)")
+
+
+def _import_table(path: str, mode: str, chunksize: int, key: str, columns: List[str],
+                  required: List[str], schema: Dict[str, str], index: mock_db.PrimaryKeyIndex,
+                  replace, upsert) -> Dict[str, Any]:
+    """Shared chunked import loop for users and zones."""
+    if mode not in ('replace', 'upsert'):
+        raise ValueError(f"Unknown import mode: {mode}")
+
+    report = {
+        'rows_read': 0,
+        'inserted': 0,
+        'updated': 0,
+        'rejected': 0,
+        'rejected_samples': [],
+        'chunks': 0
+    }
+    accepted = []
+
+    for chunk in iter_chunks(path, chunksize):
+        first_row = report['rows_read']
+        report['rows_read'] += len(chunk)
+        report['chunks'] += 1
+
+        unknown = set(chunk.columns) - set(columns)
+        expected = columns if mode == 'replace' else [key]
+        missing = set(expected) - set(chunk.columns)
+        if unknown or missing:
+            raise ValueError(f"Bad header in {path}: missing {sorted(missing)}, unknown {sorted(unknown)}")
+
+        if mode == 'upsert':
+            valid, rejected = validate_chunk(chunk, key, [key], schema, first_row)
+            valid, incomplete = _reject_incomplete_new_rows(valid, key, columns, required, index)
+            _record_rejections(report, rejected + incomplete)
+            stats = upsert(valid)
+            report['inserted'] += stats['inserted']
+            report['updated'] += stats['updated']
+        else:
+            valid, rejected = validate_chunk(chunk, key, required, schema, first_row)
+            _record_rejections(report, rejected)
+            accepted.append(valid)
+
+    if mode == 'replace':
+        table = _concat_chunks(accepted, columns, schema)
+        duplicates = int(table.duplicated(subset=key, keep='last').sum())
+        table = table.drop_duplicates(subset=key, keep='last').reset_index(drop=True)
+        replace(table)
+        report['inserted'] = len(table)
+        report['updated'] = duplicates
+
+    return report
+
+
+def validate_chunk(chunk: pd.DataFrame, key: str, required: List[str], schema: Dict[str, str],
+                   first_row: int = 0) -> tuple:
+    """
+    Coerce a raw chunk to the table dtypes and drop invalid rows.
+
+    A row is rejected when a required cell is empty, a date or number does
+    not parse, an integer column holds a fraction, a balance is negative or
+    a CIL does not match the 1071324-101 format.
+
+    Args:
+        chunk: Raw rows (strings from CSV or typed Parquet columns)
+        key: Primary key column
+        required: Columns that must be non-empty
+        schema: Target dtypes (USER_SCHEMA or ZONE_SCHEMA)
+        first_row: File row number of the chunk's first row, for reporting
+
+    Returns:
+        tuple: (valid rows with compact dtypes, list of rejection dicts)
+    """
+    chunk = chunk.reset_index(drop=True)
+    for column in chunk.columns:
+        if chunk[column].dtype == object:
+            stripped = chunk[column].str.strip()
+            chunk[column] = stripped.where(stripped != '', None)
+    keys = chunk[key].copy()
+
+    reasons = pd.Series(None, index=chunk.index, dtype=object)
+
+    def reject(mask: pd.Series, reason: str) -> None:
+        reasons[mask & reasons.isna()] = reason
+
+    for column in required:
+        if column in chunk.columns:
+            reject(chunk[column].isna(), f"missing {column}")
+
+    if key == 'cil':
+        # The whole cell must be a CIL (the shared pattern also finds CILs inside messages)
+        reject(~chunk['cil'].astype(str).str.fullmatch(CIL_PATTERN), "invalid cil format")
+
+    for column, dtype in schema.items():
+        if column not in chunk.columns:
+            continue
+        raw = chunk[column]
+
+        if dtype.startswith('datetime64'):
+            parsed = pd.to_datetime(raw, format='ISO8601', errors='coerce')
+            reject(parsed.isna() & raw.notna(), f"invalid date in {column}")
+        elif dtype.startswith(('int', 'float')):
+            parsed = pd.to_numeric(raw, errors='coerce')
+            reject(parsed.isna() & raw.notna(), f"invalid number in {column}")
+            if dtype.startswith('int'):
+                reject(parsed.notna() & (parsed % 1 != 0), f"non-integer {column}")
+            if column == 'outstanding_balance':
+                reject(parsed < 0, "negative outstanding_balance")
+        else:
+            continue
+        chunk[column] = parsed
+
+    bad = reasons.notna()
+    rejected = [
+        {'row': first_row + int(position), 'key': _plain(keys[position]), 'reason': reasons[position]}
+        for position in reasons.index[bad]
+    ]
+
+    valid = chunk.loc[~bad].reset_index(drop=True)
+    for column, dtype in schema.items():
+        if column not in valid.columns or dtype.startswith('datetime64'):
+            continue
+        if dtype.startswith('int') and valid[column].isna().any():
+            # Partial delta: nulls mean "unchanged", the store casts the rest
+            continue
+        valid[column] = valid[column].astype(dtype)
+
+    return valid, rejected
+
+
+def _reject_incomplete_new_rows(valid: pd.DataFrame, key: str, columns: List[str], required: List[str],
+                                index: mock_db.PrimaryKeyIndex) -> tuple:
+    """In upsert mode, keep new keys only if they carry every column and required value."""
+    positions, _ = index.get_positions(valid[key].tolist())
+    is_new = pd.Series(positions < 0, index=valid.index)
+
+    if set(columns) - set(valid.columns):
+        incomplete = is_new
+        reason = f"unknown {key} in partial delta"
+    else:
+        incomplete = is_new & valid[required].isna().any(axis=1)
+        reason = "new row missing required values"
+
+    rejected = [{'row': None, 'key': _plain(valid.at[position, key]), 'reason': reason}
+                for position in valid.index[incomplete]]
+
+    return valid.loc[~incomplete].reset_index(drop=True), rejected
+
+
+def _concat_chunks(chunks: List[pd.DataFrame], columns: List[str], schema: Dict[str, str]) -> pd.DataFrame:
+    """Concatenate validated chunks, unifying categories so columns stay categorical."""
+    if not chunks:
+        return mock_db.apply_schema(pd.DataFrame({column: [] for column in columns}), schema)
+
+    for column, dtype in schema.items():
+        if dtype != 'category':
+            continue
+        categories = pd.Index([])
+        for chunk in chunks:
+            categories = categories.union(chunk[column].cat.categories)
+        for chunk in chunks:
+            chunk[column] = chunk[column].cat.set_categories(categories)
+
+    return pd.concat(chunks, ignore_index=True)[columns]
+
+
+def _record_rejections(report: Dict[str, Any], rejected: List[Dict[str, Any]]) -> None:
+    """Count rejected rows and keep a bounded sample for the report."""
+    report['rejected'] += len(rejected)
+    room = MAX_REJECTED_SAMPLES - len(report['rejected_samples'])
+    if room > 0:
+        report['rejected_samples'].extend(rejected[:room])
+
+
+def _plain(value: Any) -> Optional[Any]:
+    """Make a cell JSON/print friendly."""
+    if pd.isna(value):
+        return None
+    return value.item() if hasattr(value, 'item') else value
@@ -0,0 +1,188 @@
+"""
+Compact message records for conversation history.
+Stores the role as a small enum, the timestamp as epoch microseconds and
+the content interned (short texts) or zlib-compressed (cold conversations).
+Tool calls and tool results are kept alongside so later turns can replay them.
+"""
+import sys
+import time
+import zlib
+from datetime import datetime
+from enum import IntEnum
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+
+# Contents up to this length are interned, so repeated greetings share one string
+INTERN_MAX_CHARS = 128
+
+# Contents shorter than this are not worth compressing
+COMPRESS_MIN_BYTES = 64
+
+
+class Role(IntEnum):
+    """Message author."""
+    USER = 0
+    ASSISTANT = 1
+    TOOL = 2
+
+    @property
+    def label(self) -> str:
+        """Role name used in the JSON API and chat history dicts."""
+        return self.name.lower()
+
+    @classmethod
+    def parse(cls, value: Union['Role', str, int]) -> 'Role':
+        """
+        Convert a role label ('user'), enum or int to a Role.
+
+        Raises:
+            ValueError: If the role is unknown
+        """
+        if isinstance(value, Role):
+            return value
+        if isinstance(value, str):
+            try:
+                return cls[value.upper()]
+            except KeyError:
+                raise ValueError(f"Unknown message role: {value}")
+        return cls(value)
+
+
+def now_micros() -> int:
+    """Current time as epoch microseconds."""
+    return time.time_ns() // 1000
+
+
+def micros_to_iso(timestamp: int) -> str:
+    """Format epoch microseconds like datetime.now().isoformat()."""
+    seconds, micros = divmod(timestamp, 1_000_000)
+    return datetime.fromtimestamp(seconds).replace(microsecond=micros).isoformat()
+
+
+def iso_to_micros(value: str) -> int:
+    """Parse an ISO timestamp (local time) into epoch microseconds."""
+    moment = datetime.fromisoformat(value)
+    return int(moment.replace(microsecond=0).timestamp()) * 1_000_000 + moment.microsecond
+
+
+class Message:
+    """
+    One stored chat message.
+
+    Behaves like the original {'role', 'content', 'timestamp'} dict for
+    reads (message['role'], message.get('content')), so existing callers
+    keep working without converting the history.
+
+    The tool slot is None for plain messages. An assistant message that
+    requested tools holds a tuple of (id, name, args) calls; a tool message
+    holds the id of the call it answers.
+    """
+    __slots__ = ('role', 'timestamp', '_content', 'tool')
+
+    def __init__(self, role: Union[Role, str, int], content: str, timestamp: Optional[int] = None,
+                 tool_calls: Optional[List[Dict[str, Any]]] = None, tool_call_id: Optional[str] = None):
+        self.role = Role.parse(role)
+        self.timestamp = now_micros() if timestamp is None else timestamp
+        self._content: Union[str, bytes] = sys.intern(content) if len(content) <= INTERN_MAX_CHARS else content
+        self.tool: Union[None, str, Tuple[Tuple[str, str, Dict[str, Any]], ...]] = None
+        if tool_calls:
+            self.tool = tuple((call['id'], sys.intern(call['name']), call['args']) for call in tool_calls)
+        elif tool_call_id is not None:
+            self.tool = tool_call_id
+
+    @property
+    def tool_calls(self) -> Optional[List[Dict[str, Any]]]:
+        """Tool calls requested by an assistant message, in LangChain's dict shape."""
+        if self.role is not Role.ASSISTANT or not self.tool:
+            return None
+        return [{'id': call_id, 'name': name, 'args': args} for call_id, name, args in self.tool]
+
+    @property
+    def tool_call_id(self) -> Optional[str]:
+        """ID of the call a tool message answers."""
+        return self.tool if self.role is Role.TOOL else None
+
+    @property
+    def content(self) -> str:
+        """Message text (decompressed on access if the message is cold)."""
+        content = self._content
+        if isinstance(content, bytes):
+            return zlib.decompress(content).decode('utf-8')
+        return content
+
+    @property
+    def is_compressed(self) -> bool:
+        return isinstance(self._content, bytes)
+
+    def compress(self) -> None:
+        """Compress the content in place when it is long enough to pay off."""
+        if isinstance(self._content, str):
+            encoded = self._content.encode('utf-8')
+            if len(encoded) >= COMPRESS_MIN_BYTES:
+                compressed = zlib.compress(encoded)
+                if len(compressed) < len(encoded):
+                    self._content = compressed
+
+    def decompress(self) -> None:
+        """Restore the plain-text content."""
+        if isinstance(self._content, bytes):
+            content = self.content
+            self._content = sys.intern(content) if len(content) <= INTERN_MAX_CHARS else content
+
+    def nbytes(self) -> int:
+        """Approximate memory held by this message."""
+        size = sys.getsizeof(self) + sys.getsizeof(self._content) + sys.getsizeof(self.timestamp)
+        if isinstance(self.tool, tuple):
+            size += sys.getsizeof(self.tool)
+            for call in self.tool:
+                call_id, _, args = call
+                size += sys.getsizeof(call) + sys.getsizeof(call_id) + sys.getsizeof(args)
+        elif self.tool is not None:
+            size += sys.getsizeof(self.tool)
+        return size
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Original dict form used by the JSON API and snapshots, plus tool fields when set."""
+        data = {
+            'role': self.role.label,
+            'content': self.content,
+            'timestamp': micros_to_iso(self.timestamp)
+        }
+        if self.tool_calls:
+            data['tool_calls'] = self.tool_calls
+        elif self.tool_call_id is not None:
+            data['tool_call_id'] = self.tool_call_id
+        return data
+
+    @classmethod
+    def from_dict(cls, data: Union['Message', Dict[str, Any]]) -> 'Message':
+        """Build a message from its dict form (messages are returned as is)."""
+        if isinstance(data, Message):
+            return data
+        timestamp = data.get('timestamp')
+        if isinstance(timestamp, str):
+            timestamp = iso_to_micros(timestamp)
+        return cls(data['role'], data['content'], timestamp,
+                   tool_calls=data.get('tool_calls'), tool_call_id=data.get('tool_call_id'))
+
+    def __getitem__(self, key: str) -> Any:
+        if key == 'role':
+            return self.role.label
+        if key == 'content':
+            return self.content
+        if key == 'timestamp':
+            return micros_to_iso(self.timestamp)
+        if key == 'tool_calls' and self.tool_calls:
+            return self.tool_calls
+        if key == 'tool_call_id' and self.tool_call_id is not None:
+            return self.tool_call_id
+        raise KeyError(key)
+
+    def get(self, key: str, default: Any = None) -> Any:
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def __repr__(self) -> str:
+        return f"Message(role={self.role.label!r}, content={self.content[:40]!r}, timestamp={self.timestamp})"
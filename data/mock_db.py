@@ -2,14 +2,123 @@
 Mock database using Pandas DataFrames.
 Simulates Azure SQL tables for Users and Zones.
 """
+import asyncio
+import atexit
+import numpy as np
 import pandas as pd
-from typing import Optional, List, Dict
+from typing import Optional, List, Dict, Any, Iterable, Union, Callable
+from contextlib import contextmanager, asynccontextmanager
 from datetime import datetime
+import threading
 import uuid
+from config.settings import settings
+from data.conversation_store import ShardedConversationStore
+from data.conversation_log import ConversationLog
+from data.messages import Message
+
+
+# Compact column dtypes: repeated Arabic labels become categoricals,
+# balances float32, dates datetime64, zone ids int32
+USER_SCHEMA = {
+    'service_type': 'category',
+    'zone_id': 'int32',
+    'payment_status': 'category',
+    'last_payment_date': 'datetime64[ns]',
+    'outstanding_balance': 'float32',
+    'service_status': 'category'
+}
+
+ZONE_SCHEMA = {
+    'zone_id': 'int32',
+    'maintenance_status': 'category',
+    'estimated_restoration': 'datetime64[ns]',
+    'affected_services': 'category',
+    'status_updated': 'datetime64[ns]'
+}
+
+# Async turns poll the thread turn lock between these delays (seconds)
+TURN_LOCK_POLL_MIN = 0.005
+TURN_LOCK_POLL_MAX = 0.05
+
+# Output formats for datetime columns, so lookups keep returning the original strings
+DATETIME_FORMATS = {
+    'last_payment_date': '%Y-%m-%d',
+    'estimated_restoration': '%Y-%m-%d %H:%M',
+    'status_updated': '%Y-%m-%d %H:%M'
+}
+
+
+def build_users_table(data: Union[Dict[str, list], pd.DataFrame]) -> pd.DataFrame:
+    """
+    Build a users table with compact column dtypes.
+    
+    Args:
+        data: Column mapping or DataFrame with the users columns
+        
+    Returns:
+        DataFrame: Users table using USER_SCHEMA dtypes
+    """
+    return apply_schema(pd.DataFrame(data), USER_SCHEMA)
+
+
+def build_zones_table(data: Union[Dict[str, list], pd.DataFrame]) -> pd.DataFrame:
+    """
+    Build a zones table with compact column dtypes.
+    
+    Args:
+        data: Column mapping or DataFrame with the zones columns
+        
+    Returns:
+        DataFrame: Zones table using ZONE_SCHEMA dtypes
+    """
+    return apply_schema(pd.DataFrame(data), ZONE_SCHEMA)
+
+
+def apply_schema(frame: pd.DataFrame, schema: Dict[str, str]) -> pd.DataFrame:
+    """
+    Cast the columns of a frame to the dtypes of a schema.
+    
+    Args:
+        frame: Frame to convert (modified in place)
+        schema: Mapping of column name to dtype; missing columns are skipped
+        
+    Returns:
+        DataFrame: The converted frame
+    """
+    for column, dtype in schema.items():
+        if column not in frame.columns:
+            continue
+        if dtype.startswith('datetime64'):
+            frame[column] = pd.to_datetime(frame[column], format='ISO8601')
+        else:
+            frame[column] = frame[column].astype(dtype)
+    return frame
+
+
+def memory_footprint(table: pd.DataFrame) -> Dict[str, Any]:
+    """
+    Report the memory used by a table, including string payloads.
+    
+    Args:
+        table: Table to measure
+        
+    Returns:
+        dict: rows, total_bytes, bytes_per_row and per-column bytes
+    """
+    usage = table.memory_usage(deep=True, index=True)
+    total_bytes = int(usage.sum())
+    rows = len(table)
+    
+    return {
+        'rows': rows,
+        'total_bytes': total_bytes,
+        'bytes_per_row': total_bytes / rows if rows else 0.0,
+        'columns': {column: int(usage[column]) for column in table.columns}
+    }
 
 
 # Users Table - Contains customer information
-users_table = pd.DataFrame({
+users_table = build_users_table({
     'cil': ['1071324-101', '1300994-101', '3095678-303', '4017890-404', '5029012-505'],
     'name': ['Abdenbi EL MARZOUKI', 'Ahmed Sabil', 'محمد الإدريسي', 'خديجة العلوي', 'يوسف السباعي'],
     'address': ['967, Lot. Sala Al Jadida Zone (1), Sala Al Jadida', '2 Rue BATTIT I Ghizlaine Imm 2 apt 03', 'شارع محمد الخامس، فاس', 'حي النخيل، مراكش', 'شارع الزرقطوني، طنجة'],
@@ -24,7 +133,7 @@ users_table = pd.DataFrame({
 
 
 # Zones Table - Contains maintenance and outage information
-zones_table = pd.DataFrame({
+zones_table = build_zones_table({
     'zone_id': [1, 2, 3, 4],
     'zone_name': ['الدار البيضاء - وسط المدينة', 'الرباط - حي المحمدي', 'مراكش - القليعة', 'طنجة - المدينة القديمة'],
     'maintenance_status': ['جاري الصيانة', 'لا توجد صيانة', 'لا توجد صيانة', 'جاري الصيانة'],
@@ -35,6 +144,163 @@ zones_table = pd.DataFrame({
 })
 
 
+class PrimaryKeyIndex:
+    """
+    Hash index mapping a table's primary key to its row position.
+    
+    Lookups go through the pandas hash engine and read values straight from
+    the cached column arrays, so fetching a row is O(1) and never builds a
+    temporary DataFrame. Key positions, column arrays and the table itself are
+    swapped together as one snapshot, so lock-free readers never see a
+    half-updated index.
+    """
+    
+    def __init__(self, table: pd.DataFrame, key: str):
+        self.key = key
+        self.rebuild(table)
+    
+    @property
+    def positions(self) -> pd.Index:
+        """Index of primary key values, in row order."""
+        return self._snapshot[0]
+    
+    @property
+    def table(self) -> pd.DataFrame:
+        """Table the current positions refer to."""
+        return self._snapshot[2]
+    
+    def rebuild(self, table: pd.DataFrame) -> None:
+        """
+        Rebuild the index after rows were added, removed or reordered.
+        
+        Args:
+            table: Table to index
+            
+        Raises:
+            ValueError: If the primary key column contains duplicates
+        """
+        positions = pd.Index(table[self.key])
+        if not positions.is_unique:
+            duplicates = positions[positions.duplicated()].unique().tolist()
+            raise ValueError(f"Duplicate {self.key} values: {duplicates[:5]}")
+        
+        self._snapshot = (positions, self._column_arrays(table), table)
+    
+    def refresh_columns(self, table: pd.DataFrame) -> None:
+        """
+        Re-cache column arrays after in-place value updates.
+        
+        Row positions are unchanged, so the key lookup stays valid; only the
+        column arrays have to be re-read in case pandas reallocated them.
+        
+        Args:
+            table: Indexed table
+        """
+        self._snapshot = (self.positions, self._column_arrays(table), table)
+    
+    def append(self, table: pd.DataFrame, new_keys: pd.Index) -> None:
+        """
+        Patch the index after rows were appended to the end of the table.
+        
+        Args:
+            table: Indexed table, already containing the new rows
+            new_keys: Primary keys of the appended rows, in row order
+        """
+        self._snapshot = (self.positions.append(new_keys), self._column_arrays(table), table)
+    
+    def _column_arrays(self, table: pd.DataFrame) -> list:
+        """Cache (column, array, date format) triples for row reads."""
+        return [
+            (column, table[column].array, DATETIME_FORMATS.get(column, '%Y-%m-%d %H:%M'))
+            for column in table.columns
+        ]
+    
+    def get_position(self, key_value: Any) -> Optional[int]:
+        """
+        Get the row position for a primary key value.
+        
+        Args:
+            key_value: Primary key value
+            
+        Returns:
+            int: Row position or None if not found
+        """
+        return self._locate(self.positions, key_value)
+    
+    def get_positions(self, key_values: List[Any]) -> tuple:
+        """
+        Resolve many primary keys in one vectorized pass.
+        
+        Args:
+            key_values: Primary key values
+            
+        Returns:
+            tuple: (positions array with -1 for missing keys, table they refer to)
+        """
+        positions, _, table = self._snapshot
+        return positions.get_indexer(key_values), table
+    
+    def get_row(self, key_value: Any) -> Optional[dict]:
+        """
+        Get a row as a plain dict by primary key.
+        
+        Args:
+            key_value: Primary key value
+            
+        Returns:
+            dict: Row values (native Python types) or None if not found
+        """
+        positions, columns, _ = self._snapshot
+        position = self._locate(positions, key_value)
+        
+        if position is None:
+            return None
+        
+        return {
+            column: _to_native(values[position], date_format)
+            for column, values, date_format in columns
+        }
+    
+    @staticmethod
+    def _locate(positions: pd.Index, key_value: Any) -> Optional[int]:
+        """Hash lookup of one key, None when absent or unhashable."""
+        try:
+            return positions.get_loc(key_value)
+        except (KeyError, TypeError, pd.errors.InvalidIndexError):
+            return None
+
+
+def _to_native(value: Any, date_format: str = '%Y-%m-%d %H:%M') -> Any:
+    """
+    Convert a stored cell to the plain Python value exposed by lookups.
+    
+    Timestamps become formatted strings, float32 balances keep their short
+    decimal form (890.0, not 890.000...) and missing values become None.
+    """
+    if value is None or value is pd.NaT or value is pd.NA:
+        return None
+    if isinstance(value, pd.Timestamp):
+        return value.strftime(date_format)
+    if isinstance(value, np.floating):
+        value = float(str(value))
+    elif isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, float) and value != value:
+        return None
+    return value
+
+
+# Primary-key indexes (CIL -> row, zone_id -> row)
+users_index = PrimaryKeyIndex(users_table, 'cil')
+zones_index = PrimaryKeyIndex(zones_table, 'zone_id')
+
+
+def rebuild_indexes() -> None:
+    """Rebuild both primary-key indexes after the tables were replaced or reshaped."""
+    users_index.rebuild(users_table)
+    zones_index.rebuild(zones_table)
+
+
 def get_user_by_cil(cil: str) -> Optional[dict]:
     """
     Retrieve user information by CIL (Customer Identification Number).
@@ -45,12 +311,7 @@ def get_user_by_cil(cil: str) -> Optional[dict]:
     Returns:
         dict: User information or None if not found
     """
-    user = users_table[users_table['cil'] == cil]
-    
-    if user.empty:
-        return None
-    
-    return user.iloc[0].to_dict()
+    return users_index.get_row(cil)
 
 
 def get_zone_by_id(zone_id: int) -> Optional[dict]:
@@ -63,12 +324,300 @@ def get_zone_by_id(zone_id: int) -> Optional[dict]:
     Returns:
         dict: Zone information or None if not found
     """
-    zone = zones_table[zones_table['zone_id'] == zone_id]
+    return zones_index.get_row(zone_id)
+
+
+# Serializes writers; readers go through the index snapshots without locking
+_write_lock = threading.RLock()
+
+# Callbacks notified after table changes: callback(table_name, keys or None for "everything")
+_change_listeners: List[Callable[[str, Optional[List[Any]]], None]] = []
+
+
+def register_change_listener(callback: Callable[[str, Optional[List[Any]]], None]) -> None:
+    """
+    Register a callback run after users or zones change.
     
-    if zone.empty:
-        return None
+    Derived views (caches, precomputed answers) use this to stay consistent
+    with the tables.
+    
+    Args:
+        callback: Called with the table name ('users' or 'zones') and the
+            changed primary keys, or None when the whole table was replaced
+    """
+    _change_listeners.append(callback)
+
+
+def _notify_change(table_name: str, keys: Optional[List[Any]]) -> None:
+    """Run all change listeners, never letting one break a write."""
+    for callback in list(_change_listeners):
+        try:
+            callback(table_name, keys)
+        except Exception as e:
+            print(f"Error in change listener: {str(e)}")
+
+
+def update_user(cil: str, updates: Dict[str, Any]) -> bool:
+    """
+    Update fields of an existing user in place and patch the index.
+    
+    Args:
+        cil: Customer Identification Number
+        updates: Mapping of column name to new value (the CIL itself cannot change)
+        
+    Returns:
+        bool: True if successful, False if user not found
+    """
+    with _write_lock:
+        updated = _update_row(users_table, users_index, cil, updates)
+    
+    if updated:
+        _notify_change('users', [cil])
+    return updated
+
+
+def update_zone(zone_id: int, updates: Dict[str, Any]) -> bool:
+    """
+    Update fields of an existing zone in place and patch the index.
+    
+    Args:
+        zone_id: Zone identification number
+        updates: Mapping of column name to new value (the zone_id itself cannot change)
+        
+    Returns:
+        bool: True if successful, False if zone not found
+    """
+    with _write_lock:
+        updated = _update_row(zones_table, zones_index, zone_id, updates)
+    
+    if updated:
+        _notify_change('zones', [zone_id])
+    return updated
+
+
+def _update_row(table: pd.DataFrame, index: PrimaryKeyIndex, key_value: Any, updates: Dict[str, Any]) -> bool:
+    """Apply in-place updates to one indexed row."""
+    position = index.get_position(key_value)
+    
+    if position is None:
+        return False
+    
+    if index.key in updates and updates[index.key] != key_value:
+        raise ValueError(f"Cannot change primary key column: {index.key}")
+    
+    unknown = set(updates) - set(table.columns)
+    if unknown:
+        raise KeyError(f"Unknown columns: {sorted(unknown)}")
+    
+    for column, value in updates.items():
+        value = _coerce_cell(table, column, value)
+        table.iat[position, table.columns.get_loc(column)] = value
+    
+    index.refresh_columns(table)
+    return True
+
+
+def replace_users_table(table: pd.DataFrame) -> None:
+    """
+    Swap in a complete users table and rebuild its index.
+    
+    Args:
+        table: New users table (see build_users_table)
+    """
+    global users_table
+    
+    with _write_lock:
+        users_index.rebuild(table)
+        users_table = table
+    
+    _notify_change('users', None)
+
+
+def replace_zones_table(table: pd.DataFrame) -> None:
+    """
+    Swap in a complete zones table and rebuild its index.
+    
+    Args:
+        table: New zones table (see build_zones_table)
+    """
+    global zones_table
+    
+    with _write_lock:
+        zones_index.rebuild(table)
+        zones_table = table
+    
+    _notify_change('zones', None)
+
+
+def upsert_users(rows: pd.DataFrame) -> Dict[str, int]:
+    """
+    Insert new users and update existing ones, keyed by CIL.
+    
+    Rows may carry only some columns (e.g. a payment-status delta); missing
+    or null cells leave the stored value untouched. New CILs must provide
+    every column.
+    
+    Args:
+        rows: Rows to upsert, already coerced to USER_SCHEMA dtypes
+        
+    Returns:
+        dict: Number of 'inserted' and 'updated' rows
+    """
+    global users_table
+    
+    with _write_lock:
+        users_table, stats = _upsert_rows(users_table, users_index, rows)
+    
+    _notify_change('users', stats.pop('keys'))
+    return stats
+
+
+def upsert_zones(rows: pd.DataFrame) -> Dict[str, int]:
+    """
+    Insert new zones and update existing ones, keyed by zone_id.
+    
+    Args:
+        rows: Rows to upsert, already coerced to ZONE_SCHEMA dtypes
+        
+    Returns:
+        dict: Number of 'inserted' and 'updated' rows
+    """
+    global zones_table
     
-    return zone.iloc[0].to_dict()
+    with _write_lock:
+        zones_table, stats = _upsert_rows(zones_table, zones_index, rows)
+    
+    _notify_change('zones', stats.pop('keys'))
+    return stats
+
+
+def _upsert_rows(table: pd.DataFrame, index: PrimaryKeyIndex, rows: pd.DataFrame) -> tuple:
+    """
+    Apply an upsert batch: vectorized in-place updates, then one append.
+    
+    Returns:
+        tuple: (table, stats) where table is a new object only if rows were appended
+    """
+    key = index.key
+    unknown = set(rows.columns) - set(table.columns)
+    if unknown:
+        raise KeyError(f"Unknown columns: {sorted(unknown)}")
+    
+    rows = rows.drop_duplicates(subset=key, keep='last').reset_index(drop=True)
+    positions = index.positions.get_indexer(rows[key])
+    existing = positions >= 0
+    
+    for column in rows.columns:
+        if column == key:
+            continue
+        _add_missing_categories(table, column, rows[column])
+        mask = existing & rows[column].notna().to_numpy()
+        if mask.any():
+            values = rows.loc[mask, column].astype(table[column].dtype)
+            table.iloc[positions[mask], table.columns.get_loc(column)] = values.to_numpy()
+    
+    new_rows = rows.loc[~existing]
+    if len(new_rows):
+        missing = set(table.columns) - set(new_rows.columns)
+        if missing:
+            raise ValueError(f"New {key} values need every column, missing: {sorted(missing)}")
+        new_rows = new_rows[table.columns].astype(table.dtypes.to_dict())
+        table = pd.concat([table, new_rows], ignore_index=True)
+        index.append(table, pd.Index(new_rows[key]))
+    else:
+        index.refresh_columns(table)
+    
+    return table, {
+        'inserted': int(len(new_rows)),
+        'updated': int(existing.sum()),
+        'keys': rows[key].tolist()
+    }
+
+
+def _add_missing_categories(table: pd.DataFrame, column: str, values: pd.Series) -> None:
+    """Extend a categorical column's categories with any new values."""
+    dtype = table[column].dtype
+    if not isinstance(dtype, pd.CategoricalDtype):
+        return
+    
+    new_categories = pd.Index(values.dropna().unique()).difference(dtype.categories)
+    if len(new_categories):
+        table[column] = table[column].cat.add_categories(new_categories)
+
+
+def _coerce_cell(table: pd.DataFrame, column: str, value: Any) -> Any:
+    """Cast a value to a column's dtype, registering new categories as needed."""
+    if value is None:
+        return value
+    
+    dtype = table[column].dtype
+    if isinstance(dtype, pd.CategoricalDtype):
+        if value not in dtype.categories:
+            table[column] = table[column].cat.add_categories([value])
+    elif pd.api.types.is_datetime64_any_dtype(dtype):
+        value = pd.Timestamp(value)
+    elif pd.api.types.is_numeric_dtype(dtype):
+        value = dtype.type(value)
+    return value
+
+
+def get_users_by_cils(cils: Iterable[str], include_zone: bool = True,
+                      as_frame: bool = False) -> Union[List[dict], pd.DataFrame]:
+    """
+    Retrieve many users at once with a single vectorized lookup.
+    
+    Positions are resolved in one pass through the CIL index and, when
+    include_zone is set, the matching rows are joined with the zones table
+    (users ⨝ zones) in a single merge.
+    
+    Args:
+        cils: Customer Identification Numbers (duplicates are ignored, order is kept)
+        include_zone: Whether to join each user with its zone row
+        as_frame: Return a DataFrame instead of a list of dicts
+        
+    Returns:
+        list | DataFrame: Found users in request order; unknown CILs are omitted
+    """
+    unique_cils = list(dict.fromkeys(cils))
+    positions, users = users_index.get_positions(unique_cils)
+    users = users.take(positions[positions >= 0])
+    
+    if include_zone:
+        users = users.merge(zones_index.table, on='zone_id', how='left', sort=False)
+    else:
+        users = users.reset_index(drop=True)
+    
+    return users if as_frame else _frame_to_records(users)
+
+
+def get_zones_by_ids(zone_ids: Iterable[int], as_frame: bool = False) -> Union[List[dict], pd.DataFrame]:
+    """
+    Retrieve many zones at once with a single vectorized lookup.
+    
+    Args:
+        zone_ids: Zone identification numbers (duplicates are ignored, order is kept)
+        as_frame: Return a DataFrame instead of a list of dicts
+        
+    Returns:
+        list | DataFrame: Found zones in request order; unknown IDs are omitted
+    """
+    unique_ids = list(dict.fromkeys(zone_ids))
+    positions, zones = zones_index.get_positions(unique_ids)
+    zones = zones.take(positions[positions >= 0]).reset_index(drop=True)
+    
+    return zones if as_frame else _frame_to_records(zones)
+
+
+def _frame_to_records(frame: pd.DataFrame) -> List[dict]:
+    """Convert a DataFrame to JSON-friendly records with the same values as the single lookups."""
+    columns = {
+        column: [
+            _to_native(value, DATETIME_FORMATS.get(column, '%Y-%m-%d %H:%M'))
+            for value in frame[column].array
+        ]
+        for column in frame.columns
+    }
+    return [dict(zip(columns, row)) for row in zip(*columns.values())]
 
 
 def get_all_users() -> pd.DataFrame:
@@ -81,8 +630,55 @@ def get_all_zones() -> pd.DataFrame:
     return zones_table.copy()
 
 
-# Conversations Store - In-memory storage for conversation history
-conversations_store = {}
+# Conversations Store - Bounded, sharded in-memory storage for conversation history
+conversations_store = ShardedConversationStore(
+    shards=settings.CONVERSATION_SHARDS,
+    max_entries=settings.CONVERSATION_MAX_ENTRIES,
+    max_bytes=settings.CONVERSATION_MAX_BYTES,
+    ttl_seconds=settings.CONVERSATION_TTL_SECONDS,
+    cold_seconds=settings.CONVERSATION_COLD_SECONDS
+)
+
+# Optional durable backend; evicted or pre-restart conversations are reloaded from it on first access
+conversation_backend: Optional[ConversationLog] = None
+if settings.CONVERSATION_LOG_DIR:
+    conversation_backend = ConversationLog(
+        settings.CONVERSATION_LOG_DIR,
+        segment_max_bytes=settings.CONVERSATION_LOG_SEGMENT_BYTES,
+        fsync_interval=settings.CONVERSATION_LOG_FSYNC_INTERVAL,
+        # Compaction never drops a conversation that is still in memory
+        is_live=lambda conversation_id: conversation_id in conversations_store,
+        compact_segments=settings.CONVERSATION_LOG_COMPACT_SEGMENTS,
+        retention_seconds=settings.CONVERSATION_LOG_RETENTION_SECONDS
+    )
+    atexit.register(conversation_backend.sync)
+
+
+def set_conversation_backend(backend: Optional[ConversationLog]) -> None:
+    """
+    Replace the conversation persistence backend.
+    
+    Any object with record_create(conversation), record_message(conversation_id,
+    seq, message) and load(conversation_id) works; None keeps history in memory only.
+    
+    Args:
+        backend: Persistence backend or None
+    """
+    global conversation_backend
+    conversation_backend = backend
+
+
+def _load_conversation(conversation_id: str) -> Optional[Dict]:
+    """Get a conversation from memory, falling back to the persistence backend."""
+    conversation = conversations_store.get(conversation_id)
+    
+    if conversation is None and conversation_backend is not None:
+        conversation = conversation_backend.load(conversation_id)
+        if conversation is not None:
+            conversation['messages'] = [Message.from_dict(message) for message in conversation['messages']]
+            conversation = conversations_store.put_if_absent(conversation)
+    
+    return conversation
 
 
 def create_conversation() -> str:
@@ -93,11 +689,16 @@ def create_conversation() -> str:
         str: Unique conversation ID
     """
     conversation_id = str(uuid.uuid4())
-    conversations_store[conversation_id] = {
+    conversation = {
         'conversation_id': conversation_id,
         'created_at': datetime.now().isoformat(),
         'messages': []
     }
+    
+    if conversation_backend is not None:
+        conversation_backend.record_create(conversation)
+    
+    conversations_store.put(conversation)
     return conversation_id
 
 
@@ -111,49 +712,134 @@ def get_conversation(conversation_id: str) -> Optional[Dict]:
     Returns:
         dict: Conversation data with messages or None if not found
     """
-    return conversations_store.get(conversation_id)
+    return _load_conversation(conversation_id)
 
 
-def add_message_to_conversation(conversation_id: str, role: str, content: str) -> bool:
+def add_message_to_conversation(conversation_id: str, role: str, content: str,
+                                tool_calls: Optional[List[Dict]] = None,
+                                tool_call_id: Optional[str] = None) -> bool:
     """
     Add a message to an existing conversation.
     
     Args:
         conversation_id: Unique conversation identifier
-        role: Message role ('user' or 'assistant')
+        role: Message role ('user', 'assistant' or 'tool')
         content: Message content
+        tool_calls: Tool calls requested by an assistant message ({'id', 'name', 'args'})
+        tool_call_id: ID of the tool call a 'tool' message answers
         
     Returns:
         bool: True if successful, False if conversation not found
     """
-    conversation = conversations_store.get(conversation_id)
+    message = Message(role, content, tool_calls=tool_calls, tool_call_id=tool_call_id)
     
-    if not conversation:
-        return False
+    count = conversations_store.append_message(conversation_id, message)
+    if not count and _load_conversation(conversation_id) is not None:
+        count = conversations_store.append_message(conversation_id, message)
     
-    message = {
-        'role': role,
-        'content': content,
-        'timestamp': datetime.now().isoformat()
-    }
+    if not count:
+        return False
     
-    conversation['messages'].append(message)
+    if conversation_backend is not None:
+        conversation_backend.record_message(conversation_id, count - 1, message.to_dict())
     return True
 
 
-def get_conversation_history(conversation_id: str) -> List[Dict]:
+def get_conversation_history(conversation_id: str, after: int = 0,
+                             limit: Optional[int] = None) -> List[Message]:
     """
     Get the message history for a conversation.
     
+    Messages are compact records that read like the original dicts
+    (message['role'], message['content']); use to_dict() for JSON.
+    
     Args:
         conversation_id: Unique conversation identifier
+        after: Number of leading messages to skip (a message-count cursor)
+        limit: Maximum number of messages to return (None for all)
         
     Returns:
-        list: List of messages or empty list if conversation not found
+        list: Copy of the messages or empty list if conversation not found
     """
-    conversation = conversations_store.get(conversation_id)
+    stop = after + limit if limit is not None else None
+    messages = conversations_store.get_messages(conversation_id, after, stop)
+    
+    if messages is None and _load_conversation(conversation_id) is not None:
+        messages = conversations_store.get_messages(conversation_id, after, stop)
+    
+    return messages or []
+
+
+def get_message_count(conversation_id: str) -> Optional[int]:
+    """
+    Get the number of messages in a conversation.
+    
+    Conversations are append-only, so the count doubles as a version.
+    
+    Args:
+        conversation_id: Unique conversation identifier
+        
+    Returns:
+        int: Message count or None if conversation not found
+    """
+    count = conversations_store.message_count(conversation_id)
+    
+    if count is None and _load_conversation(conversation_id) is not None:
+        count = conversations_store.message_count(conversation_id)
+    
+    return count
+
+
+@contextmanager
+def conversation_turn(conversation_id: str):
+    """
+    Serialize turns within one conversation.
     
-    if not conversation:
-        return []
+    Hold this while reading the history, running the agent and storing the
+    reply, so concurrent requests on the same conversation cannot interleave
+    their messages. Different conversations never wait on each other.
     
-    return conversation['messages']
+    Args:
+        conversation_id: Unique conversation identifier
+    """
+    _load_conversation(conversation_id)
+    lock = conversations_store.turn_lock(conversation_id)
+    
+    if lock is None:
+        yield
+        return
+    
+    with lock:
+        yield
+
+
+@asynccontextmanager
+async def aconversation_turn(conversation_id: str):
+    """
+    Async conversation_turn: waits for the turn lock without blocking the event loop.
+    
+    Async turns queue on the conversation's asyncio lock, then the one in
+    front polls the thread lock (held by threaded turns such as speech), so
+    waiting never takes a thread from the executor the lock holder needs.
+    
+    Args:
+        conversation_id: Unique conversation identifier
+    """
+    await asyncio.to_thread(_load_conversation, conversation_id)
+    alock = conversations_store.aturn_lock(conversation_id)
+    lock = conversations_store.turn_lock(conversation_id)
+    
+    if alock is None or lock is None:
+        yield
+        return
+    
+    async with alock:
+        delay = TURN_LOCK_POLL_MIN
+        while not lock.acquire(blocking=False):
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, TURN_LOCK_POLL_MAX)
+        
+        try:
+            yield
+        finally:
+            lock.release()
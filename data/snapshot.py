@@ -0,0 +1,208 @@
+"""
+Binary snapshots of the in-memory database.
+Saves users, zones and conversations as Arrow IPC (feather) files so a new
+worker can restore them without re-parsing the source CSVs.
+"""
+import json
+import os
+import shutil
+import tempfile
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Any
+import pandas as pd
+from data import mock_db
+from data.messages import Message
+
+
+# Bump when the snapshot layout changes; older snapshots are refused
+SNAPSHOT_FORMAT_VERSION = 1
+
+MANIFEST_FILE = 'manifest.json'
+USERS_FILE = 'users.arrow'
+ZONES_FILE = 'zones.arrow'
+CONVERSATIONS_FILE = 'conversations.arrow'
+MESSAGES_FILE = 'messages.arrow'
+
+
+def _require_pyarrow():
+    """Import pyarrow lazily, since it is only needed for snapshots."""
+    try:
+        import pyarrow.feather as feather
+    except ImportError:
+        raise ImportError("Database snapshots require pyarrow: pip install pyarrow")
+    return feather
+
+
+def save_snapshot(directory: str) -> Dict[str, Any]:
+    """
+    Write the users, zones and conversations to a snapshot directory.
+
+    Files are written uncompressed, so restoring them needs no decompression,
+    into a temporary directory. The old snapshot is renamed aside, the new
+    one renamed into place, and only then is the old one deleted; if the
+    process dies between the two renames, load_snapshot reads the old one.
+
+    Args:
+        directory: Snapshot directory (created or replaced)
+
+    Returns:
+        dict: Manifest describing the snapshot
+    """
+    feather = _require_pyarrow()
+    target = Path(directory)
+    target.parent.mkdir(parents=True, exist_ok=True)
+    staging = Path(tempfile.mkdtemp(prefix='.snapshot-', dir=target.parent))
+
+    try:
+        users = mock_db.users_index.table
+        zones = mock_db.zones_index.table
+        conversations, messages = _conversations_to_frames()
+
+        feather.write_feather(users, staging / USERS_FILE, compression='uncompressed')
+        feather.write_feather(zones, staging / ZONES_FILE, compression='uncompressed')
+        feather.write_feather(conversations, staging / CONVERSATIONS_FILE, compression='uncompressed')
+        feather.write_feather(messages, staging / MESSAGES_FILE, compression='uncompressed')
+
+        manifest = {
+            'format_version': SNAPSHOT_FORMAT_VERSION,
+            'created_at': datetime.now().isoformat(),
+            'users': len(users),
+            'zones': len(zones),
+            'conversations': len(conversations),
+            'messages': len(messages)
+        }
+        with open(staging / MANIFEST_FILE, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=2)
+
+        _swap_in(staging, target)
+        return manifest
+
+    except Exception:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+
+
+def _previous_path(target: Path) -> Path:
+    """Where the replaced snapshot waits until the new one is in place."""
+    return target.parent / f'.{target.name}.previous'
+
+
+def _swap_in(staging: Path, target: Path) -> None:
+    """Replace target with staging so that a complete snapshot is always on disk."""
+    previous = _previous_path(target)
+    if target.exists():
+        # Left over from an interrupted save that did put target in place
+        shutil.rmtree(previous, ignore_errors=True)
+        os.replace(target, previous)
+
+    try:
+        os.replace(staging, target)
+    except Exception:
+        if previous.exists() and not target.exists():
+            os.replace(previous, target)
+        raise
+
+    shutil.rmtree(previous, ignore_errors=True)
+
+
+def load_snapshot(directory: str) -> Dict[str, Any]:
+    """
+    Restore users, zones and conversations from a snapshot directory.
+
+    The Arrow tables are converted to pandas and copied, so each worker
+    holds its own writable copy of the data (categorical codes would
+    otherwise stay read-only Arrow buffers and updates would fail); the
+    gain over the CSVs is skipping the parsing, not sharing memory
+    between workers.
+
+    Args:
+        directory: Snapshot directory written by save_snapshot
+
+    Returns:
+        dict: Manifest of the restored snapshot
+
+    Raises:
+        FileNotFoundError: If the snapshot is missing
+        ValueError: If the snapshot format is not supported
+    """
+    feather = _require_pyarrow()
+    source = Path(directory)
+    if not source.exists() and _previous_path(source).exists():
+        # save_snapshot was interrupted between its two renames
+        source = _previous_path(source)
+
+    with open(source / MANIFEST_FILE, encoding='utf-8') as f:
+        manifest = json.load(f)
+
+    if manifest.get('format_version') != SNAPSHOT_FORMAT_VERSION:
+        raise ValueError(f"Unsupported snapshot format: {manifest.get('format_version')}")
+
+    users = feather.read_feather(source / USERS_FILE).copy()
+    zones = feather.read_feather(source / ZONES_FILE).copy()
+    conversations = feather.read_feather(source / CONVERSATIONS_FILE)
+    messages = feather.read_feather(source / MESSAGES_FILE)
+
+    mock_db.replace_users_table(users)
+    mock_db.replace_zones_table(zones)
+    _restore_conversations(conversations, messages)
+
+    return manifest
+
+
+def _conversations_to_frames() -> tuple:
+    """Flatten the conversation store into conversations and messages tables."""
+    headers = []
+    rows = []
+
+    for conversation_id, conversation in mock_db.conversations_store.items():
+        headers.append({'conversation_id': conversation_id, 'created_at': conversation['created_at']})
+        for message in list(conversation['messages']):
+            data = message.to_dict()
+            tool = {key: data[key] for key in ('tool_calls', 'tool_call_id') if key in data}
+            rows.append({
+                'conversation_id': conversation_id,
+                'role': data['role'],
+                'content': data['content'],
+                'timestamp': data['timestamp'],
+                'tool': json.dumps(tool, ensure_ascii=False) if tool else None
+            })
+
+    messages = pd.DataFrame(rows, columns=['conversation_id', 'role', 'content', 'timestamp', 'tool'])
+    messages['role'] = messages['role'].astype('category')
+    conversations = pd.DataFrame(headers, columns=['conversation_id', 'created_at'])
+    return conversations, messages
+
+
+def _restore_conversations(conversations: pd.DataFrame, messages: pd.DataFrame) -> None:
+    """Rebuild the conversation store from the conversations and messages tables."""
+    restored = {
+        conversation_id: {
+            'conversation_id': conversation_id,
+            'created_at': created_at,
+            'messages': []
+        }
+        for conversation_id, created_at in zip(conversations['conversation_id'], conversations['created_at'])
+    }
+
+    # Snapshots taken before tool messages were stored have no tool column
+    tools = messages['tool'] if 'tool' in messages else [None] * len(messages)
+
+    for conversation_id, role, content, timestamp, tool in zip(
+        messages['conversation_id'], messages['role'], messages['content'], messages['timestamp'], tools
+    ):
+        data = {'role': role, 'content': content, 'timestamp': timestamp}
+        if tool:
+            data.update(json.loads(tool))
+        restored[conversation_id]['messages'].append(Message.from_dict(data))
+
+    mock_db.conversations_store.clear()
+    backend = mock_db.conversation_backend
+    for conversation in restored.values():
+        mock_db.conversations_store.put(conversation)
+        # Log conversations the backend does not have yet, so messages added
+        # later have a 'create' record and survive eviction and restarts
+        if backend is not None and backend.load(conversation['conversation_id']) is None:
+            backend.record_create(conversation)
+            for seq, message in enumerate(conversation['messages']):
+                backend.record_message(conversation['conversation_id'], seq, message.to_dict())
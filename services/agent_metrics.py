@@ -0,0 +1,112 @@
+"""
+Per-turn agent metrics.
+Aggregates LLM calls, tool calls, tokens and stop reasons across chat turns
+for the operational metrics endpoint.
+"""
+import threading
+from typing import Dict, Any
+
+
+class AgentMetrics:
+    """Thread-safe running totals of agent turns."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._turns = 0
+        self._llm_calls = 0
+        self._aux_llm_calls = 0
+        self._tool_calls = 0
+        self._tokens = 0
+        self._seconds = 0.0
+        self._llm_calls_per_turn: Dict[int, int] = {}
+        self._stop_reasons: Dict[str, int] = {}
+        self._streamed_turns = 0
+        self._prompt_tokens_full = 0
+        self._prompt_tokens_sent = 0
+        self._tool_result_tokens = 0
+        self._prompt_tokens = 0
+        self._cached_prompt_tokens = 0
+        self._assembly_seconds = 0.0
+        # route -> [turns, seconds, tokens, llm_calls]
+        self._routes: Dict[str, list] = {}
+        self._first_token_seconds = 0.0
+
+    def record_turn(self, stats: Dict[str, Any]) -> None:
+        """
+        Add one finished turn.
+
+        Args:
+            stats: Turn stats from run_agent (llm_calls, aux_llm_calls, tool_calls, tokens, seconds, stop_reason,
+                route, prompt_tokens_full/sent, tool_result_tokens, prompt_tokens and
+                cached_prompt_tokens, assembly_seconds, and first_token_seconds for streamed turns)
+        """
+        with self._lock:
+            self._turns += 1
+            self._llm_calls += stats['llm_calls']
+            self._aux_llm_calls += stats.get('aux_llm_calls', 0)
+            self._tool_calls += stats['tool_calls']
+            self._tokens += stats['tokens']
+            self._seconds += stats['seconds']
+            self._llm_calls_per_turn[stats['llm_calls']] = self._llm_calls_per_turn.get(stats['llm_calls'], 0) + 1
+            self._stop_reasons[stats['stop_reason']] = self._stop_reasons.get(stats['stop_reason'], 0) + 1
+            route = self._routes.setdefault(stats.get('route', 'large'), [0, 0.0, 0, 0])
+            route[0] += 1
+            route[1] += stats['seconds']
+            route[2] += stats['tokens']
+            route[3] += stats['llm_calls']
+            self._prompt_tokens_full += stats.get('prompt_tokens_full', 0)
+            self._prompt_tokens_sent += stats.get('prompt_tokens_sent', 0)
+            self._tool_result_tokens += stats.get('tool_result_tokens', 0)
+            self._prompt_tokens += stats.get('prompt_tokens', 0)
+            self._cached_prompt_tokens += stats.get('cached_prompt_tokens', 0)
+            self._assembly_seconds += stats.get('assembly_seconds', 0.0)
+            if stats.get('first_token_seconds') is not None:
+                self._streamed_turns += 1
+                self._first_token_seconds += stats['first_token_seconds']
+
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        Get the aggregated metrics.
+
+        Returns:
+            dict: Turn count, totals, averages, LLM calls per turn histogram, stop reasons,
+                latency and tokens per route, prompt tokens per turn before/after history windowing, tool result
+                tokens per turn, prompt assembly time, share of prompt tokens served from Azure's prompt cache
+                and time to first token of streamed turns
+        """
+        with self._lock:
+            turns = self._turns
+            return {
+                'turns': turns,
+                'llm_calls': self._llm_calls,
+                'aux_llm_calls': self._aux_llm_calls,
+                'tool_calls': self._tool_calls,
+                'tokens': self._tokens,
+                'avg_llm_calls_per_turn': self._llm_calls / turns if turns else 0.0,
+                'avg_seconds_per_turn': self._seconds / turns if turns else 0.0,
+                'avg_prompt_tokens_full': self._prompt_tokens_full / turns if turns else 0.0,
+                'avg_prompt_tokens_sent': self._prompt_tokens_sent / turns if turns else 0.0,
+                'avg_tool_result_tokens': self._tool_result_tokens / turns if turns else 0.0,
+                'avg_assembly_seconds': self._assembly_seconds / turns if turns else 0.0,
+                'prompt_tokens': self._prompt_tokens,
+                'cached_prompt_tokens': self._cached_prompt_tokens,
+                'cached_prompt_token_ratio': (
+                    self._cached_prompt_tokens / self._prompt_tokens if self._prompt_tokens else 0.0
+                ),
+                'llm_calls_per_turn': {str(calls): count for calls, count in sorted(self._llm_calls_per_turn.items())},
+                'stop_reasons': dict(self._stop_reasons),
+                'routes': {
+                    name: {
+                        'turns': route_turns,
+                        'llm_calls': llm_calls,
+                        'tokens': tokens,
+                        'avg_tokens_per_turn': tokens / route_turns,
+                        'avg_seconds_per_turn': seconds / route_turns
+                    }
+                    for name, (route_turns, seconds, tokens, llm_calls) in self._routes.items()
+                },
+                'streamed_turns': self._streamed_turns,
+                'avg_first_token_seconds': (
+                    self._first_token_seconds / self._streamed_turns if self._streamed_turns else 0.0
+                )
+            }
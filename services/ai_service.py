@@ -2,6 +2,14 @@
 AI Service using LangChain and Azure OpenAI.
 Defines the agent, tools, and Arabic language prompts.
 """
+import asyncio
+import hashlib
+import itertools
+import json
+import os
+import threading
+import time
+import uuid
 from typing import Optional, Dict, Any, List
 from langchain_core.tools import tool
 from langchain_openai import AzureChatOpenAI
@@ -9,12 +17,116 @@ from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
 from langchain_core.messages import HumanMessage, AIMessage, SystemMessage, ToolMessage
 from langchain_core.runnables import RunnablePassthrough
 from config.settings import settings
-from data.mock_db import get_user_by_cil, get_zone_by_id
+from data.mock_db import get_user_by_cil, get_zone_by_id, register_change_listener
+from services.tool_dispatcher import ToolDispatcher
+from services.agent_metrics import AgentMetrics
+from services.tool_cache import ToolResultCache
+from services.single_flight import SingleFlight
+from services.broadcast_cache import BroadcastAnswerCache
+from services.llm_client import get_http_client, get_async_http_client
+from services.history_manager import HistoryManager
+from services.prompt_assembler import PromptAssembler
+from services.turn_router import (
+    classify_turn, asks_about_outage, detect_cil, ROUTE_TEMPLATE, ROUTE_SMALL, ROUTE_LARGE
+)
+from services.llm_resilience import ResilientCaller, CircuitBreaker, LLMUnavailableError, is_retryable
+
+
+# Rendered tool answers per (tool, CIL); dropped when the user's or zone's row changes
+tool_cache = ToolResultCache(
+    max_entries=settings.TOOL_CACHE_MAX_ENTRIES,
+    ttl_seconds=settings.TOOL_CACHE_TTL_SECONDS
+)
+register_change_listener(tool_cache.on_change)
+
+# Identical tool calls and identical prompts in flight at the same time run once
+tool_flights = SingleFlight()
+llm_flights = SingleFlight()
+
+# Deadline, retries, hedging and circuit breaker around every model call
+llm_guard = ResilientCaller(
+    deadline_seconds=settings.LLM_DEADLINE_SECONDS,
+    max_retries=settings.LLM_MAX_RETRIES,
+    base_delay=settings.LLM_RETRY_BASE_DELAY,
+    max_delay=settings.LLM_RETRY_MAX_DELAY,
+    hedge=settings.LLM_HEDGE,
+    hedge_min_samples=settings.LLM_HEDGE_MIN_SAMPLES,
+    breaker=CircuitBreaker(
+        failure_threshold=settings.LLM_BREAKER_FAILURES,
+        reset_seconds=settings.LLM_BREAKER_RESET_SECONDS
+    ),
+    max_workers=settings.LLM_POOL_MAX_CONNECTIONS
+)
+
+# One maintenance answer per zone status version, shared during outages
+broadcast_cache = BroadcastAnswerCache()
+register_change_listener(broadcast_cache.on_change)
+
+# Recent turns verbatim, older turns folded into a per-conversation summary
+history_manager = HistoryManager(
+    keep_turns=settings.HISTORY_KEEP_TURNS,
+    summary_trigger_tokens=settings.HISTORY_SUMMARY_TRIGGER_TOKENS,
+    max_conversations=settings.HISTORY_MAX_SUMMARIES
+)
 
 
 # Tool Functions (without decorator for direct calling)
-def _check_payment_impl(cil: str) -> str:
-    """Implementation of payment check."""
+def _check_payment_impl(cil: str, compact: Optional[bool] = None) -> str:
+    """
+    Implementation of payment check (cached).
+    
+    Args:
+        cil: Customer Identification Number
+        compact: JSON facts for the model instead of customer-facing text
+            (default TOOL_OUTPUT_COMPACT)
+    """
+    if settings.TOOL_OUTPUT_COMPACT if compact is None else compact:
+        return _cached_answer('check_payment:compact', cil, _payment_facts, depends_on_zone=False)
+    return _cached_answer('check_payment', cil, _payment_answer, depends_on_zone=False)
+
+
+def _check_maintenance_impl(cil: str, compact: Optional[bool] = None) -> str:
+    """Implementation of maintenance check (cached per customer, invalidated per zone); see _check_payment_impl."""
+    if settings.TOOL_OUTPUT_COMPACT if compact is None else compact:
+        return _cached_answer('check_maintenance:compact', cil, _maintenance_facts, depends_on_zone=True)
+    return _cached_answer('check_maintenance', cil, _maintenance_answer, depends_on_zone=True)
+
+
+def _cached_answer(tool_name: str, cil: str, render, depends_on_zone: bool) -> str:
+    """
+    Serve a tool answer from the cache, computing it once on a miss.
+    
+    Concurrent misses for the same (tool, CIL) share a single computation.
+    
+    Args:
+        tool_name: Tool name used as cache key
+        cil: Customer Identification Number
+        render: Function rendering the answer for a CIL
+        depends_on_zone: Tie the entry to the customer's zone for invalidation
+        
+    Returns:
+        str: Tool answer
+    """
+    cached = tool_cache.get(tool_name, cil)
+    if cached is not None:
+        return cached
+    
+    def compute() -> str:
+        version = tool_cache.version
+        result = render(cil)
+        zone_id = None
+        if depends_on_zone:
+            user = get_user_by_cil(cil)
+            zone_id = user['zone_id'] if user else None
+        tool_cache.put(tool_name, cil, result, zone_id=zone_id, version=version)
+        return result
+    
+    result, _ = tool_flights.do((tool_name, cil), compute)
+    return result
+
+
+def _payment_answer(cil: str) -> str:
+    """Render the payment status answer for a customer."""
     user = get_user_by_cil(cil)
     
     if not user:
@@ -55,8 +167,8 @@ def _check_payment_impl(cil: str) -> str:
 """
 
 
-def _check_maintenance_impl(cil: str) -> str:
-    """Implementation of maintenance check."""
+def _maintenance_answer(cil: str) -> str:
+    """Render the maintenance answer for a customer's zone."""
     user = get_user_by_cil(cil)
     
     if not user:
@@ -95,6 +207,56 @@ def _check_maintenance_impl(cil: str) -> str:
 """
 
 
+def _payment_facts(cil: str) -> str:
+    """
+    Payment facts for a customer as compact JSON (only what the model needs).
+    
+    The wording is left to the model; payment channels are listed only when
+    there is something to pay.
+    """
+    user = get_user_by_cil(cil)
+    
+    if not user:
+        return _compact_json({'cil': cil, 'found': False})
+    
+    facts = {
+        'name': user['name'],
+        'service': user['service_type'],
+        'payment': user['payment_status'],
+        'last_payment': user['last_payment_date'],
+        'balance_dh': user['outstanding_balance'],
+        'service_status': user['service_status']
+    }
+    if user['payment_status'] != 'مدفوع':
+        facts['pay_via'] = PAYMENT_CHANNELS
+    return _compact_json(facts)
+
+
+def _maintenance_facts(cil: str) -> str:
+    """Maintenance facts for a customer's zone as compact JSON."""
+    user = get_user_by_cil(cil)
+    
+    if not user:
+        return _compact_json({'cil': cil, 'found': False})
+    
+    zone = get_zone_by_id(user['zone_id'])
+    
+    if not zone:
+        return _compact_json({'zone': None})
+    
+    facts = {'zone': zone['zone_name'], 'maintenance': zone['maintenance_status']}
+    if zone['maintenance_status'] == 'جاري الصيانة':
+        facts['reason'] = zone['outage_reason']
+        facts['affected'] = zone['affected_services']
+        facts['eta'] = zone['estimated_restoration']
+    return _compact_json(facts)
+
+
+def _compact_json(facts: Dict[str, Any]) -> str:
+    """JSON without spaces, keeping Arabic as is (escapes cost several tokens per letter)."""
+    return json.dumps(facts, ensure_ascii=False, separators=(',', ':'))
+
+
 # Create tool wrappers with decorator
 @tool
 def check_payment(cil: str) -> str:
@@ -106,7 +268,7 @@ def check_payment(cil: str) -> str:
         cil: Customer Identification Number (format: 1071324-101)
         
     Returns:
-        str: Payment status information in Arabic
+        str: Payment status (compact JSON, or Arabic text with TOOL_OUTPUT_COMPACT off)
     """
     return _check_payment_impl(cil)
 
@@ -121,7 +283,7 @@ def check_maintenance(cil: str) -> str:
         cil: Customer Identification Number (format: 1071324-101)
         
     Returns:
-        str: Maintenance information in Arabic
+        str: Maintenance information (compact JSON, or Arabic text with TOOL_OUTPUT_COMPACT off)
     """
     return _check_maintenance_impl(cil)
 
@@ -129,6 +291,24 @@ def check_maintenance(cil: str) -> str:
 # Collect tools
 tools = [check_payment, check_maintenance]
 
+# Runs the tool calls of one model response concurrently
+tool_dispatcher = ToolDispatcher(
+    tools,
+    max_workers=settings.TOOL_MAX_WORKERS,
+    timeout=settings.TOOL_TIMEOUT_SECONDS,
+    max_pending=settings.TOOL_MAX_PENDING or None
+)
+
+# LLM calls, tool calls and stop reasons across turns (see /api/metrics)
+agent_metrics = AgentMetrics()
+
+def _fast_path_calls(cil: str) -> List[Dict[str, Any]]:
+    """Tool calls the model would make for a CIL: payment first, then maintenance."""
+    return [
+        {'id': f'fastpath_{uuid.uuid4().hex[:12]}', 'name': t.name, 'args': {'cil': cil}}
+        for t in (check_payment, check_maintenance)
+    ]
+
 
 # Arabic System Prompt
 SYSTEM_PROMPT = """أنت مساعد خدمة العملاء لشركة SRM (إدارة المياه والكهرباء).
@@ -151,24 +331,52 @@ SYSTEM_PROMPT = """أنت مساعد خدمة العملاء لشركة SRM (إ
 
 ابدأ بالترحيب بالعميل وسؤاله عن مشكلته."""
 
+# Payment channels given to customers with an outstanding balance
+PAYMENT_CHANNELS = "التطبيق المحمول لـ SRM، وكالات الأداء (وفا كاش، كاش بلس)، البنك"
+
+# Question used to generate a zone's broadcast answer (payments are up to date for its audience)
+BROADCAST_QUESTION = "لماذا انقطعت الخدمة في منطقتي؟ دفعاتي محدثة."
+
+# Instructions for folding older turns into the rolling summary
+SUMMARY_PROMPT = """لخص المحادثة التالية بين العميل ومساعد خدمة العملاء لشركة SRM.
+احتفظ بأرقام CIL وأسماء العملاء وحالة الدفع والمبالغ والمناطق وأي طلب لم يتم حله بعد.
+ادمج الملخص السابق (إن وجد) مع الرسائل الجديدة في ملخص واحد لا يتجاوز 150 كلمة.
+اكتب الملخص باللغة العربية فقط."""
+
+# Asks the router model whether a turn without a CIL needs the main model
+ROUTER_PROMPT = """صنف رسالة العميل التالية الموجهة لخدمة عملاء SRM (الماء والكهرباء).
+أجب بالرقم 1 إذا كانت تتطلب شرحاً مفصلاً أو شكوى معقدة، وبالرقم 0 إذا كانت بسيطة (تحية، سؤال عام قصير، طلب مساعدة).
+أجب برقم واحد فقط."""
+
+# Degraded mode (model unavailable): tool answers rendered without the model
+DEGRADED_HEADER = "⚠️ المساعد الذكي غير متاح مؤقتاً. هذه معلومات حسابك مباشرة من النظام:\n"
+DEGRADED_NO_CIL = ("⚠️ المساعد الذكي غير متاح مؤقتاً. الرجاء تزويدي برقم CIL الخاص بك "
+                   "(مثال: 1071324-101) لعرض حالة الدفع والصيانة مباشرة، أو المحاولة بعد قليل.")
+
+# Canned answers for turns that need no model (see services/turn_router.py)
+TEMPLATE_ANSWERS = {
+    'greeting': "مرحباً بك في خدمة عملاء SRM! كيف يمكنني مساعدتك اليوم؟ "
+                "إذا كان استفسارك عن الدفع أو انقطاع الخدمة، الرجاء تزويدي برقم CIL الخاص بك (مثال: 1071324-101).",
+    'thanks': "على الرحب والسعة! هل هناك شيء آخر يمكنني مساعدتك به؟",
+    'goodbye': "شكراً لتواصلك مع SRM. نتمنى لك يوماً سعيداً!",
+    'ask_cil': "لمساعدتك في معرفة سبب المشكلة، الرجاء تزويدي برقم CIL الخاص بك "
+               "(رقم العميل بصيغة: 1071324-101). تجده في أعلى فاتورة الماء أو الكهرباء."
+}
+
 
 def initialize_agent() -> Optional[AzureChatOpenAI]:
     """
     Initialize the LangChain LLM with Azure OpenAI and bind tools.
     
+    The model talks to Azure through the process-wide pooled HTTP client.
+    Prefer get_agent_executor(), which builds the agent once per process.
+    
     Returns:
         AzureChatOpenAI: Configured LLM with tools or None if initialization fails
     """
     try:
         # Initialize Azure OpenAI
-        llm = AzureChatOpenAI(
-            azure_endpoint=settings.AZURE_OPENAI_ENDPOINT,
-            api_key=settings.AZURE_OPENAI_API_KEY,
-            api_version=settings.AZURE_OPENAI_API_VERSION,
-            deployment_name=settings.AZURE_OPENAI_DEPLOYMENT_NAME,
-            temperature=0.7,
-            max_tokens=1000
-        )
+        llm = _create_llm(settings.AZURE_OPENAI_DEPLOYMENT_NAME)
         
         # Bind tools to the LLM
         llm_with_tools = llm.bind_tools(tools)
@@ -180,79 +388,961 @@ def initialize_agent() -> Optional[AzureChatOpenAI]:
         return None
 
 
+def _create_llm(deployment_name: str, temperature: float = 0.7, max_tokens: int = 1000) -> AzureChatOpenAI:
+    """Azure OpenAI chat model for a deployment, on the shared HTTP client."""
+    return AzureChatOpenAI(
+        azure_endpoint=settings.AZURE_OPENAI_ENDPOINT,
+        api_key=settings.AZURE_OPENAI_API_KEY,
+        api_version=settings.AZURE_OPENAI_API_VERSION,
+        deployment_name=deployment_name,
+        temperature=temperature,
+        max_tokens=max_tokens,
+        stream_usage=True,
+        # Retries are handled by llm_guard
+        max_retries=0,
+        http_client=get_http_client(),
+        http_async_client=get_async_http_client()
+    )
+
+
+# Process-wide agent; rebuilt in forked workers
+_agent = None
+_agent_pid: Optional[int] = None
+_agent_lock = threading.Lock()
+
+# Process-wide routing models ('small', 'router'), by name
+_route_models: Dict[str, AzureChatOpenAI] = {}
+_route_models_pid: Optional[int] = None
+
+
+def _reset_agent_lock_after_fork() -> None:
+    """A lock held by another thread at fork time would never be released in the child."""
+    global _agent_lock
+    _agent_lock = threading.Lock()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_agent_lock_after_fork)
+
+
 def get_agent_executor() -> Optional[AzureChatOpenAI]:
     """
     Get or create the agent (singleton pattern).
     
+    Thread-safe, and fork-safe: a forked worker builds its own agent on
+    first use. A failed initialization is retried on the next call.
+    
     Returns:
         AzureChatOpenAI: The initialized LLM with tools
     """
-    return initialize_agent()
+    global _agent, _agent_pid
+    pid = os.getpid()
+    if _agent is not None and _agent_pid == pid:
+        return _agent
+    
+    with _agent_lock:
+        if _agent is None or _agent_pid != pid:
+            agent = initialize_agent()
+            if agent is None:
+                return None
+            _agent, _agent_pid = agent, pid
+        return _agent
 
 
-def run_agent(agent: AzureChatOpenAI, user_input: str, chat_history: list = None) -> str:
+def get_route_model(name: str) -> Optional[AzureChatOpenAI]:
+    """
+    Get or create a routing model (singleton per process, like the agent).
+    
+    Args:
+        name: 'small' (answers simple turns, no tools) or 'router' (classifies turns)
+        
+    Returns:
+        AzureChatOpenAI: The model, or None if its deployment is not configured
+            or initialization fails
+    """
+    global _route_models_pid
+    deployment = {
+        'small': settings.AZURE_OPENAI_SMALL_DEPLOYMENT_NAME,
+        'router': settings.AZURE_OPENAI_ROUTER_DEPLOYMENT_NAME
+    }[name]
+    if not deployment:
+        return None
+    
+    pid = os.getpid()
+    if _route_models_pid == pid and name in _route_models:
+        return _route_models[name]
+    
+    with _agent_lock:
+        if _route_models_pid != pid:
+            _route_models.clear()
+            _route_models_pid = pid
+        if name not in _route_models:
+            try:
+                if name == 'router':
+                    _route_models[name] = _create_llm(deployment, temperature=0, max_tokens=1)
+                else:
+                    _route_models[name] = _create_llm(deployment)
+            except Exception as e:
+                print(f"Error initializing {name} model: {str(e)}")
+                return None
+        return _route_models[name]
+
+
+def _route_turn(user_input: str, chat_history: list, stats: dict):
+    """
+    Pick the route of a turn: rules first, then the router model (if configured)
+    for turns the rules would send to the small model.
+    
+    A generator for `yield from` in _agent_turn: the router call is requested
+    from the turn's driver.
+    
+    Returns:
+        tuple: (route, template name or None)
+    """
+    route, template = classify_turn(user_input, chat_history)
+    if route != ROUTE_SMALL:
+        return route, template
+    
+    router = get_route_model('router')
+    if router is None:
+        return route, template
+    
+    try:
+        response = yield '_call', _guarded_call(
+            router, [SystemMessage(content=ROUTER_PROMPT), HumanMessage(content=user_input)]
+        )
+        _count_call(response, stats, auxiliary=True)
+        if (response.content or '').strip().startswith('1'):
+            return ROUTE_LARGE, None
+    except Exception as e:
+        print(f"Error classifying turn: {str(e)}")
+    return route, template
+
+
+def _history_to_messages(chat_history: list) -> list:
+    """
+    Convert stored chat messages into LangChain messages.
+    
+    Tool calls and tool results from earlier turns are replayed so the model
+    can reuse their output instead of calling the tools again. An assistant
+    tool-call message is only replayed together with all of its results,
+    since the API rejects unanswered tool calls.
+    
+    Args:
+        chat_history: Message dicts (or Message records) with role and content
+        
+    Returns:
+        list: HumanMessage, AIMessage and ToolMessage objects
+    """
+    answered = {msg.get("tool_call_id") for msg in chat_history if msg["role"] == "tool"}
+    replayed = set()
+    messages = []
+    
+    for msg in chat_history:
+        if msg["role"] == "user":
+            messages.append(HumanMessage(content=msg["content"]))
+        elif msg["role"] == "assistant":
+            tool_calls = msg.get("tool_calls")
+            if not tool_calls:
+                messages.append(AIMessage(content=msg["content"]))
+            elif all(call["id"] in answered for call in tool_calls):
+                messages.append(AIMessage(content=msg["content"], tool_calls=tool_calls))
+                replayed.update(call["id"] for call in tool_calls)
+        elif msg["role"] == "tool" and msg.get("tool_call_id") in replayed:
+            messages.append(ToolMessage(content=msg["content"], tool_call_id=msg["tool_call_id"]))
+    
+    return messages
+
+
+# Prompt prefix built once, each conversation's converted messages kept between turns
+prompt_assembler = PromptAssembler(
+    SYSTEM_PROMPT,
+    _history_to_messages,
+    max_conversations=settings.PROMPT_MAX_CONVERSATIONS
+)
+
+
+def run_agent(agent: AzureChatOpenAI, user_input: str, chat_history: list = None,
+              turn_messages: Optional[list] = None, turn_stats: Optional[dict] = None,
+              conversation_id: Optional[str] = None) -> str:
     """
     Run the agent with user input.
     
+    The model may request tools over several rounds until it answers, within
+    a per-turn budget of LLM calls (AGENT_MAX_LLM_CALLS), tokens
+    (AGENT_MAX_TOKENS) and wall-clock time (AGENT_MAX_SECONDS). When the
+    budget runs out, or the model only repeats tool calls it already made this
+    turn, one last call is made with tools disabled to get the answer.
+    
+    When the message contains a CIL (and CIL_FAST_PATH is enabled), both
+    tools run before the model is called and their results are injected as
+    if the model had requested them, so the common case needs one LLM call
+    instead of two.
+    
+    With MODEL_ROUTING (off by default), greetings and thanks get canned
+    answers, questions about the customer's own account without a CIL are
+    asked for it, other turns without a CIL (general questions) go to the
+    small deployment (when configured), and turns with a CIL keep the main
+    model.
+    
+    Model calls go through llm_guard (deadline, retries, circuit breaker).
+    When the model stays unavailable, the turn is answered in degraded mode
+    from the tool implementations with templated text.
+    
+    With a conversation_id, only the last HISTORY_KEEP_TURNS turns are
+    replayed verbatim; older turns are folded into a rolling summary (see
+    HistoryManager) while their tool results are kept.
+    
     Args:
         agent: The LLM with bound tools
         user_input: User's message
         chat_history: Previous chat messages
+        turn_messages: Optional list that receives this turn's tool-call and
+            tool-result messages as dicts, in order, so the caller can store them
+        turn_stats: Optional dict that receives llm_calls (router and summary
+            calls included, also counted in aux_llm_calls), tool_calls, tokens,
+            seconds, stop_reason, route, prompt tokens before/after windowing
+            tool_result_tokens (tokens of the tool results sent to the model),
+            prompt_tokens and cached_prompt_tokens as billed, and assembly_seconds
+        conversation_id: Conversation the history belongs to; enables the
+            history summary
         
     Returns:
         str: Agent's response
     """
+    answer = ''
+    turn = _agent_turn(agent, user_input, chat_history, turn_messages, turn_stats, conversation_id, stream=False)
+    for event, data in _drive(turn, stream=False):
+        if event == 'answer':
+            answer = data
+    return answer
+
+
+def stream_agent(agent: AzureChatOpenAI, user_input: str, chat_history: list = None,
+                 turn_messages: Optional[list] = None, turn_stats: Optional[dict] = None,
+                 conversation_id: Optional[str] = None):
+    """
+    Run the agent like run_agent, streaming the answer as the model writes it.
+    
+    Yields (event, data) tuples:
+        ('tools', [{'name', 'args'}, ...]) before each round of tool calls
+        ('token', str) the next piece of the answer
+        ('reset', None) the tokens streamed so far are void: the model failed
+            mid-answer and a replacement answer follows as new tokens
+        ('answer', str) the complete answer (always the last event)
+    
+    Closing the generator early (client gone) closes the model's HTTP
+    stream, which stops the upstream generation.
+    
+    Args:
+        agent: The LLM with bound tools
+        user_input: User's message
+        chat_history: Previous chat messages
+        turn_messages: See run_agent
+        turn_stats: See run_agent
+        conversation_id: See run_agent
+    """
+    turn = _agent_turn(agent, user_input, chat_history, turn_messages, turn_stats, conversation_id, stream=True)
+    return _drive(turn, stream=True)
+
+
+async def arun_agent(agent: AzureChatOpenAI, user_input: str, chat_history: list = None,
+                     turn_messages: Optional[list] = None, turn_stats: Optional[dict] = None,
+                     conversation_id: Optional[str] = None) -> str:
+    """
+    Async run_agent: model calls use ainvoke and tools run as tasks, so a
+    turn waiting on Azure OpenAI holds no thread.
+    
+    Args and Returns: see run_agent
+    """
+    answer = ''
+    turn = _agent_turn(agent, user_input, chat_history, turn_messages, turn_stats, conversation_id, stream=False)
+    async for event, data in _adrive(turn, stream=False):
+        if event == 'answer':
+            answer = data
+    return answer
+
+
+def astream_agent(agent: AzureChatOpenAI, user_input: str, chat_history: list = None,
+                  turn_messages: Optional[list] = None, turn_stats: Optional[dict] = None,
+                  conversation_id: Optional[str] = None):
+    """
+    Async stream_agent: an async generator of the same (event, data) tuples.
+    
+    Cancelling the consuming task closes the model's HTTP stream.
+    
+    Args: see stream_agent
+    """
+    turn = _agent_turn(agent, user_input, chat_history, turn_messages, turn_stats, conversation_id, stream=True)
+    return _adrive(turn, stream=True)
+
+
+def _drive(turn, stream: bool):
+    """
+    Run a turn generator, making its model and tool calls synchronously.
+    
+    The turn yields ('_model', args), ('_tools', calls) and ('_call',
+    (call, acall)) requests and gets the response (or the call's exception)
+    back; other events pass through. A '_call' is any other blocking call,
+    with acall its async variant (router, summary, broadcast answer).
+    """
+    reply = error = None
+    try:
+        while True:
+            request = _step(turn, reply, error)
+            if request is None:
+                return
+            event, data = request
+            reply = error = None
+            if event == '_model':
+                try:
+                    reply = yield from (_stream_invoke if stream else _invoke_events)(*data)
+                except Exception as e:
+                    error = e
+            elif event == '_tools':
+                try:
+                    reply = tool_dispatcher.run(data)
+                except Exception as e:
+                    error = e
+            elif event == '_call':
+                try:
+                    reply = data[0]()
+                except Exception as e:
+                    error = e
+            else:
+                yield event, data
+    finally:
+        turn.close()
+
+
+async def _adrive(turn, stream: bool):
+    """
+    Run a turn generator on the event loop, awaiting its model and tool calls.
+    
+    The turn's own steps (routing rules, history window, database lookups)
+    run in a worker thread, and every model call it requests (answer,
+    router, summary, broadcast) is awaited on the loop through its async
+    variant, so nothing blocking ever runs on the loop and no thread waits
+    on Azure OpenAI.
+    """
+    reply = error = None
+    step = None
+    try:
+        while True:
+            step = asyncio.ensure_future(asyncio.to_thread(_step, turn, reply, error))
+            # Shielded: on cancellation the step keeps running until its thread is done
+            request = await asyncio.shield(step)
+            if request is None:
+                return
+            event, data = request
+            reply = error = None
+            if event == '_model':
+                try:
+                    if stream:
+                        model_stream = _astream_invoke(*data)
+                        try:
+                            async for item in model_stream:
+                                if item[0] == '_response':
+                                    reply = item[1]
+                                else:
+                                    yield item
+                        finally:
+                            await model_stream.aclose()
+                    else:
+                        agent, messages, stats, _ = data
+                        reply = await _ainvoke(agent, messages, stats)
+                except Exception as e:
+                    error = e
+            elif event == '_tools':
+                try:
+                    reply = await tool_dispatcher.arun(data)
+                except Exception as e:
+                    error = e
+            elif event == '_call':
+                try:
+                    reply = await data[1]()
+                except Exception as e:
+                    error = e
+            else:
+                yield event, data
+    finally:
+        if step is not None and not step.done():
+            # Cancelled mid-step: close once the worker thread is done with the generator
+            step.add_done_callback(lambda _: turn.close())
+        else:
+            turn.close()
+
+
+def _step(turn, reply, error):
+    """Resume a turn with a reply (or exception); None once the turn is finished."""
+    try:
+        if error is not None:
+            return turn.throw(error)
+        return turn.send(reply)
+    except StopIteration:
+        return None
+
+
+def _agent_turn(agent, user_input: str, chat_history: Optional[list], turn_messages: Optional[list],
+                turn_stats: Optional[dict], conversation_id: Optional[str], stream: bool):
+    """
+    One agent turn as a generator of (event, data); see run_agent and stream_agent.
+    
+    Model and tool calls are yielded as requests and performed by _drive or
+    _adrive, so the same turn logic serves the sync and the async API.
+    """
+    stats = {'llm_calls': 0, 'aux_llm_calls': 0, 'tool_calls': 0, 'tokens': 0, 'seconds': 0.0, 'stop_reason': 'answer',
+             'route': ROUTE_LARGE, 'tool_result_tokens': 0, 'prompt_tokens': 0, 'cached_prompt_tokens': 0,
+             'assembly_seconds': 0.0}
+    started = time.monotonic()
+    if stream:
+        stats['first_token_seconds'] = None
+    
     try:
         if chat_history is None:
             chat_history = []
         
-        # Build messages list
-        messages = [SystemMessage(content=SYSTEM_PROMPT)]
+        # Simple turns: canned answer or the small deployment
+        if settings.MODEL_ROUTING:
+            stats['route'], template = yield from _route_turn(user_input, chat_history, stats)
+            if stats['route'] == ROUTE_TEMPLATE:
+                stats['stop_reason'] = 'template'
+                answer = TEMPLATE_ANSWERS[template]
+                if stream:
+                    _mark_first_token(stats, started)
+                    yield 'token', answer
+                yield 'answer', answer
+                return
+            if stats['route'] == ROUTE_SMALL:
+                small = get_route_model('small')
+                if small is not None:
+                    agent = small
+                else:
+                    stats['route'] = ROUTE_LARGE
         
-        # Add chat history
-        for msg in chat_history:
-            if msg["role"] == "user":
-                messages.append(HumanMessage(content=msg["content"]))
-            elif msg["role"] == "assistant":
-                messages.append(AIMessage(content=msg["content"]))
+        # Recent turns verbatim, older ones as a summary plus their tool results
+        yield from _refresh_summary(agent, conversation_id, chat_history, stats)
+        summary, history, history_tokens = history_manager.window(conversation_id, chat_history)
+        base_tokens = history_manager.message_tokens({'role': 'system', 'content': SYSTEM_PROMPT}) + \
+            history_manager.message_tokens({'role': 'user', 'content': user_input})
+        stats['prompt_tokens_full'] = base_tokens + history_tokens['history_tokens_full']
+        stats['prompt_tokens_sent'] = base_tokens + history_tokens['history_tokens_sent']
+        
+        # System prompt, summary, history (including earlier tool calls and results), user input;
+        # only the messages stored since the conversation's last turn are converted
+        assembly_started = time.perf_counter()
+        messages = prompt_assembler.build(
+            conversation_id, summary, history_tokens['covered'], history, len(chat_history), user_input
+        )
+        stats['assembly_seconds'] = time.perf_counter() - assembly_started
+        
+        # Tool-call and tool-result messages produced during this turn
+        tool_rounds = []
+        # Results of this turn's tool calls, by (name, args)
+        known_results = {}
         
-        # Add current user input
-        messages.append(HumanMessage(content=user_input))
+        cil = detect_cil(user_input)
         
-        # Get response from agent
-        response = agent.invoke(messages)
+        # Fast path: run the CIL tools up front instead of waiting for the model to ask
+        if cil and settings.CIL_FAST_PATH:
+            fast_path = AIMessage(content='', tool_calls=_fast_path_calls(cil))
+            yield 'tools', _tool_progress(fast_path)
+            yield from _run_tool_round(fast_path, messages, tool_rounds, known_results, stats)
         
-        # Check if agent wants to use tools
-        if hasattr(response, 'tool_calls') and response.tool_calls:
-            # Add the AI response with tool calls to messages
-            messages.append(response)
+        # Outage storm: paid-up customers asking why their service is cut in a zone
+        # under maintenance share one answer
+        broadcast = None
+        if cil and settings.BROADCAST_ANSWERS:
+            broadcast = yield from _broadcast_answer(agent, cil, user_input, stats)
+        if broadcast:
+            stats['stop_reason'] = 'broadcast'
+            if turn_messages is not None:
+                turn_messages.extend(tool_rounds)
+            if stream:
+                _mark_first_token(stats, started)
+                yield 'token', broadcast
+            yield 'answer', broadcast
+            return
+        
+        while True:
+            response = yield '_model', (agent, messages, stats, started)
+            
+            # No tool calls: this is the answer
+            if not getattr(response, 'tool_calls', None):
+                break
+            
+            stop_reason = _budget_exceeded(stats, started)
+            if stop_reason is None and all(_call_key(call) in known_results for call in response.tool_calls):
+                stop_reason = 'repeated_calls'
             
-            # Execute tools and create tool messages
-            for tool_call in response.tool_calls:
-                tool_name = tool_call['name']
-                tool_args = tool_call['args']
-                tool_call_id = tool_call['id']
-                
-                # Find and execute the tool
-                tool_result = None
-                for t in tools:
-                    if t.name == tool_name:
-                        tool_result = t.invoke(tool_args)
-                        break
-                
-                # Add tool message with proper tool_call_id
-                if tool_result:
-                    messages.append(ToolMessage(
-                        content=str(tool_result),
-                        tool_call_id=tool_call_id
-                    ))
+            if stop_reason:
+                # Answer with what we have; tools are disabled for this last call
+                stats['stop_reason'] = stop_reason
+                response = yield '_model', (_without_tools(agent), messages, stats, started)
+                break
             
-            # Get final response after tool execution
-            final_response = agent.invoke(messages)
-            return final_response.content
+            yield 'tools', _tool_progress(response)
+            yield from _run_tool_round(response, messages, tool_rounds, known_results, stats)
+        
+        if turn_messages is not None:
+            turn_messages.extend(tool_rounds)
+        
+        answer = response.content
+        if not answer:
+            answer = "عذراً، لم أتمكن من إكمال طلبك. الرجاء إعادة صياغة السؤال."
+            if stream:
+                _mark_first_token(stats, started)
+                yield 'token', answer
+        yield 'answer', answer
         
-        return response.content
+    except GeneratorExit:
+        stats['stop_reason'] = 'cancelled'
+        raise
+        
+    except LLMUnavailableError as e:
+        # Azure OpenAI is down or throttling: answer from the tools directly
+        stats['stop_reason'] = 'degraded'
+        print(f"Error calling Azure OpenAI, answering in degraded mode: {str(e)}")
+        answer = _degraded_answer(user_input, chat_history or [])
+        if stream:
+            yield from _restart_stream(stats, started)
+            yield 'token', answer
+        yield 'answer', answer
         
     except Exception as e:
+        stats['stop_reason'] = 'error'
         print(f"Error running agent: {str(e)}")
-        return f"عذراً، حدث خطأ: {str(e)}"
+        answer = f"عذراً، حدث خطأ: {str(e)}"
+        if stream:
+            yield from _restart_stream(stats, started)
+            yield 'token', answer
+        yield 'answer', answer
+    
+    finally:
+        stats['seconds'] = time.monotonic() - started
+        agent_metrics.record_turn(stats)
+        broadcast_cache.record_turn(stats['stop_reason'] == 'broadcast')
+        if turn_stats is not None:
+            turn_stats.update(stats)
+
+
+def _restart_stream(stats: dict, started: float):
+    """
+    Before streaming a replacement answer: if the model's answer was already
+    partly streamed (it failed mid-stream), tell the client to drop it.
+    """
+    if stats['first_token_seconds'] is not None:
+        yield 'reset', None
+    _mark_first_token(stats, started)
+
+
+def _degraded_answer(user_input: str, chat_history: list) -> str:
+    """
+    Templated answer used while the model is unavailable.
+    
+    Uses the CIL of the message, or else the latest CIL the customer gave in
+    the conversation, and renders the payment and maintenance tool answers.
+    
+    Args:
+        user_input: User's message
+        chat_history: Previous stored messages
+        
+    Returns:
+        str: Arabic answer built without the model
+    """
+    cil = detect_cil(user_input)
+    for message in reversed(chat_history):
+        if cil:
+            break
+        if message["role"] == "user":
+            cil = detect_cil(message["content"])
+    
+    if not cil:
+        return DEGRADED_NO_CIL
+    
+    # Shown to the customer as is, so always the verbose text
+    answer = DEGRADED_HEADER + _check_payment_impl(cil, compact=False)
+    if get_user_by_cil(cil):
+        answer += _check_maintenance_impl(cil, compact=False)
+    return answer
+
+
+def _refresh_summary(agent, conversation_id: Optional[str], chat_history: list, stats: dict):
+    """
+    Fold older user/assistant messages into the conversation summary when
+    HistoryManager says a refresh is due (a generator requesting the model
+    call from the turn's driver). A failed refresh keeps them verbatim.
+    
+    Args:
+        agent: The LLM (tools are disabled for this call)
+        conversation_id: Conversation the history belongs to
+        chat_history: Stored messages, oldest first
+        stats: Turn stats (the summary call and its tokens are counted)
+    """
+    due = history_manager.pending_summary(conversation_id, chat_history)
+    if due is None:
+        return
+    previous, old_messages = due
+    
+    transcript = "\n".join(
+        f"{'العميل' if message['role'] == 'user' else 'المساعد'}: {message['content']}"
+        for message in old_messages
+    )
+    if previous:
+        transcript = f"الملخص السابق:\n{previous}\n\nالرسائل الجديدة:\n{transcript}"
+    
+    prompt = [SystemMessage(content=SUMMARY_PROMPT), HumanMessage(content=transcript)]
+    try:
+        response = yield '_call', _guarded_call(_without_tools(agent), prompt)
+        _count_call(response, stats, auxiliary=True)
+        summary = response.content or None
+    except Exception as e:
+        print(f"Error summarizing history: {str(e)}")
+        summary = None
+    history_manager.update_summary(conversation_id, chat_history, summary)
+
+
+def _mark_first_token(stats: dict, started: float) -> None:
+    """Record the time to the first streamed token of the turn."""
+    if stats.get('first_token_seconds', 0) is None:
+        stats['first_token_seconds'] = time.monotonic() - started
+
+
+def _tool_progress(response: AIMessage) -> List[Dict[str, Any]]:
+    """Tool names and arguments of a round, for progress events."""
+    return [{'name': call['name'], 'args': call['args']} for call in response.tool_calls]
+
+
+def _broadcast_answer(agent, cil: str, user_input: str, stats: dict):
+    """
+    Get the zone-wide answer for a paid-up customer asking why their service
+    is cut while their zone is under maintenance.
+    
+    The answer is generated by the model once per zone status version
+    (status_updated) from the zone's maintenance details, with no customer
+    data in the prompt, and then served to every such customer of the zone.
+    It only answers that one question: other messages (e.g. a balance
+    question), customers whose service is not among the zone's affected
+    services and unpaid customers go to the model.
+    
+    A generator for `yield from` in _agent_turn: generating the answer is
+    requested from the turn's driver.
+    
+    Args:
+        agent: The LLM with bound tools
+        cil: Customer Identification Number found in the message
+        user_input: User's message
+        stats: Turn stats (the generating turn accounts for the LLM call)
+        
+    Returns:
+        str: Broadcast answer or None if the turn is not about a zone outage
+    """
+    if not asks_about_outage(user_input):
+        return None
+    
+    user = get_user_by_cil(cil)
+    if not user or user['payment_status'] != 'مدفوع':
+        return None
+    
+    zone = get_zone_by_id(user['zone_id'])
+    if not zone or zone['maintenance_status'] != 'جاري الصيانة':
+        return None
+    if not _services(user['service_type']) & _services(zone['affected_services']):
+        return None
+    
+    zone_id, version = zone['zone_id'], zone['status_updated']
+    answer = broadcast_cache.get(zone_id, version)
+    if answer is not None:
+        return answer
+    
+    call = {'id': f'broadcast_{zone_id}', 'name': check_maintenance.name, 'args': {'cil': cil}}
+    messages = [
+        prompt_assembler.system_message,
+        HumanMessage(content=BROADCAST_QUESTION),
+        AIMessage(content='', tool_calls=[call]),
+        ToolMessage(content=_check_maintenance_impl(cil), tool_call_id=call['id'])
+    ]
+    model = _without_tools(agent)
+    
+    async def agenerate() -> Optional[str]:
+        return (await _ainvoke(model, messages, stats)).content
+    
+    return (yield '_call', (
+        lambda: broadcast_cache.get_or_create(zone_id, version, lambda: _invoke(model, messages, stats).content),
+        lambda: broadcast_cache.aget_or_create(zone_id, version, agenerate)
+    ))
+
+
+def _services(text: Optional[str]) -> set:
+    """Services named in a service_type / affected_services value ('ماء وكهرباء' -> both)."""
+    return {service for service in ('ماء', 'كهرباء') if service in (text or '')}
+
+
+def _invoke(agent, messages: list, stats: dict) -> AIMessage:
+    """
+    Call the model once and account for the call and its tokens.
+    
+    Identical prompts sent concurrently (e.g. the same greeting opening many
+    new conversations) share one request; only the caller that made it
+    counts the call and its tokens.
+    """
+    response, shared = llm_flights.do(
+        (id(agent), _prompt_key(messages)),
+        lambda: llm_guard.call(lambda: agent.invoke(messages))
+    )
+    if not shared:
+        _count_call(response, stats)
+    return response
+
+
+async def _ainvoke(agent, messages: list, stats: dict) -> AIMessage:
+    """Async _invoke (ainvoke, coalesced and guarded the same way)."""
+    response, shared = await llm_flights.ado(
+        (id(agent), _prompt_key(messages)),
+        lambda: llm_guard.acall(lambda: agent.ainvoke(messages))
+    )
+    if not shared:
+        _count_call(response, stats)
+    return response
+
+
+def _count_call(response: AIMessage, stats: dict, auxiliary: bool = False) -> None:
+    """
+    Account for one model call and its tokens.
+    
+    Auxiliary calls (router, history summary) are also counted in
+    aux_llm_calls, so they do not use up the turn's tool rounds.
+    """
+    stats['llm_calls'] += 1
+    if auxiliary:
+        stats['aux_llm_calls'] += 1
+    usage = getattr(response, 'usage_metadata', None) or {}
+    if not usage:
+        usage = (getattr(response, 'response_metadata', None) or {}).get('token_usage') or {}
+    _count_usage(usage, stats)
+
+
+def _count_usage(usage: dict, stats: dict) -> None:
+    """
+    Add a response's token usage to the turn stats.
+    
+    Accepts LangChain usage_metadata or the raw token_usage of the API;
+    cached prompt tokens are those Azure served from its prompt cache.
+    """
+    details = usage.get('input_token_details') or usage.get('prompt_tokens_details') or {}
+    stats['tokens'] += usage.get('total_tokens', 0) or 0
+    stats['prompt_tokens'] += usage.get('input_tokens', usage.get('prompt_tokens', 0)) or 0
+    stats['cached_prompt_tokens'] += details.get('cache_read', details.get('cached_tokens', 0)) or 0
+
+
+def _guarded_call(model, messages: list) -> tuple:
+    """
+    A '_call' request for one model call outside the answer loop (router,
+    summary): the call through llm_guard, blocking and async.
+    """
+    return (
+        lambda: llm_guard.call(lambda: model.invoke(messages)),
+        lambda: llm_guard.acall(lambda: model.ainvoke(messages))
+    )
+
+
+def _invoke_events(agent, messages: list, stats: dict, started: float):
+    """_invoke as a generator with no events, so both model-call modes share the turn loop."""
+    return _invoke(agent, messages, stats)
+    yield
+
+
+def _stream_invoke(agent, messages: list, stats: dict, started: float):
+    """
+    Call the model with streaming, yielding ('token', text) as content arrives.
+    
+    Text is only forwarded while the response has no tool call chunks, so a
+    tool-calling response never leaks into the answer stream.
+    
+    Returns:
+        AIMessageChunk: The aggregated response (with parsed tool_calls)
+    """
+    stats['llm_calls'] += 1
+    aggregate = None
+    
+    def open_stream():
+        # The request is sent on the first read, so retries cover it up to the first chunk
+        stream = agent.stream(messages)
+        return stream, next(stream, None)
+    
+    def close_stream(opened):
+        # A stream opened after its attempt timed out would keep generating upstream
+        close = getattr(opened[0], 'close', None)
+        if close:
+            close()
+    
+    chunks, first = llm_guard.call(open_stream, hedge=False, discard=close_stream)
+    
+    try:
+        for chunk in itertools.chain([first] if first is not None else [], chunks):
+            aggregate = chunk if aggregate is None else aggregate + chunk
+            if chunk.content and not aggregate.tool_call_chunks:
+                _mark_first_token(stats, started)
+                yield 'token', chunk.content
+    except Exception as e:
+        if not is_retryable(e):
+            raise
+        # Dropped mid-stream: too late to retry, but it counts against the service
+        llm_guard.breaker.record_failure()
+        raise LLMUnavailableError(f"Azure OpenAI stream failed: {str(e)}") from e
+    finally:
+        # Closing the stream drops the HTTP response, which cancels generation upstream
+        close = getattr(chunks, 'close', None)
+        if close:
+            close()
+    
+    if aggregate is None:
+        return AIMessage(content='')
+    
+    _count_usage(getattr(aggregate, 'usage_metadata', None) or {}, stats)
+    return aggregate
+
+
+async def _astream_invoke(agent, messages: list, stats: dict, started: float):
+    """
+    Async _stream_invoke: yields ('token', text) items, then ('_response', message).
+    """
+    stats['llm_calls'] += 1
+    aggregate = None
+    
+    async def open_stream():
+        stream = agent.astream(messages)
+        return stream, await anext(stream, None)
+    
+    chunks, first = await llm_guard.acall(open_stream, hedge=False)
+    
+    try:
+        if first is not None:
+            aggregate = first
+            if first.content and not first.tool_call_chunks:
+                _mark_first_token(stats, started)
+                yield 'token', first.content
+        async for chunk in chunks:
+            aggregate = chunk if aggregate is None else aggregate + chunk
+            if chunk.content and not aggregate.tool_call_chunks:
+                _mark_first_token(stats, started)
+                yield 'token', chunk.content
+    except Exception as e:
+        if not is_retryable(e):
+            raise
+        llm_guard.breaker.record_failure()
+        raise LLMUnavailableError(f"Azure OpenAI stream failed: {str(e)}") from e
+    finally:
+        # Closing the stream drops the HTTP response, which cancels generation upstream
+        aclose = getattr(chunks, 'aclose', None)
+        if aclose:
+            await aclose()
+    
+    if aggregate is None:
+        yield '_response', AIMessage(content='')
+        return
+    
+    _count_usage(getattr(aggregate, 'usage_metadata', None) or {}, stats)
+    yield '_response', aggregate
+
+
+def _prompt_key(messages: list) -> str:
+    """
+    Digest of a prompt's content.
+    
+    Tool call ids are left out: they only pair calls with results, and the
+    fast path generates fresh ones for otherwise identical prompts.
+    """
+    digest = hashlib.sha256()
+    for message in messages:
+        digest.update(json.dumps([
+            message.type,
+            message.content,
+            [[call['name'], call['args']] for call in getattr(message, 'tool_calls', None) or []]
+        ], sort_keys=True, ensure_ascii=False).encode('utf-8'))
+    return digest.hexdigest()
+
+
+def _budget_exceeded(stats: dict, started: float) -> Optional[str]:
+    """
+    Check the per-turn budget before running another tool round.
+    
+    One LLM call is always kept in reserve for the final answer; router and
+    summary calls do not count against the call limit.
+    
+    Returns:
+        str: Stop reason, or None if another round fits
+    """
+    if stats['llm_calls'] - stats['aux_llm_calls'] >= settings.AGENT_MAX_LLM_CALLS - 1:
+        return 'max_llm_calls'
+    if stats['tokens'] >= settings.AGENT_MAX_TOKENS:
+        return 'max_tokens'
+    if time.monotonic() - started >= settings.AGENT_MAX_SECONDS:
+        return 'max_seconds'
+    return None
+
+
+def _without_tools(agent):
+    """The same model with tool calls disabled, so it must answer in text."""
+    if hasattr(agent, 'bind'):
+        return agent.bind(tool_choice='none')
+    return agent
+
+
+def _call_key(tool_call: Dict[str, Any]) -> tuple:
+    """Identity of a tool call, ignoring its id."""
+    return tool_call['name'], json.dumps(tool_call['args'], sort_keys=True, ensure_ascii=False)
+
+
+def _run_tool_round(response: AIMessage, messages: list, tool_rounds: list,
+                    known_results: dict, stats: dict):
+    """
+    Execute the tool calls of one AI message (a generator requesting the
+    calls from the turn's driver with ('_tools', calls)).
+    
+    Appends the AI message and its ToolMessages to the prompt messages, and
+    their dict form to tool_rounds for storage in the conversation. Calls
+    already made this turn reuse their earlier result instead of running again.
+    
+    Args:
+        response: AI message with tool_calls
+        messages: Prompt messages for the next model call
+        tool_rounds: Stored-message dicts for this turn
+        known_results: Results of this turn's calls by _call_key (updated)
+        stats: Turn stats (tool_calls and tool_result_tokens are updated)
+    """
+    # Add the AI response with tool calls to messages
+    messages.append(response)
+    tool_rounds.append({
+        'role': 'assistant',
+        'content': response.content or '',
+        'tool_calls': [
+            {'id': call['id'], 'name': call['name'], 'args': call['args']}
+            for call in response.tool_calls
+        ]
+    })
+    
+    # Execute new tools concurrently; results come back in call order
+    pending = {}
+    for call in response.tool_calls:
+        key = _call_key(call)
+        if key not in known_results and key not in pending:
+            pending[key] = call
+    results = (yield '_tools', list(pending.values())) if pending else []
+    for key, result in zip(pending, results):
+        known_results[key] = result
+    stats['tool_calls'] += len(pending)
+    
+    # Add tool messages with proper tool_call_id
+    for tool_call in response.tool_calls:
+        tool_result = known_results[_call_key(tool_call)]
+        stats['tool_result_tokens'] += history_manager.tokens.count(tool_result)
+        messages.append(ToolMessage(
+            content=tool_result,
+            tool_call_id=tool_call['id']
+        ))
+        tool_rounds.append({
+            'role': 'tool',
+            'content': tool_result,
+            'tool_call_id': tool_call['id']
+        })
@@ -0,0 +1,107 @@
+"""
+Per-zone broadcast answers for outage storms.
+During a maintenance outage every paid-up customer of the zone gets the same
+explanation, so it is generated once per zone status version and reused.
+"""
+import threading
+from typing import Optional, Dict, Any, Awaitable, Callable, List, Tuple
+from services.single_flight import SingleFlight
+
+
+class BroadcastAnswerCache:
+    """
+    Answers keyed by (zone_id, status version).
+
+    The version is the zone's status_updated value, so a new status makes
+    the old answer unreachable; zone change notifications also drop it right
+    away. Concurrent misses for the same zone generate the answer once.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._answers: Dict[Any, Tuple[Any, str]] = {}
+        self._flights = SingleFlight()
+        self._generated = 0
+        self._turns = 0
+        self._served = 0
+
+    def get(self, zone_id: Any, version: Any) -> Optional[str]:
+        """The zone's answer for this status version, or None if not generated yet."""
+        with self._lock:
+            entry = self._answers.get(zone_id)
+            return entry[1] if entry is not None and entry[0] == version else None
+
+    def get_or_create(self, zone_id: Any, version: Any, generate: Callable[[], Optional[str]]) -> Optional[str]:
+        """
+        Get the zone's answer for this status version, generating it if needed.
+
+        Args:
+            zone_id: Zone identifier
+            version: Zone status version (status_updated)
+            generate: Produces the answer; None or empty means no answer
+
+        Returns:
+            str: Broadcast answer or None if none could be generated
+        """
+        answer = self.get(zone_id, version)
+        if answer is not None:
+            return answer
+        answer, _ = self._flights.do((zone_id, version), lambda: self._store(zone_id, version, generate()))
+        return answer
+
+    async def aget_or_create(self, zone_id: Any, version: Any,
+                             generate: Callable[[], Awaitable[Optional[str]]]) -> Optional[str]:
+        """Async get_or_create: generate is a coroutine function, awaited once per concurrent miss."""
+        answer = self.get(zone_id, version)
+        if answer is not None:
+            return answer
+
+        async def create() -> Optional[str]:
+            return self._store(zone_id, version, await generate())
+
+        answer, _ = await self._flights.ado((zone_id, version), create)
+        return answer
+
+    def _store(self, zone_id: Any, version: Any, answer: Optional[str]) -> Optional[str]:
+        if answer:
+            with self._lock:
+                self._answers[zone_id] = (version, answer)
+                self._generated += 1
+        return answer or None
+
+    def record_turn(self, served: bool) -> None:
+        """Count one agent turn and whether it was answered from this cache."""
+        with self._lock:
+            self._turns += 1
+            if served:
+                self._served += 1
+
+    def invalidate(self, zone_ids: Optional[List[Any]]) -> None:
+        """Drop the answers of the given zones (all answers if None)."""
+        with self._lock:
+            if zone_ids is None:
+                self._answers.clear()
+                return
+            for zone_id in zone_ids:
+                self._answers.pop(zone_id, None)
+
+    def on_change(self, table_name: str, keys: Optional[List[Any]]) -> None:
+        """Change listener for data.mock_db.register_change_listener."""
+        if table_name == 'zones':
+            self.invalidate(keys)
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Get broadcast metrics.
+
+        Returns:
+            dict: Zones with an answer, answers generated, turns, turns served and served fraction
+        """
+        with self._lock:
+            return {
+                'zones': len(self._answers),
+                'generated': self._generated,
+                'turns': self._turns,
+                'served': self._served,
+                'served_fraction': self._served / self._turns if self._turns else 0.0
+            }
@@ -0,0 +1,274 @@
+"""
+Token-budgeted chat history for the agent prompt.
+Keeps the last turns verbatim and folds older turns into a rolling summary
+per conversation, so prompt size stops growing with conversation length.
+"""
+import logging
+import threading
+from collections import OrderedDict
+from typing import Optional, Dict, Any, List, Tuple
+
+
+logger = logging.getLogger(__name__)
+
+# Per-message overhead of the chat format (role and separators)
+MESSAGE_OVERHEAD_TOKENS = 4
+
+
+class _TokenCounter:
+    """
+    Token counts of message texts, cached by text.
+
+    Uses tiktoken when its encoding can be loaded and a character-based
+    estimate otherwise (e.g. offline hosts without the encoding cached).
+    Loading may download the encoding, so the app loads it at startup
+    (see load); a counter used before that loads it on first use.
+    """
+
+    def __init__(self, max_entries: int = 100_000):
+        self.max_entries = max_entries
+        self._counts: "OrderedDict[str, int]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+        self._encoding = None
+        self._loaded = False
+
+    def load(self) -> bool:
+        """
+        Load the tiktoken encoding once (later calls return immediately).
+
+        Returns:
+            bool: True if tiktoken is used, False if tokens are estimated
+        """
+        with self._load_lock:
+            if not self._loaded:
+                try:
+                    import tiktoken
+                    self._encoding = tiktoken.get_encoding("o200k_base")
+                except Exception as e:
+                    logger.warning("tiktoken encoding unavailable, estimating token counts: %s", e)
+                self._loaded = True
+        return self._encoding is not None
+
+    @property
+    def method(self) -> Optional[str]:
+        """'tiktoken', 'estimate', or None before the encoding is loaded."""
+        if not self._loaded:
+            return None
+        return 'tiktoken' if self._encoding is not None else 'estimate'
+
+    def count(self, text: str) -> int:
+        """Number of tokens in text."""
+        if not text:
+            return 0
+        with self._lock:
+            count = self._counts.get(text)
+            if count is not None:
+                self._counts.move_to_end(text)
+                return count
+
+        count = self._encode(text)
+
+        with self._lock:
+            self._counts[text] = count
+            while len(self._counts) > self.max_entries:
+                self._counts.popitem(last=False)
+        return count
+
+    def _encode(self, text: str) -> int:
+        """Count tokens without the cache."""
+        if not self._loaded:
+            self.load()
+
+        if self._encoding is not None:
+            return len(self._encoding.encode(text, disallowed_special=()))
+        # Arabic averages about 2.5 characters per token with o200k
+        return len(text) * 2 // 5 + 1
+
+
+class HistoryManager:
+    """
+    Selects what part of a conversation is replayed to the model.
+
+    The last `keep_turns` turns (a turn starts at a user message) are
+    replayed verbatim. Older messages are covered by a per-conversation
+    summary, which is only regenerated once the messages it does not yet
+    cover exceed `summary_trigger_tokens`; until then they are replayed
+    verbatim. Tool results are never summarized: the latest result of each
+    distinct tool call from the summarized part is replayed as is.
+
+    The caller generates the summary, so the model call can be made sync or
+    async: pending_summary says when a refresh is due and what it folds in,
+    update_summary stores the result, then window picks the history.
+    """
+
+    def __init__(self, keep_turns: int = 4, summary_trigger_tokens: int = 1500,
+                 max_conversations: int = 10_000):
+        self.keep_turns = keep_turns
+        self.summary_trigger_tokens = summary_trigger_tokens
+        self.max_conversations = max_conversations
+        self.tokens = _TokenCounter()
+        # conversation_id -> (messages covered, summary text)
+        self._summaries: "OrderedDict[str, Tuple[int, str]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._windows = 0
+        self._summaries_generated = 0
+        self._summary_failures = 0
+
+    def message_tokens(self, message) -> int:
+        """
+        Tokens a stored message takes in the prompt.
+
+        Args:
+            message: Message record or dict with role, content and optional tool_calls
+
+        Returns:
+            int: Token count including the chat format overhead
+        """
+        tokens = MESSAGE_OVERHEAD_TOKENS + self.tokens.count(message["content"])
+        for call in message.get("tool_calls") or ():
+            tokens += self.tokens.count(call["name"]) + self.tokens.count(str(call["args"]))
+        return tokens
+
+    def pending_summary(self, conversation_id: Optional[str], chat_history: list) -> Optional[Tuple[str, list]]:
+        """
+        Summary refresh due before the next window, if any.
+
+        Args:
+            conversation_id: Conversation the history belongs to (or None)
+            chat_history: Stored messages, oldest first
+
+        Returns:
+            tuple: (previous summary or '', user/assistant messages to fold in),
+                or None when the summary is current
+        """
+        if conversation_id is None:
+            return None
+        split = self._recent_start(chat_history)
+        covered, summary = self._summary(conversation_id, split)
+        pending = [message for message in chat_history[covered:split]
+                   if not message.get("tool_calls") and message["role"] != "tool"]
+        if pending and sum(self.message_tokens(message) for message in pending) >= self.summary_trigger_tokens:
+            return summary or '', pending
+        return None
+
+    def update_summary(self, conversation_id: str, chat_history: list, summary: Optional[str]) -> None:
+        """
+        Store the summary generated for pending_summary.
+
+        Args:
+            conversation_id: Conversation the history belongs to
+            chat_history: Stored messages passed to pending_summary
+            summary: New summary, or None if it could not be generated (the
+                messages stay verbatim until the next refresh)
+        """
+        with self._lock:
+            if not summary:
+                self._summary_failures += 1
+                return
+            self._summaries_generated += 1
+            self._summaries[conversation_id] = (self._recent_start(chat_history), summary)
+            self._summaries.move_to_end(conversation_id)
+            while len(self._summaries) > self.max_conversations:
+                self._summaries.popitem(last=False)
+
+    def window(self, conversation_id: Optional[str], chat_history: list) -> Tuple[Optional[str], list, Dict[str, int]]:
+        """
+        Pick the history to replay for the next turn.
+
+        Without a conversation_id there is nowhere to keep a summary, so the
+        whole history is replayed.
+
+        Args:
+            conversation_id: Conversation the history belongs to (or None)
+            chat_history: Stored messages, oldest first
+
+        Returns:
+            tuple: (summary or None, messages to replay, token counts
+                {'history_tokens_full', 'history_tokens_sent'} and 'covered',
+                the number of stored messages the summary covers)
+        """
+        full = sum(self.message_tokens(message) for message in chat_history)
+        if conversation_id is None:
+            return None, list(chat_history), {'history_tokens_full': full, 'history_tokens_sent': full, 'covered': 0}
+
+        covered, summary = self._summary(conversation_id, self._recent_start(chat_history))
+
+        replay = _latest_tool_results(chat_history[:covered]) + list(chat_history[covered:])
+        sent = sum(self.message_tokens(message) for message in replay)
+        if summary:
+            sent += MESSAGE_OVERHEAD_TOKENS + self.tokens.count(summary)
+
+        with self._lock:
+            self._windows += 1
+
+        return summary, replay, {'history_tokens_full': full, 'history_tokens_sent': sent, 'covered': covered}
+
+    def forget(self, conversation_id: str) -> None:
+        """Drop the summary of a conversation."""
+        with self._lock:
+            self._summaries.pop(conversation_id, None)
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Get windowing metrics.
+
+        Returns:
+            dict: Windows built, summaries held, summaries generated and failures,
+                and how tokens are counted
+        """
+        with self._lock:
+            return {
+                'keep_turns': self.keep_turns,
+                'token_counter': self.tokens.method,
+                'windows': self._windows,
+                'summaries': len(self._summaries),
+                'summaries_generated': self._summaries_generated,
+                'summary_failures': self._summary_failures
+            }
+
+    def _recent_start(self, chat_history: list) -> int:
+        """Index of the first message of the last keep_turns turns."""
+        turns = 0
+        for index in range(len(chat_history) - 1, -1, -1):
+            if chat_history[index]["role"] == "user":
+                turns += 1
+                if turns == self.keep_turns:
+                    return index
+        return 0
+
+    def _summary(self, conversation_id: str, split: int) -> Tuple[int, Optional[str]]:
+        """(messages covered, summary) of a conversation whose recent turns start at split."""
+        with self._lock:
+            covered, summary = self._summaries.get(conversation_id, (0, None))
+            if conversation_id in self._summaries:
+                self._summaries.move_to_end(conversation_id)
+        if covered > split:
+            # History shorter than what the summary covered (e.g. reset)
+            return 0, None
+        return covered, summary
+
+
+def _latest_tool_results(messages: list) -> List[Dict[str, Any]]:
+    """
+    Latest result of each distinct tool call, with the calls that produced them.
+
+    Returns:
+        list: One assistant tool-call dict followed by its tool result dicts
+            (empty if there are none)
+    """
+    calls: Dict[Any, Dict[str, Any]] = {}
+    results: Dict[str, Any] = {}
+    for message in messages:
+        if message["role"] == "tool":
+            results[message.get("tool_call_id")] = message
+        for call in message.get("tool_calls") or ():
+            calls[(call["name"], str(call["args"]))] = call
+
+    kept = [call for call in calls.values() if call["id"] in results]
+    if not kept:
+        return []
+    return [{'role': 'assistant', 'content': '', 'tool_calls': kept}] + [
+        {'role': 'tool', 'content': results[call["id"]]["content"], 'tool_call_id': call["id"]}
+        for call in kept
+    ]
@@ -0,0 +1,115 @@
+"""
+Shared HTTP client for Azure OpenAI.
+One keep-alive connection pool per process, so chat requests reuse open
+TLS connections instead of paying DNS, TCP and TLS setup every time.
+"""
+import os
+import ssl
+import threading
+from typing import Any, Optional, List
+import httpx
+from config.settings import settings
+
+
+_lock = threading.Lock()
+_client: Optional[httpx.Client] = None
+_client_pid: Optional[int] = None
+_async_client: Optional[httpx.AsyncClient] = None
+_async_client_pid: Optional[int] = None
+_ssl_context: Optional[ssl.SSLContext] = None
+
+# Clients inherited from the parent process. Closing them in the child would
+# shut down sockets the parent still uses, so they are kept alive and unused.
+_inherited: List[Any] = []
+
+
+def get_ssl_context() -> ssl.SSLContext:
+    """
+    Get the process-wide TLS context.
+
+    Loading the CA bundle is the slowest part of building a client; one
+    shared context also lets OpenSSL reuse TLS sessions across connections.
+
+    Returns:
+        SSLContext: Default verifying context
+    """
+    global _ssl_context
+    if _ssl_context is None:
+        with _lock:
+            if _ssl_context is None:
+                _ssl_context = ssl.create_default_context()
+    return _ssl_context
+
+
+def get_http_client() -> httpx.Client:
+    """
+    Get the shared, thread-safe HTTP client for the current process.
+
+    A forked worker (e.g. gunicorn with preload) gets its own client on
+    first use instead of sharing the parent's sockets.
+
+    Returns:
+        httpx.Client: Pooled client with the configured limits and timeouts
+    """
+    global _client, _client_pid
+    pid = os.getpid()
+    if _client is not None and _client_pid == pid:
+        return _client
+
+    ssl_context = get_ssl_context()
+    with _lock:
+        if _client is None or _client_pid != pid:
+            _client = httpx.Client(**_client_options(ssl_context))
+            _client_pid = pid
+        return _client
+
+
+def get_async_http_client() -> httpx.AsyncClient:
+    """
+    Get the shared async HTTP client for the current process (used by ainvoke/astream).
+
+    Its connections belong to the event loop that opens them, so an ASGI
+    worker should run a single loop (the default for uvicorn workers).
+
+    Returns:
+        httpx.AsyncClient: Pooled client with the same limits and timeouts
+    """
+    global _async_client, _async_client_pid
+    pid = os.getpid()
+    if _async_client is not None and _async_client_pid == pid:
+        return _async_client
+
+    ssl_context = get_ssl_context()
+    with _lock:
+        if _async_client is None or _async_client_pid != pid:
+            _async_client = httpx.AsyncClient(**_client_options(ssl_context))
+            _async_client_pid = pid
+        return _async_client
+
+
+def _client_options(ssl_context: ssl.SSLContext) -> dict:
+    """Pool limits, timeouts and TLS settings shared by both clients."""
+    return {
+        'limits': httpx.Limits(
+            max_connections=settings.LLM_POOL_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.LLM_POOL_MAX_KEEPALIVE,
+            keepalive_expiry=settings.LLM_POOL_KEEPALIVE_SECONDS
+        ),
+        'timeout': httpx.Timeout(settings.LLM_READ_TIMEOUT, connect=settings.LLM_CONNECT_TIMEOUT),
+        'verify': ssl_context
+    }
+
+
+def _after_fork_in_child() -> None:
+    """Forget the parent's clients (and lock state) in a forked child."""
+    global _client, _client_pid, _async_client, _async_client_pid, _lock
+    _inherited.extend(client for client in (_client, _async_client) if client is not None)
+    _client = None
+    _client_pid = None
+    _async_client = None
+    _async_client_pid = None
+    _lock = threading.Lock()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_after_fork_in_child)
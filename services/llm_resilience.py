@@ -0,0 +1,394 @@
+"""
+Resilience layer for Azure OpenAI calls.
+Per-call deadline, retries with jittered backoff that honor Retry-After,
+optional hedged requests past the observed p95 latency, and a circuit
+breaker that fails fast while the service is throttling or down.
+"""
+import asyncio
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+import openai
+
+
+# HTTP statuses worth retrying (timeouts, throttling, server errors)
+RETRYABLE_STATUSES = {408, 409, 429, 500, 502, 503, 504}
+
+
+class LLMUnavailableError(Exception):
+    """The model could not answer: circuit open, retries exhausted or deadline passed."""
+
+
+def is_retryable(error: BaseException) -> bool:
+    """Whether an error is transient (throttling, timeout, connection or server error)."""
+    if isinstance(error, (openai.APITimeoutError, openai.APIConnectionError, TimeoutError)):
+        return True
+    if isinstance(error, openai.APIStatusError):
+        return error.status_code in RETRYABLE_STATUSES
+    return False
+
+
+def retry_after(error: BaseException) -> Optional[float]:
+    """Delay requested by the server (retry-after-ms or retry-after header), in seconds."""
+    response = getattr(error, 'response', None)
+    headers = getattr(response, 'headers', None)
+    if not headers:
+        return None
+    try:
+        if headers.get('retry-after-ms'):
+            return float(headers['retry-after-ms']) / 1000
+        if headers.get('retry-after'):
+            return float(headers['retry-after'])
+    except ValueError:
+        return None
+    return None
+
+
+def _discard_late(future, discard: Callable[[Any], None]) -> None:
+    """Hand the result of an abandoned attempt to discard (nothing if it failed)."""
+    if future.cancelled() or future.exception() is not None:
+        return
+    try:
+        discard(future.result())
+    except Exception:
+        pass
+
+
+class CircuitBreaker:
+    """
+    Consecutive-failure circuit breaker.
+
+    After `failure_threshold` transient failures in a row the circuit opens
+    and calls are rejected for `reset_seconds`. Then one probe call is let
+    through (half-open): success closes the circuit, failure opens it again.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_seconds: float = 30):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._probing = False
+        self._opens = 0
+        self._rejected = 0
+
+    @property
+    def state(self) -> str:
+        """'closed', 'open' or 'half_open'."""
+        with self._lock:
+            return self._state()
+
+    def allow(self) -> bool:
+        """Whether a call may go out now (claims the probe when half-open)."""
+        return self.admit() is not None
+
+    def admit(self) -> Optional[str]:
+        """
+        Let a call go out if the circuit allows it.
+
+        Returns:
+            str: 'call' when closed, 'probe' when it claimed the half-open
+                probe, or None if the call is rejected
+        """
+        with self._lock:
+            state = self._state()
+            if state == 'closed':
+                return 'call'
+            if state == 'half_open' and not self._probing:
+                self._probing = True
+                return 'probe'
+            self._rejected += 1
+            return None
+
+    def release_probe(self) -> None:
+        """Give back a probe that ended without an outcome (cancelled), so the next call probes."""
+        with self._lock:
+            self._probing = False
+
+    def record_success(self) -> None:
+        """Close the circuit."""
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._probing = False
+
+    def record_failure(self) -> None:
+        """Count a transient failure, opening the circuit at the threshold."""
+        with self._lock:
+            self._failures += 1
+            if self._probing or (self._opened_at is None and self._failures >= self.failure_threshold):
+                self._opened_at = time.monotonic()
+                self._opens += 1
+            self._probing = False
+
+    def stats(self) -> Dict[str, Any]:
+        """State, consecutive failures, times opened and calls rejected."""
+        with self._lock:
+            return {
+                'state': self._state(),
+                'consecutive_failures': self._failures,
+                'opens': self._opens,
+                'rejected': self._rejected
+            }
+
+    def _state(self) -> str:
+        if self._opened_at is None:
+            return 'closed'
+        if time.monotonic() - self._opened_at >= self.reset_seconds:
+            return 'half_open'
+        return 'open'
+
+
+class ResilientCaller:
+    """
+    Runs model calls under a deadline with retries, hedging and a breaker.
+
+    Sync attempts run on a small thread pool so the caller can stop waiting at
+    the deadline and, when hedging is enabled, start a second identical
+    request once an attempt has taken longer than the recent p95. Whichever
+    finishes first wins; a late attempt is left to finish in the background
+    (bounded by the HTTP client's read timeout) and its result, if any, is
+    handed to `discard` (e.g. to close a stream nobody will read).
+    """
+
+    def __init__(self, deadline_seconds: float = 25, max_retries: int = 2,
+                 base_delay: float = 0.5, max_delay: float = 8, hedge: bool = False,
+                 hedge_min_samples: int = 20, breaker: Optional[CircuitBreaker] = None,
+                 max_workers: int = 32):
+        self.deadline_seconds = deadline_seconds
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.hedge = hedge
+        self.hedge_min_samples = hedge_min_samples
+        self.breaker = breaker or CircuitBreaker()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='llm-call')
+        self._lock = threading.Lock()
+        self._latencies = deque(maxlen=200)
+        self._p95: Optional[float] = None
+        self._calls = 0
+        self._retries = 0
+        self._hedges = 0
+        self._hedge_wins = 0
+        self._deadline_exceeded = 0
+        self._failures = 0
+
+    def call(self, fn: Callable[[], Any], hedge: Optional[bool] = None,
+             discard: Optional[Callable[[Any], None]] = None) -> Any:
+        """
+        Run fn with retries until it succeeds, fails permanently or the deadline passes.
+
+        Args:
+            fn: Zero-argument function making one model request
+            hedge: Override hedging for this call (streams are never hedged)
+            discard: Called with the result of an attempt that finishes after
+                it was given up on (deadline passed or hedge lost)
+
+        Returns:
+            The result of fn
+
+        Raises:
+            LLMUnavailableError: Circuit open, retries exhausted or deadline passed
+            Exception: Non-transient errors from fn (e.g. 400), unchanged
+        """
+        with self._lock:
+            self._calls += 1
+        deadline = time.monotonic() + self.deadline_seconds
+        hedge = self.hedge if hedge is None else hedge
+        attempt = 0
+
+        while True:
+            admitted = self.breaker.admit()
+            if admitted is None:
+                raise LLMUnavailableError("Azure OpenAI circuit is open")
+
+            try:
+                result = self._attempt(fn, deadline, hedge, discard)
+            except Exception as e:
+                time.sleep(self._retry_delay(e, attempt, deadline))
+                attempt += 1
+                continue
+            except BaseException:
+                # Cancelled (client gone, single-flight leader cancelled):
+                # no outcome, but a claimed probe must not stay claimed
+                if admitted == 'probe':
+                    self.breaker.release_probe()
+                raise
+
+            self.breaker.record_success()
+            return result
+
+    async def acall(self, fn: Callable[[], Awaitable[Any]], hedge: Optional[bool] = None) -> Any:
+        """
+        Async call: fn returns an awaitable (e.g. lambda: model.ainvoke(messages)).
+
+        Same deadline, retry, hedging and breaker rules as call; here a hedge
+        loser or an attempt past the deadline is cancelled instead of abandoned.
+        """
+        with self._lock:
+            self._calls += 1
+        deadline = time.monotonic() + self.deadline_seconds
+        hedge = self.hedge if hedge is None else hedge
+        attempt = 0
+
+        while True:
+            admitted = self.breaker.admit()
+            if admitted is None:
+                raise LLMUnavailableError("Azure OpenAI circuit is open")
+
+            try:
+                result = await self._aattempt(fn, deadline, hedge)
+            except Exception as e:
+                await asyncio.sleep(self._retry_delay(e, attempt, deadline))
+                attempt += 1
+                continue
+            except BaseException:
+                # Cancelled (client gone, single-flight leader cancelled):
+                # no outcome, but a claimed probe must not stay claimed
+                if admitted == 'probe':
+                    self.breaker.release_probe()
+                raise
+
+            self.breaker.record_success()
+            return result
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Get resilience metrics.
+
+        Returns:
+            dict: Calls, retries, hedged requests and wins, deadline misses,
+                failed calls, p95 latency and breaker state
+        """
+        with self._lock:
+            stats = {
+                'calls': self._calls,
+                'retries': self._retries,
+                'hedges': self._hedges,
+                'hedge_wins': self._hedge_wins,
+                'deadline_exceeded': self._deadline_exceeded,
+                'failures': self._failures,
+                'p95_seconds': self._p95
+            }
+        stats['breaker'] = self.breaker.stats()
+        return stats
+
+    def _retry_delay(self, error: Exception, attempt: int, deadline: float) -> float:
+        """
+        Account for a failed attempt and pick the delay before the next one.
+
+        Raises:
+            The error itself if it is not transient, LLMUnavailableError if
+            retries or time ran out
+        """
+        if not is_retryable(error):
+            # The service answered; only this request was bad
+            self.breaker.record_success()
+            raise error
+        self.breaker.record_failure()
+
+        delay = retry_after(error)
+        if delay is None:
+            # Full jitter: uniform over the exponential backoff window
+            delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+        if attempt >= self.max_retries or time.monotonic() + delay >= deadline:
+            with self._lock:
+                self._failures += 1
+                if isinstance(error, TimeoutError):
+                    self._deadline_exceeded += 1
+            raise LLMUnavailableError(f"Azure OpenAI unavailable: {str(error) or type(error).__name__}") from error
+
+        with self._lock:
+            self._retries += 1
+        return delay
+
+    async def _aattempt(self, fn: Callable[[], Awaitable[Any]], deadline: float, hedge: bool) -> Any:
+        """Async _attempt; unfinished requests are cancelled when it returns."""
+        started = time.monotonic()
+        primary = asyncio.ensure_future(fn())
+        pending = {primary}
+
+        try:
+            hedge_after = self._hedge_delay() if hedge else None
+            if hedge_after is not None and started + hedge_after < deadline:
+                done, _ = await asyncio.wait(pending, timeout=hedge_after)
+                if not done:
+                    with self._lock:
+                        self._hedges += 1
+                    pending.add(asyncio.ensure_future(fn()))
+
+            error = None
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending, timeout=max(0.0, deadline - time.monotonic()), return_when=asyncio.FIRST_COMPLETED
+                )
+                if not done:
+                    raise TimeoutError(f"Azure OpenAI call exceeded the {self.deadline_seconds}s deadline")
+                for task in done:
+                    if task.exception() is None:
+                        if task is not primary:
+                            with self._lock:
+                                self._hedge_wins += 1
+                        self._record_latency(time.monotonic() - started)
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    def _attempt(self, fn: Callable[[], Any], deadline: float, hedge: bool,
+                 discard: Optional[Callable[[Any], None]] = None) -> Any:
+        """One attempt (plus its hedge), raising TimeoutError at the deadline."""
+        started = time.monotonic()
+        primary = self._executor.submit(fn)
+        pending = {primary}
+
+        try:
+            hedge_after = self._hedge_delay() if hedge else None
+            if hedge_after is not None and started + hedge_after < deadline:
+                done, _ = wait(pending, timeout=hedge_after)
+                if not done:
+                    with self._lock:
+                        self._hedges += 1
+                    pending.add(self._executor.submit(fn))
+
+            error = None
+            while pending:
+                done, pending = wait(
+                    pending, timeout=max(0.0, deadline - time.monotonic()), return_when=FIRST_COMPLETED
+                )
+                if not done:
+                    raise TimeoutError(f"Azure OpenAI call exceeded the {self.deadline_seconds}s deadline")
+                for future in done:
+                    if future.exception() is None:
+                        if future is not primary:
+                            with self._lock:
+                                self._hedge_wins += 1
+                        self._record_latency(time.monotonic() - started)
+                        return future.result()
+                    error = future.exception()
+            raise error
+        finally:
+            for future in pending:
+                # Not started yet: never send it; otherwise discard what it returns
+                if not future.cancel() and discard is not None:
+                    future.add_done_callback(lambda late: _discard_late(late, discard))
+
+    def _hedge_delay(self) -> Optional[float]:
+        """Recent p95 latency, once there are enough samples to trust it."""
+        with self._lock:
+            if len(self._latencies) < self.hedge_min_samples:
+                return None
+            return self._p95
+
+    def _record_latency(self, seconds: float) -> None:
+        with self._lock:
+            self._latencies.append(seconds)
+            ordered = sorted(self._latencies)
+            self._p95 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
@@ -3,45 +3,67 @@ OCR Service using Azure Document Intelligence.
 Extracts CIL and other information from utility bills.
 """
 from typing import Optional, Dict, Any
+import hashlib
 import re
 from config.settings import settings
+from services.single_flight import SingleFlight
 
 
-def extract_cil_from_image(image_bytes: bytes) -> Optional[str]:
+# Identical images uploaded concurrently are analyzed once
+ocr_flights = SingleFlight()
+
+
+def _read_document(image_bytes: bytes) -> Optional[str]:
     """
-    Extract CIL from an image using Azure Document Intelligence.
+    Run the prebuilt-read model on an image and return its text.
     
-    CIL Format: 1071324-101 (7 digits - 3 digits) or 7-10 digits
+    Concurrent calls with the same image (by SHA-256) share one Azure request.
     
     Args:
         image_bytes: Image file bytes
         
     Returns:
-        str: Extracted CIL number or None if extraction fails
+        str: Extracted text or None if the document has no text
+        
+    Raises:
+        Exception: Errors from Azure Document Intelligence
     """
-    try:
+    def analyze() -> Optional[str]:
         from azure.ai.documentintelligence import DocumentIntelligenceClient
         from azure.core.credentials import AzureKeyCredential
         
-        # Initialize the Document Intelligence client
         client = DocumentIntelligenceClient(
             endpoint=settings.AZURE_DOCUMENT_INTELLIGENCE_ENDPOINT,
             credential=AzureKeyCredential(settings.AZURE_DOCUMENT_INTELLIGENCE_KEY)
         )
         
-        # Analyze the document
         poller = client.begin_analyze_document(
             "prebuilt-read",
             body=image_bytes,
             content_type="application/octet-stream"
         )
         
-        result = poller.result()
+        return poller.result().content or None
+    
+    content, _ = ocr_flights.do(hashlib.sha256(image_bytes).digest(), analyze)
+    return content
+
+
+def extract_cil_from_image(image_bytes: bytes) -> Optional[str]:
+    """
+    Extract CIL from an image using Azure Document Intelligence.
+    
+    CIL Format: 1071324-101 (7 digits - 3 digits) or 7-10 digits
+    
+    Args:
+        image_bytes: Image file bytes
         
-        # Extract all text content
-        extracted_text = ""
-        if result.content:
-            extracted_text = result.content
+    Returns:
+        str: Extracted CIL number or None if extraction fails
+    """
+    try:
+        # Analyze the document and extract all text content
+        extracted_text = _read_document(image_bytes) or ""
         
         # Pattern matching for CIL
         # Primary format: 1071324-101 (7 digits - 3 digits)
@@ -86,26 +108,7 @@ def extract_text_from_image(image_bytes: bytes) -> Optional[str]:
         str: Extracted text or None if extraction fails
     """
     try:
-        from azure.ai.documentintelligence import DocumentIntelligenceClient
-        from azure.core.credentials import AzureKeyCredential
-        
-        client = DocumentIntelligenceClient(
-            endpoint=settings.AZURE_DOCUMENT_INTELLIGENCE_ENDPOINT,
-            credential=AzureKeyCredential(settings.AZURE_DOCUMENT_INTELLIGENCE_KEY)
-        )
-        
-        poller = client.begin_analyze_document(
-            "prebuilt-read",
-            body=image_bytes,
-            content_type="application/octet-stream"
-        )
-        
-        result = poller.result()
-        
-        if result.content:
-            return result.content
-        
-        return None
+        return _read_document(image_bytes)
         
     except Exception as e:
         print(f"Error in text extraction: {str(e)}")
@@ -142,29 +145,12 @@ def extract_bill_information(image_bytes: bytes) -> Dict[str, Any]:
             - raw_text: Full extracted text
     """
     try:
-        from azure.ai.documentintelligence import DocumentIntelligenceClient
-        from azure.core.credentials import AzureKeyCredential
-        
-        # Initialize client
-        client = DocumentIntelligenceClient(
-            endpoint=settings.AZURE_DOCUMENT_INTELLIGENCE_ENDPOINT,
-            credential=AzureKeyCredential(settings.AZURE_DOCUMENT_INTELLIGENCE_KEY)
-        )
-        
         # Analyze document
-        poller = client.begin_analyze_document(
-            "prebuilt-read",
-            body=image_bytes,
-            content_type="application/octet-stream"
-        )
-        
-        result = poller.result()
+        text = _read_document(image_bytes)
         
-        if not result.content:
+        if not text:
             return {"error": "No text found in image"}
         
-        text = result.content
-        
         # Initialize result dictionary
         extracted_info = {
             "cil": None,
@@ -0,0 +1,120 @@
+"""
+Prompt assembly for the agent.
+Builds the constant prefix (system prompt) once and keeps each
+conversation's converted message list, so a turn only converts the
+messages stored since the previous turn.
+"""
+import threading
+from collections import OrderedDict
+from typing import Optional, Dict, Any, List, Callable, Tuple
+
+from langchain_core.messages import BaseMessage, HumanMessage, SystemMessage
+
+
+class PromptAssembler:
+    """
+    Assembles the prompt messages of a turn.
+
+    The prompt is laid out stable-first so Azure OpenAI's prompt caching
+    can reuse it: system prompt, then the conversation summary, then the
+    replayed history oldest first, then the new user message. Within a
+    conversation each turn's prompt extends the previous one until the
+    summary is refreshed.
+
+    The converted prefix (everything before the new user message) is kept
+    per conversation and reused while the summary and the number of
+    messages it covers are unchanged; messages stored since are converted
+    and appended.
+    """
+
+    def __init__(self, system_prompt: str, convert: Callable[[list], List[BaseMessage]],
+                 max_conversations: int = 2000):
+        """
+        Args:
+            system_prompt: Constant system prompt, built into one message once
+            convert: Turns stored message dicts into LangChain messages
+            max_conversations: Conversations whose messages are kept (least recently used dropped)
+        """
+        self.system_message = SystemMessage(content=system_prompt)
+        self.convert = convert
+        self.max_conversations = max_conversations
+        # conversation_id -> (summary, covered, stored messages converted, prompt prefix)
+        self._prefixes: "OrderedDict[str, Tuple[Optional[str], int, int, List[BaseMessage]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._builds = 0
+        self._reused = 0
+        self._messages_converted = 0
+        self._messages_reused = 0
+
+    def build(self, conversation_id: Optional[str], summary: Optional[str], covered: int,
+              replay: list, history_length: int, user_input: str) -> List[BaseMessage]:
+        """
+        Prompt messages for a turn.
+
+        Args:
+            conversation_id: Conversation of the turn (None: nothing is kept)
+            summary: Conversation summary or None
+            covered: Stored messages covered by the summary
+            replay: History to replay (from HistoryManager.window), ending with
+                the stored messages from `covered` on
+            history_length: Number of stored messages in the conversation
+            user_input: New user message
+
+        Returns:
+            list: New list of messages; the caller may append to it
+        """
+        entry = None
+        if conversation_id is not None:
+            with self._lock:
+                entry = self._prefixes.get(conversation_id)
+                if entry is not None:
+                    self._prefixes.move_to_end(conversation_id)
+
+        if entry is not None and entry[0] == summary and entry[1] == covered and entry[2] <= history_length:
+            # Only the messages stored since the last turn are new
+            stored_since = history_length - entry[2]
+            new = self.convert(replay[len(replay) - stored_since:]) if stored_since else []
+            reused = len(entry[3])
+            prefix = entry[3] + new
+        else:
+            prefix = [self.system_message]
+            if summary:
+                prefix.append(SystemMessage(content=f"ملخص المحادثة السابقة:\n{summary}"))
+            new = self.convert(replay)
+            prefix.extend(new)
+            reused = 0
+
+        with self._lock:
+            if conversation_id is not None:
+                self._prefixes[conversation_id] = (summary, covered, history_length, prefix)
+                self._prefixes.move_to_end(conversation_id)
+                while len(self._prefixes) > self.max_conversations:
+                    self._prefixes.popitem(last=False)
+            self._builds += 1
+            self._reused += 1 if reused else 0
+            self._messages_converted += len(new)
+            self._messages_reused += reused
+
+        return prefix + [HumanMessage(content=user_input)]
+
+    def forget(self, conversation_id: str) -> None:
+        """Drop the kept messages of a conversation."""
+        with self._lock:
+            self._prefixes.pop(conversation_id, None)
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Get assembly metrics.
+
+        Returns:
+            dict: Conversations kept, prompts built, builds that reused a kept
+                prefix and messages converted vs reused
+        """
+        with self._lock:
+            return {
+                'conversations': len(self._prefixes),
+                'builds': self._builds,
+                'reused': self._reused,
+                'messages_converted': self._messages_converted,
+                'messages_reused': self._messages_reused
+            }
@@ -0,0 +1,148 @@
+"""
+Single-flight request coalescing.
+Concurrent callers asking for the same key share one execution of the work
+instead of each repeating it (identical tool calls, prompts or OCR images).
+"""
+import asyncio
+import threading
+from typing import Any, Awaitable, Callable, Dict, Hashable, Tuple
+
+
+class _Call:
+    """One in-flight execution and its outcome."""
+    __slots__ = ('done', 'value', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class _LeaderCancelled(Exception):
+    """Set on an async call whose leader was cancelled; its followers start over."""
+
+
+class SingleFlight:
+    """
+    Runs at most one execution per key at a time.
+
+    The first caller for a key runs the function; callers arriving while it
+    runs wait and receive the same result (or the same exception). Nothing
+    is cached: once the execution finishes, the next call runs again.
+
+    Async callers (ado) coalesce among themselves on the event loop.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, _Call] = {}
+        self._async_calls: Dict[Hashable, asyncio.Future] = {}
+        self._executions = 0
+        self._shared = 0
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Tuple[Any, bool]:
+        """
+        Run fn once for all concurrent callers with the same key.
+
+        Args:
+            key: Identity of the work
+            fn: Zero-argument function doing the work
+
+        Returns:
+            tuple: (result, shared) where shared is True if another caller ran fn
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                self._shared += 1
+                leader = False
+            else:
+                call = self._calls[key] = _Call()
+                self._executions += 1
+                leader = True
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.value, True
+
+        try:
+            call.value = fn()
+        except BaseException as e:
+            # KeyboardInterrupt, SystemExit, ... too: followers must not
+            # mistake the missing value for a result
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+        return call.value, False
+
+    async def ado(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """
+        Async do: await fn() once for all concurrent coroutines with the same key.
+
+        Cancellation stays with the caller that was cancelled: a cancelled
+        follower stops waiting, and when the leader is cancelled the waiting
+        followers start over, one of them running fn as the new leader.
+
+        Args:
+            key: Identity of the work
+            fn: Zero-argument function returning an awaitable doing the work
+
+        Returns:
+            tuple: (result, shared) where shared is True if another caller ran fn
+        """
+        while True:
+            with self._lock:
+                future = self._async_calls.get(key)
+                if future is None:
+                    future = self._async_calls[key] = asyncio.get_running_loop().create_future()
+                    self._executions += 1
+                    break
+
+            try:
+                # Shield so a cancelled follower does not cancel the leader's result
+                value = await asyncio.shield(future)
+            except _LeaderCancelled:
+                continue
+            with self._lock:
+                self._shared += 1
+            return value, True
+
+        try:
+            value = await fn()
+        except asyncio.CancelledError:
+            # Followers retry instead of inheriting this caller's cancellation
+            future.set_exception(_LeaderCancelled())
+            future.exception()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            # Followers receive the error; mark it retrieved for the leader
+            future.exception()
+            raise
+        else:
+            future.set_result(value)
+        finally:
+            with self._lock:
+                del self._async_calls[key]
+
+        return value, False
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Get coalescing metrics.
+
+        Returns:
+            dict: Executions, calls served by another caller's execution, and in-flight keys
+        """
+        with self._lock:
+            return {
+                'executions': self._executions,
+                'shared': self._shared,
+                'in_flight': len(self._calls) + len(self._async_calls)
+            }
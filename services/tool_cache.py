@@ -0,0 +1,155 @@
+"""
+Result cache for the agent's CIL tools.
+Keeps rendered tool answers per (tool, CIL) with a TTL and a size bound, and
+drops them as soon as the customer's row or their zone's row changes.
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Dict, Any, List, Set, Tuple
+
+
+class ToolResultCache:
+    """
+    LRU + TTL cache of tool results keyed by (tool name, CIL).
+
+    Each entry remembers the zone it was computed for, so a zone update
+    only invalidates the answers of customers in that zone. Writes carry
+    the version read before computing; a result computed while an
+    invalidation happened is not stored, so it can never outlive the change.
+    """
+
+    def __init__(self, max_entries: int = 50_000, ttl_seconds: float = 300):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[str, float, Any]]" = OrderedDict()
+        self._by_zone: Dict[Any, Set[Tuple[str, str]]] = {}
+        self._tool_names: Set[str] = set()
+        self._lock = threading.Lock()
+        self._version = 0
+        self._hits = 0
+        self._misses = 0
+        self._invalidations = 0
+
+    @property
+    def version(self) -> int:
+        """Invalidation counter; read it before computing a result to put."""
+        return self._version
+
+    def get(self, tool_name: str, cil: str) -> Optional[str]:
+        """
+        Get a cached result.
+
+        Args:
+            tool_name: Tool name (e.g. 'check_payment')
+            cil: Customer Identification Number
+
+        Returns:
+            str: Cached result or None if missing or expired
+        """
+        key = (tool_name, cil)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[1] <= time.monotonic():
+                if entry is not None:
+                    self._remove(key)
+                self._misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self._hits += 1
+            return entry[0]
+
+    def put(self, tool_name: str, cil: str, result: str, zone_id: Any = None,
+            version: Optional[int] = None) -> None:
+        """
+        Store a result.
+
+        Args:
+            tool_name: Tool name
+            cil: Customer Identification Number
+            result: Rendered tool output
+            zone_id: Zone the result depends on (None if it depends on no zone)
+            version: Value of `version` read before computing; stale results are dropped
+        """
+        key = (tool_name, cil)
+        with self._lock:
+            if version is not None and version != self._version:
+                return
+
+            self._remove(key)
+            self._tool_names.add(tool_name)
+            self._entries[key] = (result, time.monotonic() + self.ttl_seconds, zone_id)
+            if zone_id is not None:
+                self._by_zone.setdefault(zone_id, set()).add(key)
+
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+
+    def invalidate_users(self, cils: Optional[List[str]]) -> None:
+        """Drop the results of the given customers (all results if None)."""
+        with self._lock:
+            self._version += 1
+            if cils is None:
+                self._clear()
+                return
+            for cil in cils:
+                for tool_name in self._tool_names:
+                    if (tool_name, cil) in self._entries:
+                        self._remove((tool_name, cil))
+                        self._invalidations += 1
+
+    def invalidate_zones(self, zone_ids: Optional[List[Any]]) -> None:
+        """Drop the results computed for customers of the given zones (all results if None)."""
+        with self._lock:
+            self._version += 1
+            if zone_ids is None:
+                self._clear()
+                return
+            for zone_id in zone_ids:
+                for key in list(self._by_zone.get(zone_id, ())):
+                    self._remove(key)
+                    self._invalidations += 1
+
+    def on_change(self, table_name: str, keys: Optional[List[Any]]) -> None:
+        """Change listener for data.mock_db.register_change_listener."""
+        if table_name == 'users':
+            self.invalidate_users(keys)
+        elif table_name == 'zones':
+            self.invalidate_zones(keys)
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Get cache metrics.
+
+        Returns:
+            dict: Entry count, limits, hits, misses, hit rate and invalidated entries
+        """
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'ttl_seconds': self.ttl_seconds,
+                'hits': self._hits,
+                'misses': self._misses,
+                'hit_rate': self._hits / lookups if lookups else 0.0,
+                'invalidations': self._invalidations
+            }
+
+    def _remove(self, key: Tuple[str, str]) -> None:
+        """Remove one entry and its zone back-reference."""
+        entry = self._entries.pop(key, None)
+        if entry is None or entry[2] is None:
+            return
+        keys = self._by_zone.get(entry[2])
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._by_zone[entry[2]]
+
+    def _clear(self) -> None:
+        """Drop every entry (a whole table was replaced)."""
+        self._invalidations += len(self._entries)
+        self._entries.clear()
+        self._by_zone.clear()
@@ -0,0 +1,184 @@
+"""
+Tool dispatcher for agent tool calls.
+Resolves tools by name and runs the calls of one model response
+concurrently on a dedicated, bounded thread pool with per-tool timeouts.
+"""
+import asyncio
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import Optional, Dict, Any, List, Iterable
+
+
+TIMEOUT_ANSWER = "تعذر الحصول على المعلومات في الوقت المحدد. الرجاء المحاولة لاحقاً."
+
+
+class ToolDispatcher:
+    """
+    Name -> tool table plus a dedicated, bounded worker pool.
+
+    Results come back in the order of the tool calls, so ToolMessages are
+    assembled exactly as the model issued the calls. Every call gets a
+    result: unknown tools, errors and timeouts become an explanatory
+    string instead of a missing ToolMessage (which the API would reject).
+
+    Python threads cannot be interrupted, so a timeout only stops waiting
+    for a call. A call that has not started yet is cancelled; one that is
+    already running keeps its worker until the tool returns ("abandoned").
+    At most max_pending calls may be queued or running at once. Past that,
+    further calls are not submitted and get the timeout answer immediately,
+    so tools that hang cannot grow the pool's queue without bound: they
+    hold workers, and once every slot is taken new calls fail fast instead
+    of waiting behind them.
+
+    Sync tools always run on this pool, including from arun, so the async
+    agent is bounded the same way instead of using the event loop's default
+    executor. Tools with a native coroutine run as tasks and are cancelled
+    at their timeout.
+    """
+
+    def __init__(self, tools: Iterable, max_workers: int = 8, timeout: float = 10.0,
+                 timeouts: Optional[Dict[str, float]] = None, max_pending: Optional[int] = None):
+        """
+        Args:
+            tools: LangChain tools the model may call
+            max_workers: Threads of the pool
+            timeout: Default seconds to wait for a call
+            timeouts: Per-tool timeouts by tool name
+            max_pending: Calls queued or running at once (default 2 x max_workers)
+        """
+        self.tools = {t.name: t for t in tools}
+        self.timeout = timeout
+        self.timeouts = dict(timeouts or {})
+        self.max_workers = max_workers
+        self.max_pending = max_pending if max_pending is not None else 2 * max_workers
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='tool')
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._abandoned = set()
+        self._timeouts = 0
+        self._rejected = 0
+
+    def run(self, tool_calls: List[Dict[str, Any]]) -> List[str]:
+        """
+        Execute tool calls concurrently.
+
+        Args:
+            tool_calls: Calls from an AI message ({'id', 'name', 'args'})
+
+        Returns:
+            list: One result string per call, in call order
+        """
+        submitted = []
+        for call in tool_calls:
+            tool = self.tools.get(call['name'])
+            future = self._submit(tool, call['args']) if tool is not None else None
+            deadline = time.monotonic() + self.timeouts.get(call['name'], self.timeout)
+            submitted.append((call, tool, future, deadline))
+
+        results = []
+        for call, tool, future, deadline in submitted:
+            if tool is None:
+                results.append(f"الأداة غير معروفة: {call['name']}")
+            elif future is None:
+                results.append(self._rejected_answer(call))
+            else:
+                try:
+                    results.append(str(future.result(timeout=max(0.0, deadline - time.monotonic()))))
+                except FutureTimeoutError:
+                    results.append(self._timed_out(call, future))
+                except Exception as e:
+                    print(f"Error running tool {call['name']}: {str(e)}")
+                    results.append(f"حدث خطأ أثناء تنفيذ الأداة: {str(e)}")
+
+        return results
+
+    async def arun(self, tool_calls: List[Dict[str, Any]]) -> List[str]:
+        """
+        Async run: the calls run concurrently with the same per-tool timeouts,
+        pool bound and error strings.
+
+        Args:
+            tool_calls: Calls from an AI message ({'id', 'name', 'args'})
+
+        Returns:
+            list: One result string per call, in call order
+        """
+        async def run_one(call: Dict[str, Any]) -> str:
+            tool = self.tools.get(call['name'])
+            if tool is None:
+                return f"الأداة غير معروفة: {call['name']}"
+            timeout = self.timeouts.get(call['name'], self.timeout)
+            try:
+                if getattr(tool, 'coroutine', None) is not None:
+                    return str(await asyncio.wait_for(tool.ainvoke(call['args']), timeout))
+                future = self._submit(tool, call['args'])
+                if future is None:
+                    return self._rejected_answer(call)
+                try:
+                    # Shielded: a timeout must not mark a running call as cancelled
+                    return str(await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(future)), timeout))
+                except asyncio.TimeoutError:
+                    return self._timed_out(call, future)
+            except asyncio.TimeoutError:
+                print(f"Error running tool {call['name']}: timed out")
+                with self._lock:
+                    self._timeouts += 1
+                return TIMEOUT_ANSWER
+            except Exception as e:
+                print(f"Error running tool {call['name']}: {str(e)}")
+                return f"حدث خطأ أثناء تنفيذ الأداة: {str(e)}"
+
+        return list(await asyncio.gather(*(run_one(call) for call in tool_calls)))
+
+    def _submit(self, tool, args: Dict[str, Any]) -> Optional[Future]:
+        """Submit a call to the pool, or return None when max_pending calls are already pending."""
+        with self._lock:
+            if self._pending >= self.max_pending:
+                self._rejected += 1
+                return None
+            self._pending += 1
+        future = self._pool.submit(tool.invoke, args)
+        future.add_done_callback(self._release)
+        return future
+
+    def _release(self, future: Future) -> None:
+        with self._lock:
+            self._pending -= 1
+            self._abandoned.discard(future)
+
+    def _timed_out(self, call: Dict[str, Any], future: Future) -> str:
+        """Give up on a call: cancel it if it has not started, else leave it to finish on its worker."""
+        print(f"Error running tool {call['name']}: timed out")
+        cancelled = future.cancel()
+        with self._lock:
+            self._timeouts += 1
+            if not cancelled and not future.done():
+                self._abandoned.add(future)
+        return TIMEOUT_ANSWER
+
+    def _rejected_answer(self, call: Dict[str, Any]) -> str:
+        print(f"Error running tool {call['name']}: {self.max_pending} calls already pending")
+        return TIMEOUT_ANSWER
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Get dispatcher metrics.
+
+        Returns:
+            dict: Pool size, calls pending now (queued or running), calls still
+                running after their timeout, and timed-out and rejected calls
+        """
+        with self._lock:
+            return {
+                'workers': self.max_workers,
+                'max_pending': self.max_pending,
+                'pending': self._pending,
+                'abandoned': len(self._abandoned),
+                'timeouts': self._timeouts,
+                'rejected': self._rejected
+            }
+
+    def shutdown(self) -> None:
+        """Stop the worker pool (pending calls are cancelled)."""
+        self._pool.shutdown(wait=False, cancel_futures=True)
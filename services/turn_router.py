@@ -0,0 +1,129 @@
+"""
+Rule-based routing of chat turns.
+Decides whether a turn needs the large tool-using model, a smaller model,
+or just a canned answer (greetings, thanks, asking for the CIL).
+Also home of the CIL pattern shared with the agent (services.ai_service).
+"""
+import re
+from typing import Optional, Tuple
+
+
+# Routes, from cheapest to most capable
+ROUTE_TEMPLATE = 'template'
+ROUTE_SMALL = 'small'
+ROUTE_LARGE = 'large'
+
+# CIL shape shared with the OCR service (e.g. 1071324-101)
+CIL_PATTERN = re.compile(r'(?<!\d)\d{7}-\d{3}(?!\d)')
+
+_DIACRITICS = re.compile(r'[ً-ْـ]')
+_NON_WORD = re.compile(r'[^\w\s]')
+
+
+def normalize(text: str) -> str:
+    """Lowercase, strip Arabic diacritics/tatweel and punctuation, unify alef and taa marbuta."""
+    text = _DIACRITICS.sub('', (text or '').lower())
+    text = re.sub('[أإآ]', 'ا', text).replace('ة', 'ه').replace('ى', 'ي')
+    return _NON_WORD.sub(' ', text)
+
+
+def _words(*phrases: str) -> frozenset:
+    return frozenset(word for phrase in phrases for word in normalize(phrase).split())
+
+
+def _phrases(*lists: str) -> frozenset:
+    """Comma-separated phrases as tuples of normalized words."""
+    return frozenset(tuple(normalize(phrase).split()) for text in lists for phrase in text.split(','))
+
+
+# A turn made only of these words gets the matching canned answer
+_GREETING_WORDS = _words(
+    'مرحبا مرحباً أهلا أهلاً وسهلا السلام عليكم ورحمة الله وبركاته صباح مساء الخير النور',
+    'hi hello hey salam bonjour salut'
+)
+_THANKS_WORDS = _words(
+    'شكرا شكراً جزيلا جزاك الله خيرا بارك فيك ممتاز تمام حسنا',
+    'thanks thank you merci beaucoup ok okay'
+)
+_GOODBYE_WORDS = _words(
+    'مع السلامة وداعا إلى اللقاء',
+    'bye goodbye au revoir'
+)
+
+# Questions about the customer's own account (my bill, my balance), which
+# cannot be answered without their CIL. Only account nouns count: a bare
+# "my" or "عندي" also starts general questions ("how can I pay my bill online?"
+# is about paying, not about this customer's bill)
+_ACCOUNT_WORDS = _words(
+    'فاتورتي فواتيري رصيدي حسابي اشتراكي عدادي مستحقاتي دفعاتي'
+)
+_ACCOUNT_PHRASES = _phrases(
+    'my balance, my account, my meter, my subscription, my water, my service, my payments',
+    'mon solde, mon compte, mon compteur, mon abonnement, mon eau, mon service, mes paiements'
+)
+
+# Words asking why a service is cut (the question a zone broadcast answer covers)
+_OUTAGE_WORDS = _words(
+    'انقطاع انقطع انقطعت ينقطع تنقطع منقطع منقطعة مقطوع مقطوعة قطع توقف توقفت متوقف متوقفة عطل',
+    'coupure coupé coupée panne outage'
+)
+
+# Longest turn (in words) that may still be a pure greeting/thanks/goodbye
+MAX_TEMPLATE_WORDS = 8
+
+
+def detect_cil(text: str) -> Optional[str]:
+    """
+    Find the first CIL number in a user message.
+
+    Args:
+        text: User message
+
+    Returns:
+        str: CIL number or None if the message contains none
+    """
+    match = CIL_PATTERN.search(text or '')
+    return match.group(0) if match else None
+
+
+def classify_turn(user_input: str, chat_history: Optional[list] = None) -> Tuple[str, Optional[str]]:
+    """
+    Pick the route of a turn from its text and the conversation so far.
+
+    Args:
+        user_input: User's message
+        chat_history: Previous stored messages (role, content)
+
+    Returns:
+        tuple: (route, template) where template names the canned answer
+            ('greeting', 'thanks', 'goodbye', 'ask_cil') for ROUTE_TEMPLATE
+            and is None otherwise
+    """
+    if detect_cil(user_input):
+        return ROUTE_LARGE, None
+
+    words = normalize(user_input).split()
+    if words and len(words) <= MAX_TEMPLATE_WORDS:
+        vocabulary = set(words)
+        if vocabulary <= _GOODBYE_WORDS:
+            return ROUTE_TEMPLATE, 'goodbye'
+        if vocabulary <= _THANKS_WORDS | _GREETING_WORDS and vocabulary & (_THANKS_WORDS - _GREETING_WORDS):
+            return ROUTE_TEMPLATE, 'thanks'
+        if vocabulary <= _GREETING_WORDS:
+            return ROUTE_TEMPLATE, 'greeting'
+
+    # Once the customer is identified, follow-ups may need the tools
+    if any(message["role"] == "user" and detect_cil(message["content"]) for message in chat_history or ()):
+        return ROUTE_LARGE, None
+
+    # Account-specific questions (including "why is my service cut") need the CIL;
+    # general questions ("how do I pay online?") go to the small model
+    if (_ACCOUNT_WORDS | _OUTAGE_WORDS) & set(words) or _ACCOUNT_PHRASES & set(zip(words, words[1:])):
+        return ROUTE_TEMPLATE, 'ask_cil'
+
+    return ROUTE_SMALL, None
+
+
+def asks_about_outage(user_input: str) -> bool:
+    """Whether a message asks about a service being cut (e.g. "لماذا انقطع الماء؟")."""
+    return bool(_OUTAGE_WORDS & set(normalize(user_input).split()))
@@ -0,0 +1,45 @@
+"""Shared pytest setup: project packages on the path and a fake chat model."""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class FakeChatModel:
+    """Chat model returning scripted responses and recording the prompts it was sent."""
+
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.prompts = []
+        # Method of each call ('invoke', 'ainvoke', 'stream')
+        self.calls = []
+
+    def invoke(self, messages, *args, **kwargs):
+        self.calls.append('invoke')
+        self.prompts.append(list(messages))
+        return self.responses.pop(0)
+
+    async def ainvoke(self, messages, *args, **kwargs):
+        self.calls.append('ainvoke')
+        self.prompts.append(list(messages))
+        return self.responses.pop(0)
+
+    def stream(self, messages, *args, **kwargs):
+        """Stream the next response, a list of chunks; an exception in the list is raised there."""
+        self.calls.append('stream')
+        self.prompts.append(list(messages))
+        for chunk in self.responses.pop(0):
+            if isinstance(chunk, Exception):
+                raise chunk
+            yield chunk
+
+    def bind(self, **kwargs) -> 'FakeChatModel':
+        return self
+
+
+@pytest.fixture
+def chat_model():
+    """Factory of fake chat models: chat_model(AIMessage(...), ...), or lists of chunks to stream."""
+    return FakeChatModel
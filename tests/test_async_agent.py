@@ -0,0 +1,78 @@
+"""
+Tests that the async agent awaits every model call (answer, router, summary,
+broadcast) instead of making blocking calls from its worker threads.
+"""
+import asyncio
+import uuid
+
+import pytest
+from langchain_core.messages import AIMessage
+
+from services import ai_service
+
+
+CIL = '1071324-101'
+
+
+@pytest.fixture(autouse=True)
+def plain_agent(monkeypatch):
+    monkeypatch.setattr(ai_service.settings, 'CIL_FAST_PATH', True)
+    monkeypatch.setattr(ai_service.settings, 'MODEL_ROUTING', False)
+    monkeypatch.setattr(ai_service.settings, 'BROADCAST_ANSWERS', False)
+
+
+def arun(model, user_input: str, chat_history=None, conversation_id=None):
+    stats = {}
+    answer = asyncio.run(ai_service.arun_agent(model, user_input, chat_history or [], [], stats,
+                                               conversation_id=conversation_id))
+    return answer, stats
+
+
+def test_router_call_is_awaited(monkeypatch, chat_model):
+    monkeypatch.setattr(ai_service.settings, 'MODEL_ROUTING', True)
+    router = chat_model(AIMessage(content='1'))
+    monkeypatch.setattr(ai_service, 'get_route_model', lambda name: router if name == 'router' else None)
+    model = chat_model(AIMessage(content='يمكنك الدفع عبر التطبيق.'))
+
+    answer, stats = arun(model, 'كيف يمكنني دفع الفاتورة عبر الإنترنت؟')
+
+    assert answer == 'يمكنك الدفع عبر التطبيق.'
+    assert stats['route'] == ai_service.ROUTE_LARGE
+    assert router.calls == ['ainvoke']
+    assert model.calls == ['ainvoke']
+    # The router call is counted with the turn's calls
+    assert stats['llm_calls'] == 2
+    assert stats['aux_llm_calls'] == 1
+
+
+def test_summary_call_is_awaited(chat_model):
+    turns = ai_service.settings.HISTORY_KEEP_TURNS + 6
+    long_text = 'نص طويل عن مشكلة الماء في الحي ' * 40
+    history = []
+    for _ in range(turns):
+        history += [{'role': 'user', 'content': long_text}, {'role': 'assistant', 'content': long_text}]
+    usage = {'input_tokens': 900, 'output_tokens': 100, 'total_tokens': 1000}
+    model = chat_model(AIMessage(content='ملخص المحادثة.', usage_metadata=usage), AIMessage(content='تفضل.'))
+
+    answer, stats = arun(model, 'شكرا', history, conversation_id=str(uuid.uuid4()))
+
+    assert answer == 'تفضل.'
+    assert model.calls == ['ainvoke', 'ainvoke']
+    # The summary call and its tokens are counted with the turn's
+    assert stats['llm_calls'] == 2
+    assert stats['aux_llm_calls'] == 1
+    assert stats['tokens'] == 1000
+    assert 'ملخص المحادثة.' in model.prompts[1][1].content
+
+
+def test_broadcast_call_is_awaited(monkeypatch, chat_model):
+    monkeypatch.setattr(ai_service.settings, 'BROADCAST_ANSWERS', True)
+    ai_service.broadcast_cache.invalidate(None)
+    model = chat_model(AIMessage(content='أعمال صيانة جارية في منطقتك.'))
+
+    answer, stats = arun(model, f'لماذا انقطع الماء؟ رقمي {CIL}')
+    ai_service.broadcast_cache.invalidate(None)
+
+    assert answer == 'أعمال صيانة جارية في منطقتك.'
+    assert stats['stop_reason'] == 'broadcast'
+    assert model.calls == ['ainvoke']
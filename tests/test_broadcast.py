@@ -0,0 +1,64 @@
+"""
+Tests for zone broadcast answers: only a paid-up customer asking why their
+service is cut, in a zone under maintenance for that service, gets one.
+"""
+import pytest
+from langchain_core.messages import AIMessage
+
+from services import ai_service
+
+
+# Paid up, zone 1 (maintenance on 'ماء'), service 'ماء وكهرباء'
+CIL = '1071324-101'
+
+BROADCAST = 'أعمال صيانة جارية في منطقتك.'
+
+
+@pytest.fixture(autouse=True)
+def broadcast_on(monkeypatch):
+    monkeypatch.setattr(ai_service.settings, 'BROADCAST_ANSWERS', True)
+    monkeypatch.setattr(ai_service.settings, 'MODEL_ROUTING', False)
+    monkeypatch.setattr(ai_service.settings, 'CIL_FAST_PATH', True)
+    ai_service.broadcast_cache.invalidate(None)
+    yield
+    ai_service.broadcast_cache.invalidate(None)
+
+
+def run(model, user_input: str):
+    stats = {}
+    answer = ai_service.run_agent(model, user_input, [], [], stats)
+    return answer, stats
+
+
+def test_outage_question_gets_the_zone_answer(chat_model):
+    model = chat_model(AIMessage(content=BROADCAST))
+
+    answer, stats = run(model, f'لماذا انقطع الماء عندي؟ رقمي {CIL}')
+
+    assert answer == BROADCAST
+    assert stats['stop_reason'] == 'broadcast'
+
+    # Served again without a model call
+    answer, stats = run(chat_model(), f'الماء مقطوع، رقمي {CIL}')
+    assert answer == BROADCAST
+    assert stats['llm_calls'] == 0
+
+
+def test_other_questions_go_to_the_model(chat_model):
+    model = chat_model(AIMessage(content='رصيدك المستحق 0 درهم.'))
+
+    answer, stats = run(model, f'كم رصيدي المستحق؟ رقمي {CIL}')
+
+    assert answer == 'رصيدك المستحق 0 درهم.'
+    assert stats['stop_reason'] == 'answer'
+
+
+def test_unaffected_service_goes_to_the_model(monkeypatch, chat_model):
+    user = dict(ai_service.get_user_by_cil(CIL), service_type='كهرباء')
+    monkeypatch.setattr(ai_service, 'get_user_by_cil', lambda cil: user)
+    model = chat_model(AIMessage(content='الكهرباء غير متأثرة بالصيانة.'))
+
+    answer, stats = run(model, f'لماذا انقطعت الكهرباء؟ رقمي {CIL}')
+
+    assert answer == 'الكهرباء غير متأثرة بالصيانة.'
+    assert stats['stop_reason'] == 'answer'
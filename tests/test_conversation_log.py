@@ -0,0 +1,119 @@
+"""
+Tests for the durable conversation log: torn-tail recovery, lazy reload
+through mock_db, compaction (by hand, automatic, and of restored snapshots).
+"""
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+from data import mock_db, snapshot
+from data.conversation_log import ConversationLog
+
+
+def message(content: str, days_ago: float = 0) -> dict:
+    timestamp = (datetime.now() - timedelta(days=days_ago)).isoformat()
+    return {'role': 'user', 'content': content, 'timestamp': timestamp}
+
+
+def log_conversation(log: ConversationLog, conversation_id: str, contents, days_ago: float = 0) -> None:
+    created_at = (datetime.now() - timedelta(days=days_ago)).isoformat()
+    log.record_create({'conversation_id': conversation_id, 'created_at': created_at})
+    for seq, content in enumerate(contents):
+        log.record_message(conversation_id, seq, message(content, days_ago))
+
+
+@pytest.fixture
+def backend(tmp_path, monkeypatch):
+    """mock_db with a fresh conversation log (and an empty conversation store)."""
+    log = ConversationLog(str(tmp_path), is_live=lambda conversation_id: conversation_id in mock_db.conversations_store)
+    monkeypatch.setattr(mock_db, 'conversation_backend', log)
+    yield log
+    log.close()
+
+
+def test_torn_tail_is_cut_off_on_reload(tmp_path):
+    log = ConversationLog(str(tmp_path))
+    log_conversation(log, 'c1', ['first', 'second'])
+    log.close()
+
+    segment = sorted(tmp_path.glob('segment-*.log'))[-1]
+    complete_size = segment.stat().st_size
+    # A crash in the middle of writing the next record
+    with open(segment, 'ab') as f:
+        f.write(b'{"op":"message","id":"c1","seq":2,"mess')
+
+    log = ConversationLog(str(tmp_path))
+    assert [m['content'] for m in log.load('c1')['messages']] == ['first', 'second']
+    assert segment.stat().st_size == complete_size
+
+    # Appends continue after the last complete record
+    log.record_message('c1', 2, message('third'))
+    log.close()
+    log = ConversationLog(str(tmp_path))
+    assert [m['content'] for m in log.load('c1')['messages']] == ['first', 'second', 'third']
+    log.close()
+
+
+def test_conversation_is_reloaded_lazily(backend):
+    conversation_id = mock_db.create_conversation()
+    mock_db.add_message_to_conversation(conversation_id, 'user', 'سؤال')
+    mock_db.add_message_to_conversation(conversation_id, 'assistant', 'جواب')
+
+    # Evicted from memory (or a restart): read back on first access
+    mock_db.conversations_store.clear()
+    assert conversation_id not in mock_db.conversations_store
+
+    history = mock_db.get_conversation_history(conversation_id)
+    assert [m['content'] for m in history] == ['سؤال', 'جواب']
+    assert conversation_id in mock_db.conversations_store
+
+
+def test_compaction_drops_idle_conversations(tmp_path):
+    log = ConversationLog(str(tmp_path), segment_max_bytes=512, is_live=lambda conversation_id: conversation_id == 'live')
+    log_conversation(log, 'old', ['old message'] * 5, days_ago=40)
+    log_conversation(log, 'live', ['live message'] * 5, days_ago=40)
+    log_conversation(log, 'recent', ['recent message'] * 5)
+
+    result = log.compact(retention_seconds=30 * 24 * 3600)
+
+    assert result['kept'] == 2 and result['dropped'] == 1
+    assert result['segments_after'] < result['segments_before']
+    log.close()
+    log = ConversationLog(str(tmp_path))
+    assert log.load('old') is None
+    assert len(log.load('live')['messages']) == 5
+    assert len(log.load('recent')['messages']) == 5
+    log.close()
+
+
+def test_log_is_compacted_automatically(tmp_path):
+    log = ConversationLog(str(tmp_path), segment_max_bytes=256, compact_segments=4, retention_seconds=24 * 3600)
+    for number in range(40):
+        log_conversation(log, f'old-{number}', ['x' * 100], days_ago=2)
+
+    deadline = time.monotonic() + 5
+    while (log._compacting or len(list(tmp_path.glob('segment-*.log'))) > 6) and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+    # Without compaction the idle conversations would fill about 30 segments
+    assert len(list(tmp_path.glob('segment-*.log'))) <= 6
+    assert log.load('old-0') is None
+    log.close()
+
+
+def test_restored_conversations_are_logged(tmp_path, backend):
+    conversation_id = mock_db.create_conversation()
+    mock_db.add_message_to_conversation(conversation_id, 'user', 'قبل الحفظ')
+    snapshot.save_snapshot(str(tmp_path / 'snapshot'))
+
+    # A worker with an empty log restores the snapshot
+    fresh = ConversationLog(str(tmp_path / 'fresh-log'))
+    mock_db.conversation_backend = fresh
+    snapshot.load_snapshot(str(tmp_path / 'snapshot'))
+    mock_db.add_message_to_conversation(conversation_id, 'assistant', 'بعد الاستعادة')
+    fresh.close()
+
+    reopened = ConversationLog(str(tmp_path / 'fresh-log'))
+    assert [m['content'] for m in reopened.load(conversation_id)['messages']] == ['قبل الحفظ', 'بعد الاستعادة']
+    reopened.close()
@@ -0,0 +1,69 @@
+"""
+Tests that turns on one conversation are serialized, on the async path
+as well, without the waiting turns using up the default executor.
+"""
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from data import mock_db
+
+
+EXECUTOR_WORKERS = 4
+
+
+async def _turn(conversation_id: str, number: int) -> None:
+    async with mock_db.aconversation_turn(conversation_id):
+        # The lock holder needs executor threads, like the real turn does
+        await asyncio.to_thread(mock_db.get_conversation_history, conversation_id)
+        await asyncio.to_thread(mock_db.add_message_to_conversation, conversation_id, 'user', f'q{number}')
+        await asyncio.sleep(0)
+        await asyncio.to_thread(mock_db.add_message_to_conversation, conversation_id, 'assistant', f'a{number}')
+
+
+def _run_turns(conversation_id: str, turns: int) -> None:
+    async def main():
+        asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(EXECUTOR_WORKERS))
+        await asyncio.wait_for(
+            asyncio.gather(*(_turn(conversation_id, number) for number in range(turns))), timeout=10
+        )
+
+    asyncio.run(main())
+
+
+def _assert_not_interleaved(conversation_id: str, turns: int) -> None:
+    messages = mock_db.get_conversation_history(conversation_id)
+    assert len(messages) == 2 * turns
+    for question, answer in zip(messages[::2], messages[1::2]):
+        assert question['role'] == 'user' and answer['role'] == 'assistant'
+        assert answer['content'] == 'a' + question['content'][1:]
+
+
+def test_more_async_turns_than_executor_workers():
+    conversation_id = mock_db.create_conversation()
+    turns = EXECUTOR_WORKERS * 10
+
+    _run_turns(conversation_id, turns)
+
+    _assert_not_interleaved(conversation_id, turns)
+
+
+def test_async_turns_wait_for_a_threaded_turn():
+    conversation_id = mock_db.create_conversation()
+    holding = threading.Event()
+
+    def threaded_turn():
+        with mock_db.conversation_turn(conversation_id):
+            holding.set()
+            mock_db.add_message_to_conversation(conversation_id, 'user', 'q-thread')
+            time.sleep(0.1)
+            mock_db.add_message_to_conversation(conversation_id, 'assistant', 'a-thread')
+
+    thread = threading.Thread(target=threaded_turn)
+    thread.start()
+    holding.wait()
+    _run_turns(conversation_id, EXECUTOR_WORKERS * 2)
+    thread.join()
+
+    _assert_not_interleaved(conversation_id, EXECUTOR_WORKERS * 2 + 1)
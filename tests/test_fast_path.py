@@ -0,0 +1,102 @@
+"""
+Tests for the CIL fast path of run_agent.
+A fake chat model (see conftest.py) stands in for Azure OpenAI and records every prompt it receives.
+"""
+import pytest
+from langchain_core.messages import AIMessage, ToolMessage
+
+from services import ai_service
+
+
+# CIL of a customer in the mock data
+KNOWN_CIL = '1071324-101'
+
+
+@pytest.fixture(autouse=True)
+def plain_agent(monkeypatch):
+    """Fast path on; routing and broadcast answers off so every turn reaches the model."""
+    monkeypatch.setattr(ai_service.settings, 'CIL_FAST_PATH', True)
+    monkeypatch.setattr(ai_service.settings, 'MODEL_ROUTING', False)
+    monkeypatch.setattr(ai_service.settings, 'BROADCAST_ANSWERS', False)
+
+
+def run(model, user_input: str):
+    turn_messages, stats = [], {}
+    answer = ai_service.run_agent(model, user_input, [], turn_messages, stats)
+    return answer, turn_messages, stats
+
+
+def tool_results(prompt) -> dict:
+    return {message.tool_call_id: message.content for message in prompt if isinstance(message, ToolMessage)}
+
+
+def test_cil_turn_calls_tools_before_the_model(chat_model):
+    model = chat_model(AIMessage(content='دفعاتك محدثة.'))
+
+    answer, turn_messages, stats = run(model, f'انقطع الماء عندي، رقمي {KNOWN_CIL}')
+
+    assert answer == 'دفعاتك محدثة.'
+    assert stats['llm_calls'] == 1
+    assert stats['tool_calls'] == 2
+
+    # The only model call already has both tool results
+    request = next(m for m in model.prompts[0] if isinstance(m, AIMessage) and m.tool_calls)
+    assert [call['name'] for call in request.tool_calls] == ['check_payment', 'check_maintenance']
+    assert all(call['args'] == {'cil': KNOWN_CIL} for call in request.tool_calls)
+    assert set(tool_results(model.prompts[0])) == {call['id'] for call in request.tool_calls}
+
+    # Stored like a round the model requested
+    assert [m['role'] for m in turn_messages] == ['assistant', 'tool', 'tool']
+
+
+def test_turn_without_cil_goes_to_the_model(chat_model):
+    model = chat_model(AIMessage(content='الرجاء تزويدي برقم CIL الخاص بك.'))
+
+    answer, turn_messages, stats = run(model, 'لماذا انقطع الماء في منزلي؟')
+
+    assert answer == 'الرجاء تزويدي برقم CIL الخاص بك.'
+    assert stats['llm_calls'] == 1
+    assert stats['tool_calls'] == 0
+    assert not tool_results(model.prompts[0])
+    assert turn_messages == []
+
+
+def test_fast_path_can_be_disabled(monkeypatch, chat_model):
+    monkeypatch.setattr(ai_service.settings, 'CIL_FAST_PATH', False)
+    model = chat_model(AIMessage(content='سأتحقق من حسابك.'))
+
+    _, _, stats = run(model, f'رقمي {KNOWN_CIL}')
+
+    assert stats['tool_calls'] == 0
+    assert not tool_results(model.prompts[0])
+
+
+def test_unknown_cil_is_left_to_the_model(chat_model):
+    model = chat_model(AIMessage(content='لم أجد هذا الرقم، الرجاء التحقق منه.'))
+
+    answer, _, stats = run(model, 'رقمي 9999999-999')
+
+    # The tools ran and reported the CIL as unknown; the model words the answer
+    assert answer == 'لم أجد هذا الرقم، الرجاء التحقق منه.'
+    assert stats['tool_calls'] == 2
+    assert stats['llm_calls'] == 1
+    results = tool_results(model.prompts[0]).values()
+    assert len(results) == 2
+    assert all('9999999-999' in result for result in results)
+
+
+def test_malformed_cil_falls_back_to_model_tool_calls(chat_model):
+    # 6 digits before the dash: not a CIL, so the model asks for the tools itself
+    model = chat_model(
+        AIMessage(content='', tool_calls=[{'id': 'call_1', 'name': 'check_payment', 'args': {'cil': KNOWN_CIL}}]),
+        AIMessage(content='دفعاتك محدثة.')
+    )
+
+    answer, turn_messages, stats = run(model, 'رقمي 107132-101')
+
+    assert answer == 'دفعاتك محدثة.'
+    assert not tool_results(model.prompts[0])
+    assert stats['llm_calls'] == 2
+    assert stats['tool_calls'] == 1
+    assert list(tool_results(model.prompts[1])) == ['call_1']
+    assert [m['role'] for m in turn_messages] == ['assistant', 'tool']
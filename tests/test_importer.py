@@ -0,0 +1,98 @@
+"""
+Tests for the bulk importer: replace and upsert modes, and rejected rows.
+"""
+import pytest
+
+from data import mock_db
+from data.importer import import_users
+
+
+HEADER = 'cil,name,address,phone,service_type,zone_id,payment_status,last_payment_date,outstanding_balance,service_status'
+
+
+def row(cil: str, balance: str = '0', zone: str = '1', name: str = 'Client') -> str:
+    return f'{cil},{name},Rue 1,0600000000,ماء,{zone},مدفوع,2024-11-01,{balance},نشط'
+
+
+@pytest.fixture(autouse=True)
+def restore_tables():
+    """Put the original users table back after each test."""
+    users = mock_db.users_index.table.copy()
+    yield
+    mock_db.replace_users_table(users)
+
+
+def write_csv(tmp_path, lines) -> str:
+    path = tmp_path / 'users.csv'
+    path.write_text('\n'.join(lines) + '\n', encoding='utf-8')
+    return str(path)
+
+
+def test_replace_swaps_the_whole_table(tmp_path):
+    path = write_csv(tmp_path, [HEADER, row('2000001-101'), row('2000002-101', '120.5'), row('2000001-101', name='Later')])
+
+    report = import_users(path, mode='replace', chunksize=2)
+
+    assert report['rows_read'] == 3 and report['chunks'] == 2
+    assert report['inserted'] == 2 and report['updated'] == 1
+    assert mock_db.get_user_by_cil('1071324-101') is None
+    assert mock_db.get_user_by_cil('2000001-101')['name'] == 'Later'
+    assert mock_db.get_user_by_cil('2000002-101')['outstanding_balance'] == 120.5
+
+
+def test_upsert_merges_a_partial_delta(tmp_path):
+    path = write_csv(tmp_path, [
+        'cil,payment_status,outstanding_balance',
+        '1071324-101,غير مدفوع,890',
+        '2000003-101,مدفوع,0',
+    ])
+
+    report = import_users(path, mode='upsert')
+
+    assert report['updated'] == 1 and report['inserted'] == 0
+    user = mock_db.get_user_by_cil('1071324-101')
+    assert user['payment_status'] == 'غير مدفوع'
+    assert user['outstanding_balance'] == 890
+    # Unchanged columns keep their values
+    assert user['name'] == 'Abdenbi EL MARZOUKI'
+    # A new CIL needs every column
+    assert report['rejected'] == 1
+    assert report['rejected_samples'][0]['reason'] == 'unknown cil in partial delta'
+    assert mock_db.get_user_by_cil('2000003-101') is None
+
+
+def test_upsert_inserts_complete_new_rows(tmp_path):
+    path = write_csv(tmp_path, [HEADER, row('2000004-101', '15')])
+
+    report = import_users(path, mode='upsert')
+
+    assert report['inserted'] == 1
+    assert mock_db.get_user_by_cil('2000004-101')['outstanding_balance'] == 15
+    assert mock_db.get_user_by_cil('1071324-101') is not None
+
+
+@pytest.mark.parametrize('line, reason', [
+    (row('2000005-101x'), 'invalid cil format'),
+    (row('12000005-101'), 'invalid cil format'),
+    (row('2000005-101', balance='-3'), 'negative outstanding_balance'),
+    (row('2000005-101', balance='abc'), 'invalid number in outstanding_balance'),
+    (row('2000005-101', zone='1.5'), 'non-integer zone_id'),
+    (row('2000005-101', name=''), 'missing name'),
+])
+def test_invalid_rows_are_rejected(tmp_path, line, reason):
+    path = write_csv(tmp_path, [HEADER, row('2000006-101'), line])
+
+    report = import_users(path, mode='replace')
+
+    assert report['inserted'] == 1
+    assert report['rejected'] == 1
+    assert report['rejected_samples'] == [{'row': 1, 'key': line.split(',')[0], 'reason': reason}]
+
+
+def test_bad_header_is_refused(tmp_path):
+    path = write_csv(tmp_path, ['cil,name,unexpected', '2000007-101,Client,x'])
+    users = mock_db.users_index.table
+
+    with pytest.raises(ValueError):
+        import_users(path, mode='replace')
+    assert mock_db.users_index.table is users
@@ -0,0 +1,238 @@
+"""
+Tests for the circuit breaker and the resilient model caller: breaker
+transitions, retry backoff and Retry-After, deadline, hedging, cancelled
+probes and timed-out streams.
+"""
+import asyncio
+import threading
+import time
+
+import httpx
+import openai
+import pytest
+from langchain_core.messages import AIMessageChunk
+
+from services import ai_service, llm_resilience
+from services.llm_resilience import CircuitBreaker, ResilientCaller, LLMUnavailableError
+
+
+class FakeClock:
+    """Stands in for the time module: monotonic() is set by hand, sleep() advances it."""
+
+    def __init__(self):
+        self.now = 1000.0
+        self.sleeps = []
+
+    def monotonic(self) -> float:
+        return self.now
+
+    def sleep(self, seconds: float) -> None:
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(llm_resilience, 'time', clock)
+    # Full jitter picks the top of the backoff window, so delays are predictable
+    monkeypatch.setattr(llm_resilience.random, 'uniform', lambda low, high: high)
+    return clock
+
+
+class FakeModel:
+    """Scripted model call: each item is returned, or raised if it is an exception."""
+
+    def __init__(self, *outcomes):
+        self.outcomes = list(outcomes)
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        outcome = self.outcomes.pop(0)
+        if isinstance(outcome, BaseException):
+            raise outcome
+        return outcome
+
+
+def rate_limited(headers=None) -> openai.RateLimitError:
+    request = httpx.Request('POST', 'https://example.openai.azure.com/')
+    response = httpx.Response(429, headers=headers or {}, request=request)
+    return openai.RateLimitError('Too many requests', response=response, body=None)
+
+
+def open_breaker(breaker: CircuitBreaker) -> None:
+    for _ in range(breaker.failure_threshold):
+        breaker.record_failure()
+
+
+def test_breaker_opens_at_threshold_and_closes_after_probe(clock):
+    breaker = CircuitBreaker(failure_threshold=3, reset_seconds=30)
+
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.state == 'closed'
+    breaker.record_failure()
+    assert breaker.state == 'open'
+    assert not breaker.allow()
+
+    clock.now += 30
+    assert breaker.state == 'half_open'
+    assert breaker.admit() == 'probe'
+    # Only one probe at a time
+    assert breaker.admit() is None
+
+    breaker.record_success()
+    assert breaker.state == 'closed'
+    assert breaker.stats()['opens'] == 1
+    assert breaker.stats()['rejected'] == 2
+
+
+def test_failed_probe_reopens_breaker(clock):
+    breaker = CircuitBreaker(failure_threshold=2, reset_seconds=10)
+    open_breaker(breaker)
+    clock.now += 10
+
+    assert breaker.admit() == 'probe'
+    breaker.record_failure()
+
+    assert breaker.state == 'open'
+    clock.now += 10
+    assert breaker.admit() == 'probe'
+
+
+def test_retries_back_off_exponentially(clock):
+    caller = ResilientCaller(max_retries=3, base_delay=0.5, max_delay=8)
+    model = FakeModel(TimeoutError(), TimeoutError(), TimeoutError(), 'answer')
+
+    assert caller.call(model) == 'answer'
+    assert clock.sleeps == [0.5, 1.0, 2.0]
+    assert caller.stats()['retries'] == 3
+    assert caller.breaker.state == 'closed'
+
+
+def test_retry_honors_retry_after(clock):
+    caller = ResilientCaller(max_retries=2)
+    model = FakeModel(rate_limited({'retry-after': '3'}), rate_limited({'retry-after-ms': '250'}), 'answer')
+
+    assert caller.call(model) == 'answer'
+    assert clock.sleeps == [3.0, 0.25]
+
+
+def test_retry_after_past_deadline_gives_up(clock):
+    caller = ResilientCaller(deadline_seconds=5, max_retries=2)
+    model = FakeModel(rate_limited({'retry-after': '10'}), 'answer')
+
+    with pytest.raises(LLMUnavailableError):
+        caller.call(model)
+    assert model.calls == 1
+    assert caller.stats()['failures'] == 1
+
+
+def test_retries_exhausted(clock):
+    caller = ResilientCaller(max_retries=1)
+    model = FakeModel(TimeoutError(), TimeoutError(), 'answer')
+
+    with pytest.raises(LLMUnavailableError):
+        caller.call(model)
+    assert model.calls == 2
+
+
+def test_non_retryable_error_is_raised_unchanged(clock):
+    caller = ResilientCaller()
+    error = ValueError('bad request')
+
+    with pytest.raises(ValueError):
+        caller.call(FakeModel(error))
+    assert clock.sleeps == []
+    assert caller.breaker.stats()['consecutive_failures'] == 0
+
+
+def test_open_breaker_fails_fast(clock):
+    caller = ResilientCaller(breaker=CircuitBreaker(failure_threshold=1))
+    open_breaker(caller.breaker)
+    model = FakeModel('answer')
+
+    with pytest.raises(LLMUnavailableError):
+        caller.call(model)
+    assert model.calls == 0
+
+
+def test_deadline():
+    caller = ResilientCaller(deadline_seconds=0.05, max_retries=0)
+
+    with pytest.raises(LLMUnavailableError):
+        caller.call(lambda: time.sleep(0.5))
+    assert caller.stats()['deadline_exceeded'] == 1
+
+
+def test_async_deadline():
+    caller = ResilientCaller(deadline_seconds=0.05, max_retries=0)
+
+    with pytest.raises(LLMUnavailableError):
+        asyncio.run(caller.acall(lambda: asyncio.sleep(0.5)))
+    assert caller.stats()['deadline_exceeded'] == 1
+
+
+def test_hedge_wins_past_p95():
+    caller = ResilientCaller(hedge=True, hedge_min_samples=1)
+    assert caller.call(lambda: 'warm-up') == 'warm-up'
+    calls = []
+
+    def slow_first():
+        calls.append(None)
+        if len(calls) == 1:
+            time.sleep(0.5)
+            return 'primary'
+        return 'hedge'
+
+    assert caller.call(slow_first) == 'hedge'
+    assert caller.stats()['hedges'] == 1
+    assert caller.stats()['hedge_wins'] == 1
+
+
+def test_cancelled_probe_releases_breaker(clock):
+    caller = ResilientCaller(breaker=CircuitBreaker(failure_threshold=1, reset_seconds=30))
+    open_breaker(caller.breaker)
+    clock.now += 30
+
+    async def main():
+        probe = asyncio.ensure_future(caller.acall(lambda: asyncio.sleep(10)))
+        await asyncio.sleep(0.01)
+        probe.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await probe
+
+        assert caller.breaker.state == 'half_open'
+        return await caller.acall(lambda: asyncio.sleep(0, 'answer'))
+
+    assert asyncio.run(main()) == 'answer'
+    assert caller.breaker.state == 'closed'
+
+
+def test_timed_out_stream_is_closed(monkeypatch):
+    monkeypatch.setattr(ai_service, 'llm_guard', ResilientCaller(deadline_seconds=0.05, max_retries=0))
+    closed = threading.Event()
+
+    class SlowStreamModel:
+        # Holds its streams, as a client keeping the response open would
+        streams = []
+
+        def stream(self, messages):
+            self.streams.append(self._chunks())
+            return self.streams[-1]
+
+        def _chunks(self):
+            try:
+                time.sleep(0.2)
+                yield AIMessageChunk(content='late')
+                yield AIMessageChunk(content=' answer')
+            finally:
+                closed.set()
+
+    stats = {'llm_calls': 0}
+    with pytest.raises(LLMUnavailableError):
+        list(ai_service._stream_invoke(SlowStreamModel(), [], stats, time.monotonic()))
+
+    # The late attempt opens its stream after the deadline, and it is closed
+    assert closed.wait(2)
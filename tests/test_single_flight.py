@@ -0,0 +1,98 @@
+"""
+Tests for single-flight coalescing when the leader fails or is cancelled.
+"""
+import asyncio
+import threading
+
+import pytest
+
+from services.single_flight import SingleFlight
+
+
+def test_cancelled_leader_hands_off_to_a_follower():
+    async def scenario():
+        flights = SingleFlight()
+        runs = []
+
+        async def work():
+            runs.append(1)
+            await asyncio.sleep(0.05)
+            return 'answer'
+
+        leader = asyncio.ensure_future(flights.ado('key', work))
+        await asyncio.sleep(0)
+        followers = [asyncio.ensure_future(flights.ado('key', work)) for _ in range(2)]
+        await asyncio.sleep(0.01)
+        leader.cancel()
+
+        results = await asyncio.gather(leader, *followers, return_exceptions=True)
+        return results, len(runs), flights.stats()
+
+    results, runs, stats = asyncio.run(scenario())
+
+    assert isinstance(results[0], asyncio.CancelledError)
+    # One follower took over and the other shared its result
+    assert sorted(results[1:]) == [('answer', False), ('answer', True)]
+    assert runs == 2
+    assert stats['in_flight'] == 0
+
+
+def test_cancelled_follower_leaves_the_leader_running():
+    async def scenario():
+        flights = SingleFlight()
+
+        async def work():
+            await asyncio.sleep(0.05)
+            return 'answer'
+
+        leader = asyncio.ensure_future(flights.ado('key', work))
+        await asyncio.sleep(0)
+        follower = asyncio.ensure_future(flights.ado('key', work))
+        await asyncio.sleep(0.01)
+        follower.cancel()
+        return await asyncio.gather(leader, follower, return_exceptions=True)
+
+    leader, follower = asyncio.run(scenario())
+
+    assert leader == ('answer', False)
+    assert isinstance(follower, asyncio.CancelledError)
+
+
+class Interrupted(BaseException):
+    """Stands in for KeyboardInterrupt or SystemExit in the leader's thread."""
+
+
+def test_followers_get_the_leaders_base_exception():
+    flights = SingleFlight()
+    started = threading.Event()
+    release = threading.Event()
+    outcomes = []
+
+    def work():
+        started.set()
+        release.wait()
+        raise Interrupted()
+
+    def follower():
+        try:
+            outcomes.append(flights.do('key', work))
+        except Interrupted as e:
+            outcomes.append(e)
+
+    def leader():
+        with pytest.raises(Interrupted):
+            flights.do('key', work)
+
+    leader_thread = threading.Thread(target=leader)
+    leader_thread.start()
+    started.wait()
+    follower_thread = threading.Thread(target=follower)
+    follower_thread.start()
+    while flights.stats()['shared'] == 0:
+        pass
+    release.set()
+    leader_thread.join()
+    follower_thread.join()
+
+    assert len(outcomes) == 1 and isinstance(outcomes[0], Interrupted)
+    assert flights.stats()['in_flight'] == 0
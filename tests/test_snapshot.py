@@ -0,0 +1,79 @@
+"""
+Tests for database snapshots: restored tables stay writable, and saving over
+an existing snapshot never leaves no snapshot.
+"""
+import os
+
+import pytest
+
+from data import mock_db, snapshot
+
+
+CIL = '1071324-101'
+
+
+def save(tmp_path) -> str:
+    """Save a snapshot to tmp_path/latest and return its created_at."""
+    return snapshot.save_snapshot(str(tmp_path / 'latest'))['created_at']
+
+
+@pytest.fixture(autouse=True)
+def restore_database():
+    users = mock_db.users_index.table.copy()
+    zones = mock_db.zones_index.table.copy()
+    conversations = mock_db.conversations_store.items()
+    yield
+    mock_db.replace_users_table(users)
+    mock_db.replace_zones_table(zones)
+    mock_db.conversations_store.clear()
+    for _, conversation in conversations:
+        mock_db.conversations_store.put(conversation)
+
+
+def test_restored_tables_can_be_updated(tmp_path):
+    save(tmp_path)
+    snapshot.load_snapshot(str(tmp_path / 'latest'))
+
+    assert mock_db.update_user(CIL, {'payment_status': 'غير مدفوع', 'outstanding_balance': 890.0})
+    assert mock_db.get_user_by_cil(CIL)['payment_status'] == 'غير مدفوع'
+    zone_id = mock_db.get_user_by_cil(CIL)['zone_id']
+    assert mock_db.update_zone(zone_id, {'maintenance_status': 'جاري الصيانة'})
+
+
+def test_save_replaces_the_previous_snapshot(tmp_path):
+    save(tmp_path)
+    created_at = save(tmp_path)
+
+    assert snapshot.load_snapshot(str(tmp_path / 'latest'))['created_at'] == created_at
+    assert sorted(path.name for path in tmp_path.iterdir()) == ['latest']
+
+
+def test_failed_swap_keeps_the_previous_snapshot(tmp_path, monkeypatch):
+    created_at = save(tmp_path)
+    replace = os.replace
+
+    def fail_on_new_snapshot(source, destination):
+        if os.path.basename(source).startswith('.snapshot-'):
+            raise OSError('disk full')
+        replace(source, destination)
+
+    monkeypatch.setattr(snapshot.os, 'replace', fail_on_new_snapshot)
+    with pytest.raises(OSError):
+        save(tmp_path)
+    monkeypatch.undo()
+
+    assert snapshot.load_snapshot(str(tmp_path / 'latest'))['created_at'] == created_at
+    assert sorted(path.name for path in tmp_path.iterdir()) == ['latest']
+
+
+def test_crash_between_renames_loads_the_previous_snapshot(tmp_path):
+    created_at = save(tmp_path)
+    # The process died after moving the old snapshot aside
+    os.replace(tmp_path / 'latest', tmp_path / '.latest.previous')
+
+    assert snapshot.load_snapshot(str(tmp_path / 'latest'))['created_at'] == created_at
+
+    # The next save completes and cleans up
+    created_at = save(tmp_path)
+    assert snapshot.load_snapshot(str(tmp_path / 'latest'))['created_at'] == created_at
+    assert sorted(path.name for path in tmp_path.iterdir()) == ['latest']
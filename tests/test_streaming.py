@@ -0,0 +1,47 @@
+"""
+Tests for stream_agent when the model fails mid-answer.
+"""
+import pytest
+from langchain_core.messages import AIMessageChunk
+
+from services import ai_service
+
+
+CIL = '1071324-101'
+
+
+@pytest.fixture(autouse=True)
+def plain_agent(monkeypatch):
+    monkeypatch.setattr(ai_service.settings, 'CIL_FAST_PATH', True)
+    monkeypatch.setattr(ai_service.settings, 'MODEL_ROUTING', False)
+    monkeypatch.setattr(ai_service.settings, 'BROADCAST_ANSWERS', False)
+
+
+def stream(model, user_input: str):
+    stats = {}
+    events = list(ai_service.stream_agent(model, user_input, [], [], stats))
+    return events, stats
+
+
+def test_complete_stream_has_no_reset(chat_model):
+    model = chat_model([AIMessageChunk(content='دفعاتك '), AIMessageChunk(content='محدثة.')])
+
+    events, stats = stream(model, f'رقمي {CIL}')
+
+    assert [event for event, _ in events if event != 'tools'] == ['token', 'token', 'answer']
+    assert events[-1] == ('answer', 'دفعاتك محدثة.')
+
+
+def test_failure_after_tokens_resets_before_the_degraded_answer(chat_model):
+    model = chat_model([AIMessageChunk(content='دفعاتك '), TimeoutError('stream dropped')])
+
+    events, stats = stream(model, f'رقمي {CIL}')
+
+    names = [event for event, _ in events if event != 'tools']
+    assert names == ['token', 'reset', 'token', 'answer']
+    assert stats['stop_reason'] == 'degraded'
+
+    # The tokens after the reset make up the answer
+    after_reset = [data for event, data in events[events.index(('reset', None)):] if event == 'token']
+    assert ''.join(after_reset) == events[-1][1]
+    assert 'Abdenbi EL MARZOUKI' in events[-1][1]
@@ -0,0 +1,72 @@
+"""
+Tests for tool result cache invalidation: data changes drop cached answers,
+and a result computed across a change is never stored.
+"""
+import pytest
+
+from data import mock_db
+from services import ai_service
+from services.tool_cache import ToolResultCache
+
+
+CIL = '1071324-101'
+OTHER_ZONE_CIL = '1300994-101'
+
+
+@pytest.fixture(autouse=True)
+def restore_tables():
+    """Put the original tables back (which also clears the shared tool cache)."""
+    users = mock_db.users_index.table.copy()
+    zones = mock_db.zones_index.table.copy()
+    yield
+    mock_db.replace_users_table(users)
+    mock_db.replace_zones_table(zones)
+
+
+def test_customer_update_invalidates_cached_result():
+    before = ai_service._check_payment_impl(CIL, compact=True)
+    assert ai_service.tool_cache.get('check_payment:compact', CIL) == before
+
+    mock_db.update_user(CIL, {'payment_status': 'غير مدفوع', 'outstanding_balance': 890.0})
+
+    assert ai_service.tool_cache.get('check_payment:compact', CIL) is None
+    after = ai_service._check_payment_impl(CIL, compact=True)
+    assert after != before
+    assert '890' in after
+
+
+def test_zone_update_invalidates_only_that_zone():
+    ai_service._check_maintenance_impl(CIL, compact=True)
+    ai_service._check_maintenance_impl(OTHER_ZONE_CIL, compact=True)
+    zone_id = mock_db.get_user_by_cil(CIL)['zone_id']
+    assert mock_db.get_user_by_cil(OTHER_ZONE_CIL)['zone_id'] != zone_id
+
+    mock_db.update_zone(zone_id, {'maintenance_status': 'جاري الصيانة'})
+
+    assert ai_service.tool_cache.get('check_maintenance:compact', CIL) is None
+    assert ai_service.tool_cache.get('check_maintenance:compact', OTHER_ZONE_CIL) is not None
+
+
+def test_result_computed_across_an_update_is_not_stored():
+    def render_during_update(cil: str) -> str:
+        stale = ai_service._payment_facts(cil)
+        # The customer's row changes while the stale answer is being rendered
+        mock_db.update_user(cil, {'outstanding_balance': 42.0})
+        return stale
+
+    stale = ai_service._cached_answer('check_payment:compact', CIL, render_during_update, depends_on_zone=False)
+
+    assert ai_service.tool_cache.get('check_payment:compact', CIL) is None
+    assert ai_service._check_payment_impl(CIL, compact=True) != stale
+
+
+def test_stale_put_is_dropped():
+    cache = ToolResultCache()
+    version = cache.version
+
+    cache.on_change('users', [CIL])
+    cache.put('check_payment', CIL, 'old answer', version=version)
+
+    assert cache.get('check_payment', CIL) is None
+    cache.put('check_payment', CIL, 'new answer', version=cache.version)
+    assert cache.get('check_payment', CIL) == 'new answer'
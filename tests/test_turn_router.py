@@ -0,0 +1,55 @@
+"""
+Tests for rule-based turn routing.
+"""
+import pytest
+
+from services.turn_router import classify_turn, detect_cil, ROUTE_TEMPLATE, ROUTE_SMALL, ROUTE_LARGE
+
+
+@pytest.mark.parametrize('text, expected', [
+    ('مرحبا', (ROUTE_TEMPLATE, 'greeting')),
+    ('شكرا جزيلا', (ROUTE_TEMPLATE, 'thanks')),
+    ('كم رصيدي؟', (ROUTE_TEMPLATE, 'ask_cil')),
+    ('لماذا انقطع الماء؟', (ROUTE_TEMPLATE, 'ask_cil')),
+    ('كيف يمكنني دفع الفاتورة عبر الإنترنت؟', (ROUTE_SMALL, None)),
+    ('رقمي 1071324-101', (ROUTE_LARGE, None)),
+])
+def test_classify_turn(text, expected):
+    assert classify_turn(text) == expected
+
+
+@pytest.mark.parametrize('text', [
+    'hello, my name is Sara',
+    'How can I pay my bill online?',
+    'عندي سؤال عن طرق الدفع المتاحة',
+    'مرحبا، عندي سؤال',
+    'لدي استفسار عن ساعات العمل',
+    'mon fils veut savoir les horaires',
+])
+def test_possessives_alone_do_not_ask_for_the_cil(text):
+    assert classify_turn(text) == (ROUTE_SMALL, None)
+
+
+@pytest.mark.parametrize('text', [
+    'What is my balance?',
+    'quel est mon solde ?',
+    'why is my water cut?',
+    'أريد معرفة فاتورتي',
+])
+def test_account_questions_ask_for_the_cil(text):
+    assert classify_turn(text) == (ROUTE_TEMPLATE, 'ask_cil')
+
+
+def test_identified_customer_stays_on_the_main_model():
+    history = [{'role': 'user', 'content': 'رقمي 1071324-101'}, {'role': 'assistant', 'content': '...'}]
+    assert classify_turn('كم رصيدي؟', history) == (ROUTE_LARGE, None)
+
+
+@pytest.mark.parametrize('text, cil', [
+    ('رقمي 1071324-101', '1071324-101'),
+    ('رقمي 107132-101', None),
+    ('21071324-1012', None),
+    (None, None),
+])
+def test_detect_cil(text, cil):
+    assert detect_cil(text) == cil